@@ -0,0 +1,224 @@
+"""
+批次評估模組 - 這個檔案負責：
+1. 將大量局面（Position、ChessBoard 或 FEN 字串）打包成 NumPy 陣列：
+   形狀 (N, 12) 的 uint64 位元棋盤，或形狀 (N, 12, 64) 的棋子平面
+2. 以一次向量化運算計算所有局面的子力加位置分數，結果與 evaluation.evaluate 逐一計算相同
+3. 分批串流處理任意長度的局面來源，記憶體用量只與每批大小有關
+4. 測量批次評估與逐一評估的吞吐量（positions/sec）
+
+評估使用 evaluation.py 的同一份分數表：每個棋子位元棋盤拆成 8 個位元組，
+事先算好「每種棋子、每個位元組位置、每個位元組值」的分數總和，
+評估時只需要 N x 12 x 8 次查表與加總，不必展開成 64 格。
+
+需要 NumPy（pip install numpy）；其他模組都不依賴這個檔案。
+
+執行方式：
+    python batch_eval.py positions.epd
+    python batch_eval.py positions.epd --batch-size 65536 --output eval.json
+"""
+
+import argparse
+import json
+import sys
+import time
+from itertools import islice
+
+import numpy as np
+
+from constants import WHITE
+from evaluation import PIECE_SQUARE, evaluate
+from fen_io import iter_lines
+from position import NUM_PIECES, Position
+
+DEFAULT_BATCH_SIZE = 1 << 16  # 每批評估的局面數
+
+# 合併分數表（子力價值加位置分數，黑方為負），形狀 (12, 64)
+PIECE_SQUARE_TABLE = np.array(PIECE_SQUARE, dtype=np.int32)
+
+
+def _build_byte_table():
+    """
+    建立位元組查詢表，形狀 (12, 8, 256)：
+    [棋子, 第 k 個位元組, 位元組值] = 該位元組中所有設定位元對應格子（8k 到 8k+7）的分數總和
+    """
+    bits = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1, bitorder='little')
+    squares = PIECE_SQUARE_TABLE.reshape(NUM_PIECES, 8, 8)
+    return np.einsum('vb,pkb->pkv', bits.astype(np.int32), squares)
+
+
+BYTE_TABLE = _build_byte_table()
+# 把 (棋子, 位元組位置) 攤平成 96 個查詢表，配合 take 一次取值
+_FLAT_OFFSETS = (np.arange(NUM_PIECES * 8, dtype=np.intp) * 256).reshape(NUM_PIECES, 8)
+_FLAT_TABLE = BYTE_TABLE.reshape(-1)
+
+
+def pack_positions(items, position=None):
+    """
+    將局面打包成位元棋盤陣列
+    參數：
+        items: Position、ChessBoard（使用其 position）或 FEN 字串的可迭代物件
+        position: 解析 FEN 時重複使用的 Position 物件
+    返回：(bitboards, sides)，形狀分別為 (N, 12) 的 uint64 與 (N,) 的 int8（走棋方）
+    """
+    if position is None:
+        position = Position()
+    values = []  # 所有局面的位元棋盤依序攤平（重複使用的局面物件會被覆寫，所以複製數值）
+    sides = []
+    for item in items:
+        if isinstance(item, str):
+            position.set_fen(item)
+            item = position
+        else:
+            item = getattr(item, 'position', item)
+        values.extend(item.pieces)
+        sides.append(item.side_to_move)
+    bitboards = np.array(values, dtype=np.uint64).reshape(len(sides), NUM_PIECES)
+    return bitboards, np.array(sides, dtype=np.int8)
+
+
+def to_planes(bitboards):
+    """將 (N, 12) 的位元棋盤展開成 (N, 12, 64) 的 0/1 棋子平面（uint8，索引為格子編號）"""
+    as_bytes = np.ascontiguousarray(bitboards, dtype='<u8').view(np.uint8)
+    return np.unpackbits(as_bytes.reshape(len(bitboards), NUM_PIECES, 8),
+                         axis=-1, bitorder='little')
+
+
+def evaluate_bitboards(bitboards, sides):
+    """
+    向量化評估 (N, 12) 位元棋盤陣列，返回走棋方角度的分數陣列（int32，形狀 (N,)）
+    """
+    as_bytes = np.ascontiguousarray(bitboards, dtype='<u8').view(np.uint8)
+    as_bytes = as_bytes.reshape(len(bitboards), NUM_PIECES, 8)
+    scores = np.take(_FLAT_TABLE, as_bytes + _FLAT_OFFSETS).sum(axis=(1, 2), dtype=np.int32)
+    return np.where(sides == WHITE, scores, -scores)
+
+
+def evaluate_planes(planes, sides):
+    """向量化評估 (N, 12, 64) 棋子平面陣列，返回走棋方角度的分數陣列（int32，形狀 (N,)）"""
+    scores = np.tensordot(planes.astype(np.int32), PIECE_SQUARE_TABLE, axes=([1, 2], [0, 1]))
+    return np.where(sides == WHITE, scores, -scores).astype(np.int32)
+
+
+def iter_evaluate(items, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    分批評估任意長度的局面來源，每批產生一個分數陣列
+    （只保留一批局面的位元棋盤，適合串流處理數千萬個局面）
+    """
+    position = Position()
+    iterator = iter(items)
+    while True:
+        batch = []
+        for item in iterator:
+            batch.append(item)
+            if len(batch) == batch_size:
+                break
+        if not batch:
+            return
+        bitboards, sides = pack_positions(batch, position)
+        yield evaluate_bitboards(bitboards, sides)
+
+
+def evaluate_batch(items, batch_size=DEFAULT_BATCH_SIZE):
+    """評估所有局面，返回走棋方角度的分數陣列（int32，形狀 (N,)）"""
+    batches = list(iter_evaluate(items, batch_size))
+    if not batches:
+        return np.zeros(0, dtype=np.int32)
+    return np.concatenate(batches)
+
+
+def _pack_lines(lines, position):
+    """
+    解析一批 FEN 行並打包，格式錯誤的行略過
+    返回：(bitboards, sides, 成功解析的行, 格式錯誤的行數)
+    """
+    values = []
+    sides = []
+    valid = []
+    invalid = 0
+    set_fen = position.set_fen
+    for line in lines:
+        try:
+            set_fen(line)
+        except ValueError:
+            invalid += 1
+            continue
+        values.extend(position.pieces)
+        sides.append(position.side_to_move)
+        valid.append(line)
+    bitboards = np.array(values, dtype=np.uint64).reshape(len(sides), NUM_PIECES)
+    return bitboards, np.array(sides, dtype=np.int8), valid, invalid
+
+
+def run_benchmark(path, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    比較 FEN 檔案的批次評估與逐一評估：
+    以記憶體映射逐行讀取，每次只保留一批的行與位元棋盤，分別測量解析打包、
+    向量化評估與 evaluation.evaluate 逐一評估（含解析）的耗時，並逐批確認分數一致；
+    格式錯誤的行略過並計數（同 fen_io.run_benchmark）
+    """
+    position = Position()
+    count = invalid = 0
+    pack_seconds = batch_seconds = scalar_seconds = 0.0
+    matches = True
+    lines = iter_lines(path)
+    while True:
+        batch = list(islice(lines, batch_size))
+        if not batch:
+            break
+        start = time.perf_counter()
+        bitboards, sides, valid, bad = _pack_lines(batch, position)
+        pack_seconds += time.perf_counter() - start
+        invalid += bad
+        count += len(valid)
+
+        start = time.perf_counter()
+        scores = evaluate_bitboards(bitboards, sides)
+        batch_seconds += time.perf_counter() - start
+
+        start = time.perf_counter()
+        scalar = []
+        for fen in valid:
+            position.set_fen(fen)
+            scalar.append(evaluate(position))
+        scalar_seconds += time.perf_counter() - start
+        matches = matches and bool(np.array_equal(scores, np.array(scalar, dtype=np.int32)))
+
+    return {
+        'path': path,
+        'positions': count,
+        'invalid': invalid,
+        'batch_size': batch_size,
+        'pack_seconds': round(pack_seconds, 6),
+        'batch_seconds': round(batch_seconds, 6),
+        'batch_positions_per_sec': int(count / batch_seconds) if batch_seconds > 0 else None,
+        'scalar_seconds': round(scalar_seconds, 6),
+        'scalar_positions_per_sec': int(count / scalar_seconds) if scalar_seconds > 0 else None,
+        'matches': matches,
+    }
+
+
+def main(argv=None):
+    """命令列入口：批次評估 FEN/EPD 檔案並與逐一評估比較"""
+    parser = argparse.ArgumentParser(description='NumPy 批次局面評估與吞吐量測試')
+    parser.add_argument('path', help='FEN 或 EPD 檔案（每行一個局面）')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help='每批評估的局面數')
+    parser.add_argument('--output', help='將結果寫入 JSON 檔')
+    args = parser.parse_args(argv)
+
+    result = run_benchmark(args.path, args.batch_size)
+    print(f"{result['positions']:,} 個局面（{result['invalid']:,} 行格式錯誤）  "
+          f"解析打包 {result['pack_seconds']:.3f} 秒")
+    print(f"批次評估: {result['batch_seconds']:.4f} 秒  "
+          f"{result['batch_positions_per_sec'] or 0:,} positions/sec")
+    print(f"逐一評估: {result['scalar_seconds']:.3f} 秒  "
+          f"{result['scalar_positions_per_sec'] or 0:,} positions/sec（含解析）")
+    print('分數一致' if result['matches'] else '分數不一致！')
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+    return 0 if result['matches'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,234 @@
+"""
+位元棋盤模組 - 這個檔案負責：
+1. 定義 64 位元棋盤（bitboard）的格子編號與常用遮罩
+2. 預先計算騎士、國王、兵的攻擊表
+3. 以 kindergarten bitboard 方式查表計算城堡、主教、皇后的滑動攻擊
+4. 預先計算每一格的騎士、國王目標格列表與依距離排序的滑動射線（走法產生時直接走訪，不需邊界檢查）
+5. 提供位元迭代、格子名稱轉換等工具函式
+
+格子編號：square = row * 8 + col，row 0 為黑方底線（第 8 橫列），
+與 ChessBoard.board[row][col] 的座標完全一致。
+"""
+
+from constants import BOARD_SIZE, WHITE, BLACK
+
+FULL = 0xFFFFFFFFFFFFFFFF   # 64 位元全滿遮罩（Python 整數沒有溢位，乘法後需截斷）
+FILE_A = 0x0101010101010101  # a 直列
+FILE_B = FILE_A << 1         # b 直列（kindergarten 乘數）
+FILE_H = FILE_A << 7         # h 直列
+FILE_MULTIPLIER = 0x0080402010080400  # 將 a 直列的內側 6 格收集到最高 6 位元的乘數
+
+FILE_MASKS = [FILE_A << col for col in range(BOARD_SIZE)]        # 各直列遮罩
+RANK_MASKS = [0xFF << (8 * row) for row in range(BOARD_SIZE)]     # 各橫列遮罩（以 row 索引）
+SQUARE_BB = [1 << sq for sq in range(64)]                         # 單一格子的位元
+
+FILE_LETTERS = 'abcdefgh'
+
+
+def square(row, col):
+    """將 (row, col) 座標轉換為 0-63 的格子編號"""
+    return row * BOARD_SIZE + col
+
+
+def square_name(sq):
+    """將格子編號轉換為代數記譜名稱，例如 0 -> 'a8'、63 -> 'h1'"""
+    return FILE_LETTERS[sq & 7] + str(BOARD_SIZE - (sq >> 3))
+
+
+def parse_square(name):
+    """將代數記譜名稱（如 'e4'）轉換為格子編號"""
+    return square(BOARD_SIZE - int(name[1]), FILE_LETTERS.index(name[0]))
+
+
+def lsb(bb):
+    """返回位元棋盤最低位元的格子編號（bb 必須非零）"""
+    return (bb & -bb).bit_length() - 1
+
+
+def popcount(bb):
+    """返回位元棋盤中被設定的位元數量"""
+    return bin(bb).count('1')
+
+
+def iter_bits(bb):
+    """依序產生位元棋盤中每個被設定位元的格子編號（由低到高）"""
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+def _leaper_table(offsets):
+    """依照 (row, col) 位移量建立跳躍型棋子（騎士、國王、兵）的攻擊表"""
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, BOARD_SIZE)
+        bb = 0
+        for dr, dc in offsets:
+            r, c = row + dr, col + dc
+            if 0 <= r < BOARD_SIZE and 0 <= c < BOARD_SIZE:
+                bb |= 1 << square(r, c)
+        table.append(bb)
+    return table
+
+
+KNIGHT_ATTACKS = _leaper_table([(-2, -1), (-2, 1), (-1, -2), (-1, 2),
+                                (1, -2), (1, 2), (2, -1), (2, 1)])
+KING_ATTACKS = _leaper_table([(0, 1), (0, -1), (1, 0), (-1, 0),
+                              (1, 1), (1, -1), (-1, 1), (-1, -1)])
+# 兵的攻擊表以顏色索引：白方向上（row 減少），黑方向下（row 增加）
+PAWN_ATTACKS = [None, None]
+PAWN_ATTACKS[WHITE] = _leaper_table([(-1, -1), (-1, 1)])
+PAWN_ATTACKS[BLACK] = _leaper_table([(1, -1), (1, 1)])
+
+
+def _ray_attacks(sq, occ, directions):
+    """逐格走訪的滑動攻擊計算，只在建表時使用"""
+    row, col = divmod(sq, BOARD_SIZE)
+    bb = 0
+    for dr, dc in directions:
+        r, c = row + dr, col + dc
+        while 0 <= r < BOARD_SIZE and 0 <= c < BOARD_SIZE:
+            bit = 1 << square(r, c)
+            bb |= bit
+            if occ & bit:
+                break
+            r += dr
+            c += dc
+    return bb
+
+
+def _line_mask(sq, directions):
+    """建立從 sq 沿指定方向延伸（不含 sq 本身）的直線遮罩"""
+    return _ray_attacks(sq, 0, directions)
+
+
+def _subsets(mask):
+    """列舉遮罩的所有子集合（Carry-Rippler 技巧）"""
+    subset = 0
+    while True:
+        yield subset
+        subset = (subset - mask) & mask
+        if subset == 0:
+            break
+
+
+def _rank_index(sq, occ):
+    return (occ >> ((sq & ~7) + 1)) & 63
+
+
+def _file_index(sq, occ):
+    return ((((occ >> (sq & 7)) & FILE_A) * FILE_MULTIPLIER) & FULL) >> 58
+
+
+def _diagonal_index(mask, occ):
+    return (((occ & mask) * FILE_B) & FULL) >> 58
+
+
+# 斜線遮罩：DIAGONAL 為 row 與 col 同增同減的方向，ANTI_DIAGONAL 為另一方向
+DIAGONAL_MASKS = [_line_mask(sq, [(1, 1), (-1, -1)]) for sq in range(64)]
+ANTI_DIAGONAL_MASKS = [_line_mask(sq, [(1, -1), (-1, 1)]) for sq in range(64)]
+
+
+def _build_line_table(mask_of, directions, index_of):
+    """
+    建立某一方向線段的 kindergarten 攻擊表：
+    列舉線上所有佔位組合，以與查表時相同的索引公式存放攻擊結果；
+    sq 本身的位元也一併列舉，查表時就不必先清除棋子自己所在的格子
+    """
+    table = []
+    for sq in range(64):
+        mask = mask_of(sq) | (1 << sq)
+        entries = [0] * 64
+        for occ in _subsets(mask):
+            entries[index_of(sq, occ)] = _ray_attacks(sq, occ, directions)
+        table.append(entries)
+    return table
+
+
+RANK_ATTACKS = _build_line_table(
+    lambda sq: _line_mask(sq, [(0, 1), (0, -1)]), [(0, 1), (0, -1)], _rank_index)
+FILE_ATTACKS = _build_line_table(
+    lambda sq: _line_mask(sq, [(1, 0), (-1, 0)]), [(1, 0), (-1, 0)], _file_index)
+DIAGONAL_ATTACKS = _build_line_table(
+    lambda sq: DIAGONAL_MASKS[sq], [(1, 1), (-1, -1)],
+    lambda sq, occ: _diagonal_index(DIAGONAL_MASKS[sq], occ))
+ANTI_DIAGONAL_ATTACKS = _build_line_table(
+    lambda sq: ANTI_DIAGONAL_MASKS[sq], [(1, -1), (-1, 1)],
+    lambda sq, occ: _diagonal_index(ANTI_DIAGONAL_MASKS[sq], occ))
+
+
+def _build_between():
+    """建立 BETWEEN[a][b]：a 與 b 在同一直線或斜線上時，兩格之間（不含兩端）的格子"""
+    table = [[0] * 64 for _ in range(64)]
+    directions = [(0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1)]
+    for a in range(64):
+        row, col = divmod(a, BOARD_SIZE)
+        for dr, dc in directions:
+            between = 0
+            r, c = row + dr, col + dc
+            while 0 <= r < BOARD_SIZE and 0 <= c < BOARD_SIZE:
+                b = square(r, c)
+                table[a][b] = between
+                between |= 1 << b
+                r += dr
+                c += dc
+    return table
+
+
+BETWEEN = _build_between()
+# 空棋盤上城堡與主教的攻擊範圍，用於尋找可能造成牽制或將軍的滑動棋子
+ROOK_RAYS = [_line_mask(sq, [(0, 1), (0, -1), (1, 0), (-1, 0)]) for sq in range(64)]
+BISHOP_RAYS = [_line_mask(sq, [(1, 1), (1, -1), (-1, 1), (-1, -1)]) for sq in range(64)]
+
+
+
+ROOK_DIRECTIONS = ((0, 1), (0, -1), (1, 0), (-1, 0))
+BISHOP_DIRECTIONS = ((1, 1), (1, -1), (-1, 1), (-1, -1))
+
+
+def _ordered_rays(sq, directions):
+    """建立 sq 沿各方向的射線，每條射線是由近到遠的格子編號 tuple（略過長度為 0 的方向）"""
+    row, col = divmod(sq, BOARD_SIZE)
+    rays = []
+    for dr, dc in directions:
+        ray = []
+        r, c = row + dr, col + dc
+        while 0 <= r < BOARD_SIZE and 0 <= c < BOARD_SIZE:
+            ray.append(square(r, c))
+            r += dr
+            c += dc
+        if ray:
+            rays.append(tuple(ray))
+    return tuple(rays)
+
+
+# 每一格的目標格列表與滑動射線
+KNIGHT_TARGETS = [tuple(iter_bits(KNIGHT_ATTACKS[sq])) for sq in range(64)]
+KING_TARGETS = [tuple(iter_bits(KING_ATTACKS[sq])) for sq in range(64)]
+ROOK_RAY_SQUARES = [_ordered_rays(sq, ROOK_DIRECTIONS) for sq in range(64)]
+BISHOP_RAY_SQUARES = [_ordered_rays(sq, BISHOP_DIRECTIONS) for sq in range(64)]
+
+
+def pawn_attacks_bb(pawns, color):
+    """以位移一次計算多個兵的攻擊範圍"""
+    if color == WHITE:
+        return ((pawns & ~FILE_A) >> 9) | ((pawns & ~FILE_H) >> 7)
+    return (((pawns & ~FILE_A) << 7) | ((pawns & ~FILE_H) << 9)) & FULL
+
+
+def rook_attacks(sq, occ):
+    """城堡在 sq、佔位為 occ 時的攻擊範圍（含可吃的第一個阻擋棋子）"""
+    return (RANK_ATTACKS[sq][(occ >> ((sq & ~7) + 1)) & 63]
+            | FILE_ATTACKS[sq][((((occ >> (sq & 7)) & FILE_A) * FILE_MULTIPLIER) & FULL) >> 58])
+
+
+def bishop_attacks(sq, occ):
+    """主教在 sq、佔位為 occ 時的攻擊範圍"""
+    return (DIAGONAL_ATTACKS[sq][(((occ & DIAGONAL_MASKS[sq]) * FILE_B) & FULL) >> 58]
+            | ANTI_DIAGONAL_ATTACKS[sq][(((occ & ANTI_DIAGONAL_MASKS[sq]) * FILE_B) & FULL) >> 58])
+
+
+def queen_attacks(sq, occ):
+    """皇后在 sq、佔位為 occ 時的攻擊範圍（城堡與主教的聯集）"""
+    return rook_attacks(sq, occ) | bishop_attacks(sq, occ)
@@ -4,14 +4,17 @@
 2. 處理棋子的選擇和移動邏輯
 3. 繪製棋盤、棋子和移動提示
 4. 處理滑鼠互動和位置計算
+
+棋局狀態實際存放在 position.Position 的位元棋盤中，
+board[row][col] 只是由位元棋盤同步出來的 8x8 視圖。
+這個模組不直接依賴 pygame，沒有顯示器的環境也能建立與操作棋盤。
 """
 
-import pygame
-from constants import (
-    BOARD_SIZE, BEIGE, DARK_BROWN, HIGHLIGHT, 
-    VALID_MOVE_COLOR
-)
-from pieces import ChessPiece
+from constants import BOARD_SIZE, WHITE
+from bitboard import SQUARE_BB
+from pieces import piece_at
+from pgn import Game
+from position import Position, START_FEN
 
 class ChessBoard:
     """
@@ -19,20 +22,39 @@ class ChessBoard:
     屬性：
         window_size: 視窗大小
         square_size: 每個棋格的大小
-        board: 8x8的二維陣列，儲存棋盤上的棋子
-        scale: 棋盤縮放比例
+        position: 位元棋盤局面，棋局狀態的唯一來源
+        board: 8x8的二維陣列視圖，由 position 同步出棋盤上的棋子
+        screen_size: 最近一次繪製時的畫面大小，用於換算滑鼠座標
         selected_piece: 當前選中的棋子
         valid_moves: 當前選中棋子的有效移動位置列表
+        redo_stack: 悔棋後可重做的走法
+        start_fen: 對局起始局面的 FEN（匯出棋譜時使用）
+        show_attacks: 是否顯示被對方攻擊的格子
     """
-    def __init__(self, window_size):
-        """初始化棋盤屬性和狀態"""
+    def __init__(self, window_size, fen=None):
+        """
+        初始化棋盤屬性和狀態
+        參數：
+            window_size: 視窗大小
+            fen: 起始局面的 FEN 字串，None 表示標準初始局面
+        """
         self.window_size = window_size
         self.square_size = window_size // BOARD_SIZE
-        self.board = [[None for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
-        self.scale = 1.0
+        self.position = Position()
+        self.position.enable_attack_cache()  # 悔棋、重做與狀態判斷回到算過的局面時沿用攻擊圖
+        self._grid = [[None for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
+        self._grid_codes = [None] * (BOARD_SIZE * BOARD_SIZE)
+        self.screen_size = (window_size, window_size)
         self.selected_piece = None
         self.valid_moves = []
-        self.setup_board()
+        self.redo_stack = []
+        self.show_attacks = False
+        self._legal_key = None     # _legal_targets 對應的局面雜湊值
+        self._legal_targets = {}   # {起點格: 合法目標格位元棋盤}
+        if fen is None:
+            self.setup_board()
+        else:
+            self.set_fen(fen)
         
     def setup_board(self):
         """
@@ -40,98 +62,194 @@ class ChessBoard:
         - 設置黑白雙方的起始棋子位置
         - 按照西洋棋規則擺放各種棋子
         """
-        # 設置棋子初始排列順序
-        piece_order = ['rook', 'knight', 'bishop', 'queen', 'king', 'bishop', 'knight', 'rook']
-        # 設置黑方棋子
-        for i in range(BOARD_SIZE):
-            self.board[1][i] = ChessPiece('black', 'pawn', (1, i))
-            self.board[0][i] = ChessPiece('black', piece_order[i], (0, i))
-            
-        # 設置白方棋子
-        for i in range(BOARD_SIZE):
-            self.board[6][i] = ChessPiece('white', 'pawn', (6, i))
-            self.board[7][i] = ChessPiece('white', piece_order[i], (7, i))
+        self.position.setup_start()
+        self.start_fen = START_FEN
+        self.redo_stack = []
+        self.sync_board()
+
+    def set_fen(self, fen):
+        """
+        由 FEN 字串設定棋盤局面：清空選取狀態、走棋紀錄與重做堆疊
+        格式錯誤時拋出 ValueError，此時保留原本的局面
+        """
+        self.position = Position.from_fen(fen)
+        self.position.enable_attack_cache()
+        self.start_fen = self.position.to_fen()
+        self.selected_piece = None
+        self.valid_moves = []
+        self.redo_stack = []
+        self.sync_board()
+
+    def to_fen(self):
+        """返回目前局面的 FEN 字串"""
+        return self.position.to_fen()
+
+    @property
+    def board(self):
+        """8x8 棋盤視圖：board[row][col] 為該格的 ChessPiece 或 None"""
+        return self._grid
+
+    def sync_board(self):
+        """
+        由位元棋盤同步 8x8 視圖：
+        只更新棋子編號有變動的格子，格子上放的是 pieces.piece_at 的共享棋子實例（不配置新物件）
+        """
+        mailbox = self.position.mailbox
+        for sq, code in enumerate(mailbox):
+            if code == self._grid_codes[sq]:
+                continue
+            row, col = divmod(sq, BOARD_SIZE)
+            if code is None:
+                self._grid[row][col] = None
+            else:
+                self._grid[row][col] = piece_at(code, sq)
+            self._grid_codes[sq] = code
     
+    @property
+    def zobrist_key(self):
+        """目前局面的 64 位元 Zobrist 雜湊值（隨走棋遞增更新）"""
+        return self.position.key
+
+    @property
+    def move_history(self):
+        """已走過的走法列表（16 位元走法編號，依走棋順序）"""
+        return [record[0] for record in self.position.history]
+
+    def make_move(self, move):
+        """執行走法：更新位元棋盤並同步棋盤視圖，新的走法會清空重做堆疊"""
+        self.position.make_move(move)
+        self.redo_stack = []
+        self.sync_board()
+
+    def undo_move(self):
+        """
+        悔棋：撤銷最後一步並放入重做堆疊
+        返回：是否有走法被撤銷
+        """
+        if not self.position.history:
+            return False
+        self.redo_stack.append(self.position.unmake_move())
+        self.selected_piece = None
+        self.valid_moves = []
+        self.sync_board()
+        return True
+
+    def redo_move(self):
+        """
+        重做：重新執行最近一次被撤銷的走法
+        返回：是否有走法被重做
+        """
+        if not self.redo_stack:
+            return False
+        self.position.make_move(self.redo_stack.pop())
+        self.selected_piece = None
+        self.valid_moves = []
+        self.sync_board()
+        return True
+
+    def game_record(self, headers=None):
+        """
+        返回目前對局的紀錄（pgn.Game）：起始局面、已走過的走法與對局結果
+        參數：
+            headers: 額外的 PGN 標籤
+        """
+        headers = dict(headers or {})
+        if self.start_fen != START_FEN:
+            headers['SetUp'] = '1'
+            headers['FEN'] = self.start_fen
+        status = self.game_status()
+        if status == 'checkmate':
+            result = '0-1' if self.position.side_to_move == WHITE else '1-0'
+        elif status == 'stalemate':
+            result = '1/2-1/2'
+        else:
+            result = '*'
+        return Game(headers, self.move_history, result)
+
+    def legal_targets(self, sq):
+        """
+        返回 sq 上棋子的合法目標格位元棋盤：
+        每個局面只產生一次走法並依起點格分組，之後選取棋子、判斷對局狀態都直接查表
+        """
+        return self._legal_map().get(sq, 0)
+
+    def _legal_map(self):
+        """返回目前局面 {起點格: 合法目標格位元棋盤}，局面改變（雜湊值不同）時才重新產生"""
+        key = self.position.key
+        if key != self._legal_key:
+            targets = {}
+            for move in self.position.generate_moves():
+                from_sq = move & 63
+                targets[from_sq] = targets.get(from_sq, 0) | SQUARE_BB[(move >> 6) & 63]
+            self._legal_key = key
+            self._legal_targets = targets
+        return self._legal_targets
+
+    def threatened_squares(self):
+        """返回非走棋方（對手）攻擊到的格子位元棋盤，由局面的攻擊圖快取取得"""
+        return self.position.attack_maps()[self.position.side_to_move ^ 1]
+
+    def toggle_attacks(self):
+        """切換是否顯示被對方攻擊的格子"""
+        self.show_attacks = not self.show_attacks
+
+    def game_status(self):
+        """
+        判斷對局狀態：
+        返回 'checkmate'（將死）、'stalemate'（逼和）、'check'（將軍）或 None
+        （使用快取的合法走法，每次點擊後查詢不必重新產生走法）
+        """
+        in_check = self.position.in_check()
+        if not self._legal_map():
+            return 'checkmate' if in_check else 'stalemate'
+        return 'check' if in_check else None
+
     def resize(self, window_size):
         """
         調整棋盤大小：
-        根據新的視窗大小重新計算棋格大小
+        根據新的視窗大小重新計算棋格大小（棋盤直接以這個大小繪製，不另外縮放）
         """
         self.window_size = window_size
-        self.square_size = int(window_size // BOARD_SIZE * self.scale)
+        self.square_size = window_size // BOARD_SIZE
+
+    @property
+    def board_pixels(self):
+        """棋盤實際繪製的邊長（棋格大小的整數倍）"""
+        return self.square_size * BOARD_SIZE
+
+    def board_origin(self):
+        """返回棋盤置中時左上角在畫面上的座標"""
+        return ((self.screen_size[0] - self.board_pixels) // 2,
+                (self.screen_size[1] - self.board_pixels) // 2)
+
+    def square_at(self, pos):
+        """將畫面座標轉換為棋格 (row, col)，不在棋盤上時返回 None"""
+        x_offset, y_offset = self.board_origin()
+        x = pos[0] - x_offset
+        y = pos[1] - y_offset
+        if 0 <= x < self.board_pixels and 0 <= y < self.board_pixels:
+            return y // self.square_size, x // self.square_size
+        return None
 
     def draw(self, screen):
         """
-        繪製棋盤和棋子：
-        1. 繪製棋盤格子（交替的淺色和深色）
-        2. 繪製有效移動位置的提示標記
-        3. 繪製棋子
-        4. 繪製選中棋子的高亮效果
-        5. 處理棋盤的縮放和居中顯示
-        """
-        board_surface = pygame.Surface((self.window_size, self.window_size), pygame.SRCALPHA)
-        # 繪製棋盤格子
-        for row in range(BOARD_SIZE):
-            for col in range(BOARD_SIZE):
-                color = BEIGE if (row + col) % 2 == 0 else DARK_BROWN
-                pygame.draw.rect(board_surface, color, 
-                               (col * self.square_size, row * self.square_size, 
-                                self.square_size, self.square_size))
-                
-                # 繪製棋子
-                # 如果是有效移動位置，畫出半透明圓形
-                if (row, col) in self.valid_moves:
-                    circle_surface = pygame.Surface((self.square_size, self.square_size), pygame.SRCALPHA)
-                    pygame.draw.circle(circle_surface, VALID_MOVE_COLOR,
-                                     (self.square_size // 2, self.square_size // 2),
-                                     self.square_size // 4)
-                    board_surface.blit(circle_surface,
-                                     (col * self.square_size, row * self.square_size))
-                
-                piece = self.board[row][col]
-                if piece:
-                    piece_surface = pygame.transform.scale(piece.surface, 
-                        (int(self.square_size - 10), int(self.square_size - 10)))
-                    board_surface.blit(piece_surface, 
-                                   (col * self.square_size + 5, row * self.square_size + 5))
-                    
-                    # 如果是選中的棋子，畫出高亮效果
-                    if piece == self.selected_piece:
-                        highlight_surface = pygame.Surface((self.square_size, self.square_size), pygame.SRCALPHA)
-                        pygame.draw.rect(highlight_surface, HIGHLIGHT,
-                                       (0, 0, self.square_size, self.square_size))
-                        board_surface.blit(highlight_surface,
-                                         (col * self.square_size, row * self.square_size))
-        
-        # 計算棋盤居中位置
-        x_offset = (screen.get_width() - self.window_size * self.scale) // 2
-        y_offset = (screen.get_height() - self.window_size * self.scale) // 2
-        
-        # 縮放並繪製棋盤
-        scaled_surface = pygame.transform.scale(board_surface, 
-            (int(self.window_size * self.scale), int(self.window_size * self.scale)))
-        screen.blit(scaled_surface, (x_offset, y_offset))
+        繪製棋盤和棋子：交由 UI 層的 render 模組處理
+        （第一次繪製時才載入 pygame 繪圖相關的程式與棋子圖像）
+        """
+        import render
+        self.screen_size = screen.get_size()
+        render.draw_board(self, screen)
     
     def get_piece_at_position(self, pos):
         """
         根據滑鼠位置獲取棋子：
-        - 將滑鼠座標轉換為棋盤格子位置
-        - 考慮棋盤的縮放和偏移
+        - 將滑鼠座標轉換為棋盤格子位置（考慮棋盤置中的偏移）
         - 返回該位置的棋子和位置座標
         """
-        x, y = pos
-        board_size = int(self.window_size * self.scale)
-        x_offset = (pygame.display.get_surface().get_width() - board_size) // 2
-        y_offset = (pygame.display.get_surface().get_height() - board_size) // 2
-        
-        # 根據縮放和偏移計算棋子位置
-        x = (x - x_offset) / self.scale
-        y = (y - y_offset) / self.scale
-        
-        row = int(y // (self.window_size / BOARD_SIZE))
-        col = int(x // (self.window_size / BOARD_SIZE))
-        if 0 <= row < BOARD_SIZE and 0 <= col < BOARD_SIZE:
-            return self.board[row][col], (row, col)
+        square = self.square_at(pos)
+        if square is not None:
+            row, col = square
+            return self.board[row][col], square
         return None, None
 
     def handle_click(self, pos):
@@ -144,18 +262,9 @@ class ChessBoard:
            - 如果點擊有效移動位置，移動棋子
            - 如果點擊其他位置，取消選擇
         """
-        x, y = pos
-        board_size = int(self.window_size * self.scale)
-        x_offset = (pygame.display.get_surface().get_width() - board_size) // 2
-        y_offset = (pygame.display.get_surface().get_height() - board_size) // 2
-        
-        # 根據縮放和偏移計算棋子位置
-        x = (x - x_offset) / self.scale
-        y = (y - y_offset) / self.scale
-        
-        row = int(y // (self.window_size / BOARD_SIZE))
-        col = int(x // (self.window_size / BOARD_SIZE))
-        if 0 <= row < BOARD_SIZE and 0 <= col < BOARD_SIZE:
+        square = self.square_at(pos)
+        if square is not None:
+            row, col = square
             piece = self.board[row][col]
             if self.selected_piece is None:
                 # 選擇棋子
@@ -167,9 +276,8 @@ class ChessBoard:
                 if (row, col) in self.valid_moves:
                     # 移動棋子
                     old_row, old_col = self.selected_piece.position
-                    self.board[old_row][old_col] = None
-                    self.board[row][col] = self.selected_piece
-                    self.selected_piece.position = (row, col)
+                    self.make_move(self.position.infer_move(old_row * BOARD_SIZE + old_col,
+                                                            row * BOARD_SIZE + col))
                     self.selected_piece = None
                     self.valid_moves = []
                 elif piece and piece.color == self.selected_piece.color:
@@ -0,0 +1,357 @@
+"""
+開局庫模組 - 這個檔案負責：
+1. 由 PGN 棋譜建立開局庫：把每盤棋前若干半回合的 (局面雜湊值, 走法, 權重) 彙總成排序好的二進位檔
+2. 建立時分批彙總，項目數超過上限就把排序好的片段寫到暫存檔，最後合併排序寫出，
+   記憶體用量與棋譜大小無關（可處理數百 MB 的棋譜）
+3. 讀取時以 mmap 對應整個檔案並二元搜尋：開啟時不解析任何項目，
+   多個程序開啟同一個檔案時共用作業系統的分頁快取
+4. 依權重挑選開局走法，供電腦棋手（search.AIPlayer）與分析工具使用
+
+檔案格式（大端序）：
+    檔頭 16 位元組：魔術字 b'WCBOOK01'、項目數（uint64）
+    項目 16 位元組：局面雜湊值（uint64）、走法（uint16）、權重（uint16）、對局數（uint32）
+項目依 (雜湊值, 走法) 排序。雜湊值為 zobrist.py 的 Zobrist key，走法為 position.py 的 16 位元編碼；
+權重為走棋方的得分總和（勝 2、和 1、負 0）；同一局面最大的得分超過 65535 時，
+該局面所有走法的權重依比例縮小（得分不為 0 的走法至少保留 1），走法之間的相對比例不變。
+
+執行方式：
+    python book.py build games.pgn --output book.bin --max-plies 24
+    python book.py probe book.bin --fen "<FEN>"
+    python book.py bench book.bin --output book_bench.json
+"""
+
+import argparse
+import heapq
+import json
+import mmap
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+
+from fen_io import iter_lines
+from pgn import iter_games, move_to_san
+from position import Position, START_FEN, move_to_uci
+
+BOOK_MAGIC = b'WCBOOK01'
+HEADER = struct.Struct('>8sQ')    # 魔術字、項目數
+ENTRY = struct.Struct('>QHHI')    # 雜湊值、走法、權重、對局數
+ENTRY_KEY = struct.Struct('>Q')   # 只讀取項目的雜湊值（二元搜尋用）
+RUN_ENTRY = struct.Struct('>QHQQ')  # 暫存片段：雜湊值、走法、未截斷的得分、對局數
+DEFAULT_MAX_PLIES = 24            # 每盤棋只收錄前幾個半回合
+RUN_ENTRY_BYTES = 160             # 彙總字典每個項目約佔的記憶體（雜湊槽位、兩個 int 物件與寫出時排序的鍵）
+DEFAULT_RUN_MEMORY = 32 << 20     # 記憶體中彙總的預設上限（位元組），超過就寫出一個排序片段
+DEFAULT_RUN_ENTRIES = DEFAULT_RUN_MEMORY // RUN_ENTRY_BYTES  # 約 21 萬個項目
+MAX_WEIGHT = 0xFFFF
+MAX_GAMES = 0xFFFFFFFF
+
+# 對局結果對應的 (白方得分, 黑方得分)；未完成的對局視為和局
+_RESULT_SCORES = {'1-0': (2, 0), '0-1': (0, 2), '1/2-1/2': (1, 1)}
+
+
+def _write_run(entries, directory):
+    """將記憶體中的彙總結果排序後寫入暫存檔，返回檔案路徑"""
+    handle, path = tempfile.mkstemp(prefix='book-run-', suffix='.bin', dir=directory)
+    with os.fdopen(handle, 'wb') as f:
+        pack = RUN_ENTRY.pack
+        for packed in sorted(entries):
+            value = entries[packed]
+            f.write(pack(packed >> 16, packed & 0xFFFF, value >> 32, value & 0xFFFFFFFF))
+    return path
+
+
+def _iter_run(path, chunk_entries=1 << 14):
+    """依序讀出暫存片段的 ((雜湊值 << 16) | 走法, 得分, 對局數)"""
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(RUN_ENTRY.size * chunk_entries)
+            if not chunk:
+                return
+            for key, move, score, games in RUN_ENTRY.iter_unpack(chunk):
+                yield (key << 16) | move, score, games
+
+
+def _iter_memory(entries):
+    """依序產生記憶體中彙總結果的 ((雜湊值 << 16) | 走法, 得分, 對局數)"""
+    for packed in sorted(entries):
+        value = entries[packed]
+        yield packed, value >> 32, value & 0xFFFFFFFF
+
+
+def _scaled_weights(scores):
+    """
+    將同一局面各走法的得分換算成 16 位元權重
+    最大得分不超過 MAX_WEIGHT 時原樣返回，否則全部依比例縮小（得分不為 0 的走法至少為 1）
+    """
+    top = max(scores)
+    if top <= MAX_WEIGHT:
+        return scores
+    return [max(score * MAX_WEIGHT // top, 1) if score else 0 for score in scores]
+
+
+def _pack_position(key, moves):
+    """把同一局面的 [(走法, 得分, 對局數), ...] 打包成開局庫項目（權重依局面縮放）"""
+    pack = ENTRY.pack
+    weights = _scaled_weights([score for _, score, _ in moves])
+    return b''.join(pack(key, move, weight, min(played, MAX_GAMES))
+                    for (move, _, played), weight in zip(moves, weights))
+
+
+def build_book(pgn_paths, output_path, max_plies=DEFAULT_MAX_PLIES, min_games=1,
+               run_entries=DEFAULT_RUN_ENTRIES, skip_invalid=True):
+    """
+    由 PGN 棋譜建立開局庫檔案
+    參數：
+        pgn_paths: PGN 檔案路徑列表
+        output_path: 輸出的開局庫檔案
+        max_plies: 每盤棋只收錄前幾個半回合
+        min_games: 至少出現在幾盤棋中的走法才收錄
+        run_entries: 記憶體中彙總的項目數上限
+        skip_invalid: 略過無法解析的對局
+    返回：統計結果字典（對局數、收錄的項目數、片段數、耗時）
+    """
+    start = time.perf_counter()
+    directory = os.path.dirname(os.path.abspath(output_path))
+    entries = {}  # {(雜湊值 << 16) | 走法: (得分 << 32) | 對局數}
+    runs = []
+    games = 0
+    position = Position()
+    try:
+        for path in pgn_paths:
+            for game in iter_games(path, skip_invalid=skip_invalid):
+                games += 1
+                scores = _RESULT_SCORES.get(game.result, (1, 1))
+                game.start_position(position)
+                for move in game.moves[:max_plies]:
+                    packed = (position.key << 16) | move
+                    entries[packed] = entries.get(packed, 0) + ((scores[position.side_to_move] << 32) | 1)
+                    position.make_move(move)
+                if len(entries) >= run_entries:
+                    runs.append(_write_run(entries, directory))
+                    entries.clear()
+
+        # 合併所有排序片段，相同 (雜湊值, 走法) 的得分與對局數相加
+        sources = [_iter_run(path) for path in runs] + [_iter_memory(entries)]
+        count = 0
+        temp_path = output_path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(HEADER.pack(BOOK_MAGIC, 0))
+            # 合併結果依 (雜湊值, 走法) 排序，同一局面的走法相鄰：收集完一個局面再一起縮放權重寫出
+            position_key, moves = None, []
+            current, score, played = None, 0, 0
+            for packed, run_score, run_games in heapq.merge(*sources, key=lambda item: item[0]):
+                if packed != current:
+                    if current is not None and played >= min_games:
+                        moves.append((current & 0xFFFF, score, played))
+                    current, score, played = packed, 0, 0
+                    if packed >> 16 != position_key:
+                        if moves:
+                            f.write(_pack_position(position_key, moves))
+                            count += len(moves)
+                        position_key, moves = packed >> 16, []
+                score += run_score
+                played += run_games
+            if current is not None and played >= min_games:
+                moves.append((current & 0xFFFF, score, played))
+            if moves:
+                f.write(_pack_position(position_key, moves))
+                count += len(moves)
+            f.seek(0)
+            f.write(HEADER.pack(BOOK_MAGIC, count))
+        os.replace(temp_path, output_path)
+    finally:
+        for path in runs:
+            os.remove(path)
+
+    return {
+        'games': games,
+        'entries': count,
+        'runs': len(runs),
+        'bytes': HEADER.size + count * ENTRY.size,
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+
+
+class OpeningBook:
+    """
+    開局庫讀取類別：以 mmap 對應開局庫檔案並以二元搜尋查詢
+    開啟時只檢查檔頭，不讀取任何項目；查詢時只會讀到二元搜尋經過的分頁
+    屬性：
+        path: 開局庫檔案路徑
+        count: 項目數
+    """
+    def __init__(self, path):
+        """開啟開局庫檔案，格式不符時拋出 ValueError"""
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+            if size < HEADER.size:
+                raise ValueError(f"不是開局庫檔案: {path}")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, self.count = HEADER.unpack_from(self._map, 0)
+            if magic != BOOK_MAGIC or size != HEADER.size + self.count * ENTRY.size:
+                self._map.close()
+                raise ValueError(f"不是開局庫檔案或檔案不完整: {path}")
+        except BaseException:
+            self._file.close()
+            raise
+
+    def __len__(self):
+        """返回項目數"""
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """關閉檔案對應"""
+        if not self._map.closed:
+            self._map.close()
+        self._file.close()
+
+    def _lower_bound(self, key):
+        """返回第一個雜湊值不小於 key 的項目索引"""
+        unpack = ENTRY_KEY.unpack_from
+        data = self._map
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) >> 1
+            if unpack(data, HEADER.size + middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def entries(self, key):
+        """返回雜湊值為 key 的所有項目 [(走法, 權重, 對局數), ...]"""
+        result = []
+        data = self._map
+        index = self._lower_bound(key)
+        while index < self.count:
+            entry_key, move, weight, games = ENTRY.unpack_from(data, HEADER.size + index * ENTRY.size)
+            if entry_key != key:
+                break
+            result.append((move, weight, games))
+            index += 1
+        return result
+
+    def probe(self, position):
+        """
+        查詢局面的開局走法，返回 [(走法, 權重, 對局數), ...]，依權重由高到低排列
+        只返回在局面中合法的走法（排除雜湊值碰撞造成的錯誤項目）
+        """
+        entries = self.entries(position.key)
+        if not entries:
+            return []
+        legal = set(position.generate_moves())
+        entries = [entry for entry in entries if entry[0] in legal]
+        entries.sort(key=lambda entry: entry[1], reverse=True)
+        return entries
+
+    def choose(self, position, rng=None, best=False):
+        """
+        挑選開局走法：依權重隨機選擇（best 為 True 時選權重最高的走法）
+        局面不在開局庫中或所有走法權重都是 0 時返回 None
+        """
+        entries = [entry for entry in self.probe(position) if entry[1] > 0]
+        if not entries:
+            return None
+        if best:
+            return entries[0][0]
+        rng = rng or random
+        return rng.choices([entry[0] for entry in entries],
+                           weights=[entry[1] for entry in entries])[0]
+
+
+def run_benchmark(path, fens=None, lookups=100000):
+    """
+    測量開局庫的開啟時間與查詢速度：
+    以開局庫中隨機取樣的雜湊值（另加 fens 中的局面）反覆查詢，返回結果字典
+    """
+    start = time.perf_counter()
+    book = OpeningBook(path)
+    open_seconds = time.perf_counter() - start
+    try:
+        rng = random.Random(0)
+        keys = [ENTRY_KEY.unpack_from(book._map, HEADER.size + rng.randrange(book.count) * ENTRY.size)[0]
+                for _ in range(min(book.count, 1000))]
+        if fens:
+            keys += [Position.from_fen(fen).key for fen in fens]
+        if not keys:
+            keys = [Position.from_fen(START_FEN).key]
+        found = 0
+        start = time.perf_counter()
+        for index in range(lookups):
+            if book.entries(keys[index % len(keys)]):
+                found += 1
+        seconds = time.perf_counter() - start
+    finally:
+        book.close()
+    return {
+        'path': path,
+        'entries': book.count,
+        'bytes': HEADER.size + book.count * ENTRY.size,
+        'open_ms': round(open_seconds * 1000, 3),
+        'lookups': lookups,
+        'found': found,
+        'lookups_per_sec': int(lookups / seconds) if seconds > 0 else None,
+    }
+
+
+def main(argv=None):
+    """命令列入口：建立、查詢開局庫或測量查詢速度"""
+    parser = argparse.ArgumentParser(description='西洋棋開局庫（mmap 二元搜尋）')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help='由 PGN 棋譜建立開局庫')
+    build.add_argument('pgn', nargs='+', help='PGN 檔案')
+    build.add_argument('--output', required=True, help='輸出的開局庫檔案')
+    build.add_argument('--max-plies', type=int, default=DEFAULT_MAX_PLIES, help='每盤棋收錄的半回合數')
+    build.add_argument('--min-games', type=int, default=1, help='至少出現在幾盤棋中的走法才收錄')
+    build.add_argument('--run-entries', type=int, default=DEFAULT_RUN_ENTRIES,
+                       help=f'記憶體中彙總的項目數上限（每個約 {RUN_ENTRY_BYTES} 位元組，預設約 {DEFAULT_RUN_MEMORY >> 20} MB）')
+
+    probe = commands.add_parser('probe', help='列出局面的開局走法')
+    probe.add_argument('book', help='開局庫檔案')
+    probe.add_argument('--fen', default=START_FEN, help='要查詢的 FEN 局面')
+
+    bench = commands.add_parser('bench', help='測量開啟時間與查詢速度')
+    bench.add_argument('book', help='開局庫檔案')
+    bench.add_argument('--fens', help='另外查詢的 FEN/EPD 檔')
+    bench.add_argument('--lookups', type=int, default=100000, help='查詢次數')
+    bench.add_argument('--output', help='將結果寫入 JSON 檔')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        result = build_book(args.pgn, args.output, args.max_plies, args.min_games, args.run_entries)
+        print(f"{result['games']:,} 盤對局  {result['entries']:,} 個項目  "
+              f"{result['bytes']:,} 位元組  {result['runs']} 個暫存片段  {result['seconds']:.2f} 秒")
+    elif args.command == 'probe':
+        position = Position.from_fen(args.fen)
+        with OpeningBook(args.book) as book:
+            entries = book.probe(position)
+        if not entries:
+            print('局面不在開局庫中')
+        legal = position.generate_moves()
+        for move, weight, games in entries:
+            print(f"{move_to_san(position, move, legal):8s} {move_to_uci(move):6s} "
+                  f"權重 {weight:6d}  {games:,} 盤")
+    else:
+        fens = list(iter_lines(args.fens)) if args.fens else None
+        result = run_benchmark(args.book, fens, args.lookups)
+        print(f"{result['entries']:,} 個項目  開啟 {result['open_ms']:.3f} ms  "
+              f"{result['lookups_per_sec'] or 0:,} lookups/sec（命中 {result['found']:,}）")
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(result, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
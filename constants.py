@@ -4,10 +4,9 @@
 2. 棋盤的基本參數
 3. 界面元素（如按鈕）的尺寸
 4. 遊戲中使用的各種顏色值
+5. 棋子顏色與種類的編號
 """
 
-import pygame
-
 # 視窗和棋盤尺寸設定
 DEFAULT_WINDOW_SIZE = 800  # 預設視窗大小（像素）
 MIN_WINDOW_SIZE = 400     # 最小視窗大小（像素），防止視窗縮得太小
@@ -21,6 +20,16 @@ BUTTON_MARGIN = 5        # 按鈕之間的間距（像素）
 # 顏色設定（RGB 或 RGBA 格式）
 BEIGE = (200, 220, 220)  # 米黃色 - 用於棋盤淺色格
 DARK_BROWN = (139, 69, 19)  # 深棕色 - 用於棋盤深色格
-BLACK = (0, 0, 0)        # 黑色 - 用於文字和邊框
+TEXT_COLOR = (0, 0, 0)   # 黑色 - 用於文字和邊框
 HIGHLIGHT = (255, 255, 0, 100)  # 黃色半透明 - 用於高亮顯示選中的棋子
 VALID_MOVE_COLOR = (128, 128, 128, 128)  # 半透明灰色 - 用於標記棋子可移動的位置
+ATTACK_COLOR = (220, 40, 40, 70)  # 半透明紅色 - 用於標記被對方攻擊的格子
+HUD_BACKGROUND = (20, 20, 20)   # 深灰色 - 效能 HUD 的背景
+HUD_TEXT_COLOR = (230, 230, 230)  # 淺灰色 - 效能 HUD 的文字
+
+# 棋子顏色與種類編號（位元棋盤後端使用）
+WHITE = 0                # 白方
+BLACK = 1                # 黑方
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)  # 兵、騎士、主教、城堡、皇后、國王
+COLOR_NAMES = ('white', 'black')  # 顏色編號對應的名稱
+PIECE_NAMES = ('pawn', 'knight', 'bishop', 'rook', 'queen', 'king')  # 種類編號對應的名稱
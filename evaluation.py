@@ -0,0 +1,109 @@
+"""
+局面評估模組 - 這個檔案負責：
+1. 定義各種棋子的子力價值
+2. 定義各種棋子的位置分數表（piece-square tables）
+3. 以子力加位置分數評估局面，分數以走棋方的角度表示（單位：百分之一兵）
+
+位置分數表以白方視角書寫，第一列為第 8 橫列（row 0），
+與格子編號 square = row * 8 + col 的順序一致；黑方查表時上下翻轉（sq ^ 56）。
+"""
+
+from constants import WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING
+from bitboard import iter_bits
+
+# 子力價值（兵、騎士、主教、城堡、皇后、國王）
+PIECE_VALUES = [100, 320, 330, 500, 900, 0]
+
+# 位置分數表（白方視角，row 0 為第 8 橫列）
+PAWN_TABLE = [
+      0,   0,   0,   0,   0,   0,   0,   0,
+     50,  50,  50,  50,  50,  50,  50,  50,
+     10,  10,  20,  30,  30,  20,  10,  10,
+      5,   5,  10,  25,  25,  10,   5,   5,
+      0,   0,   0,  20,  20,   0,   0,   0,
+      5,  -5, -10,   0,   0, -10,  -5,   5,
+      5,  10,  10, -20, -20,  10,  10,   5,
+      0,   0,   0,   0,   0,   0,   0,   0,
+]
+KNIGHT_TABLE = [
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20,   0,   0,   0,   0, -20, -40,
+    -30,   0,  10,  15,  15,  10,   0, -30,
+    -30,   5,  15,  20,  20,  15,   5, -30,
+    -30,   0,  15,  20,  20,  15,   0, -30,
+    -30,   5,  10,  15,  15,  10,   5, -30,
+    -40, -20,   0,   5,   5,   0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50,
+]
+BISHOP_TABLE = [
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,  10,  10,   5,   0, -10,
+    -10,   5,   5,  10,  10,   5,   5, -10,
+    -10,   0,  10,  10,  10,  10,   0, -10,
+    -10,  10,  10,  10,  10,  10,  10, -10,
+    -10,   5,   0,   0,   0,   0,   5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20,
+]
+ROOK_TABLE = [
+      0,   0,   0,   0,   0,   0,   0,   0,
+      5,  10,  10,  10,  10,  10,  10,   5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+      0,   0,   0,   5,   5,   0,   0,   0,
+]
+QUEEN_TABLE = [
+    -20, -10, -10,  -5,  -5, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,   5,   5,   5,   0, -10,
+     -5,   0,   5,   5,   5,   5,   0,  -5,
+      0,   0,   5,   5,   5,   5,   0,  -5,
+    -10,   5,   5,   5,   5,   5,   0, -10,
+    -10,   0,   5,   0,   0,   0,   0, -10,
+    -20, -10, -10,  -5,  -5, -10, -10, -20,
+]
+KING_TABLE = [
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+     20,  20,   0,   0,   0,   0,  20,  20,
+     20,  30,  10,   0,   0,  10,  30,  20,
+]
+PIECE_TABLES = [PAWN_TABLE, KNIGHT_TABLE, BISHOP_TABLE, ROOK_TABLE, QUEEN_TABLE, KING_TABLE]
+
+
+def _build_piece_square():
+    """建立以棋子編號索引的合併分數表：子力價值加位置分數，黑方已翻轉並取負號"""
+    tables = []
+    for color in (WHITE, BLACK):
+        for kind in (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING):
+            table = PIECE_TABLES[kind]
+            if color == WHITE:
+                tables.append([PIECE_VALUES[kind] + table[sq] for sq in range(64)])
+            else:
+                tables.append([-(PIECE_VALUES[kind] + table[sq ^ 56]) for sq in range(64)])
+    return tables
+
+
+PIECE_SQUARE = _build_piece_square()
+
+
+def evaluate(position):
+    """
+    評估局面：
+    加總所有棋子的子力價值與位置分數（白方為正、黑方為負），
+    再轉換為走棋方的角度返回
+    """
+    score = 0
+    pieces = position.pieces
+    for piece in range(12):
+        table = PIECE_SQUARE[piece]
+        for sq in iter_bits(pieces[piece]):
+            score += table[sq]
+    return score if position.side_to_move == WHITE else -score
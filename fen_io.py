@@ -0,0 +1,192 @@
+"""
+FEN/EPD 批次讀取模組 - 這個檔案負責：
+1. 以記憶體映射（mmap）分塊讀取大型 FEN/EPD 檔案，逐行產生局面，不會一次載入整個檔案
+2. 把每一行解析到同一個可重複使用的 Position 物件，不為每個局面建立 ChessPiece 或新的局面物件
+3. 解析與輸出 EPD 的操作欄位（如 bm、id）
+4. 測量載入吞吐量（positions/sec），並與只讀取不解析的速度比較，確認瓶頸在 I/O 還是解析
+
+每行一個局面：FEN（可省略半回合數與回合數）或 EPD（前四個欄位後接操作欄位）；
+空行與以 # 開頭的行會被略過。
+
+執行方式：
+    python fen_io.py positions.epd
+    python fen_io.py positions.epd --chunk-size 4194304 --output load.json
+"""
+
+import argparse
+import json
+import mmap
+import os
+import re
+import sys
+import time
+
+from position import Position
+
+DEFAULT_CHUNK_SIZE = 1 << 20  # 每次從映射中取出的位元組數
+
+# EPD 操作欄位：操作碼後接以分號結尾的運算元（運算元可以是含空白的雙引號字串）
+_EPD_OPERATION = re.compile(r'([A-Za-z]\w*)\s*((?:"[^"]*"|[^;"])*);')
+# FEN 第五、六個欄位的半回合數與回合數
+_FEN_CLOCKS = re.compile(r'\d+\s+\d+\s*$')
+
+
+def iter_lines(path, chunk_size=DEFAULT_CHUNK_SIZE, encoding='utf-8'):
+    """
+    以記憶體映射分塊讀取檔案，逐一產生去除空白後的非空行（# 開頭的行除外）
+    每個分塊只在最後一個換行處切開，跨分塊的行會與下一塊接起來；
+    無法以 encoding 解碼的位元組以替代字元表示
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            size = len(mapped)
+            pending = b''
+            start = 0
+            while start < size:
+                chunk = mapped[start:start + chunk_size]
+                start += len(chunk)
+                cut = chunk.rfind(b'\n') + 1
+                if cut == 0 and start < size:
+                    pending += chunk
+                    continue
+                if start >= size:
+                    cut = len(chunk)
+                block = (pending + chunk[:cut]) if pending else chunk[:cut]
+                pending = chunk[cut:]
+                for line in block.decode(encoding, 'replace').splitlines():
+                    line = line.strip()
+                    if line and line[0] != '#':
+                        yield line
+
+
+def split_epd(line):
+    """
+    將一行 FEN/EPD 拆成 (局面欄位, 操作欄位字串)
+    FEN 行的半回合數與回合數不算操作欄位
+    """
+    parts = line.split(None, 4)
+    if len(parts) < 5 or _FEN_CLOCKS.match(parts[4]):
+        return line, ''
+    return ' '.join(parts[:4]), parts[4]
+
+
+def parse_epd_operations(text):
+    """
+    解析 EPD 操作欄位：返回 {操作碼: 運算元字串}
+    雙引號字串會去除引號，沒有運算元的操作碼對應空字串
+    """
+    operations = {}
+    for opcode, operand in _EPD_OPERATION.findall(text):
+        operand = operand.strip()
+        if len(operand) >= 2 and operand[0] == '"' and operand[-1] == '"':
+            operand = operand[1:-1]
+        operations[opcode] = operand
+    return operations
+
+
+def format_epd(position, operations=None):
+    """
+    將局面與操作欄位輸出為一行 EPD
+    參數：
+        operations: {操作碼: 運算元} 字典；含空白的運算元會加上雙引號
+    """
+    text = position.to_fen(clocks=False)
+    for opcode, operand in (operations or {}).items():
+        operand = str(operand)
+        if ' ' in operand or ';' in operand:
+            operand = f'"{operand}"'
+        text += f' {opcode} {operand};' if operand else f' {opcode};'
+    return text
+
+
+def iter_positions(path, position=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                   with_operations=False, skip_invalid=False):
+    """
+    串流讀取 FEN/EPD 檔案中的局面
+    參數：
+        position: 重複使用的 Position 物件，None 時建立一個
+        chunk_size: 每次讀取的位元組數
+        with_operations: 是否同時產生 EPD 操作欄位字典
+        skip_invalid: 略過格式錯誤的行；否則拋出 ValueError（訊息含行號）
+    產生：
+        每一行都是同一個 position 物件（已設定為該行的局面），需要保留時請呼叫 copy()；
+        with_operations 為 True 時產生 (position, 操作欄位字典)
+    """
+    if position is None:
+        position = Position()
+    set_fen = position.set_fen
+    for number, line in enumerate(iter_lines(path, chunk_size), 1):
+        try:
+            set_fen(line)
+        except ValueError as error:
+            if skip_invalid:
+                continue
+            raise ValueError(f"{path} 第 {number} 個局面: {error}") from None
+        if with_operations:
+            yield position, parse_epd_operations(split_epd(line)[1])
+        else:
+            yield position
+
+
+def run_benchmark(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    測量載入吞吐量：
+    1. 只讀取行（I/O 與分行的基準速度）
+    2. 讀取並解析到可重複使用的局面
+    返回包含局面數、耗時、positions/sec 與 MB/sec 的結果紀錄
+    """
+    size = os.path.getsize(path)
+    start = time.perf_counter()
+    lines = sum(1 for _ in iter_lines(path, chunk_size))
+    io_seconds = time.perf_counter() - start
+
+    invalid = 0
+    count = 0
+    position = Position()
+    start = time.perf_counter()
+    for line in iter_lines(path, chunk_size):
+        try:
+            position.set_fen(line)
+            count += 1
+        except ValueError:
+            invalid += 1
+    seconds = time.perf_counter() - start
+    return {
+        'path': path,
+        'bytes': size,
+        'chunk_size': chunk_size,
+        'positions': count,
+        'invalid': invalid,
+        'io_seconds': round(io_seconds, 6),
+        'io_lines_per_sec': int(lines / io_seconds) if io_seconds > 0 else None,
+        'seconds': round(seconds, 6),
+        'positions_per_sec': int(count / seconds) if seconds > 0 else None,
+        'mb_per_sec': round(size / seconds / 1e6, 2) if seconds > 0 else None,
+    }
+
+
+def main(argv=None):
+    """命令列入口：載入 FEN/EPD 檔案並回報吞吐量"""
+    parser = argparse.ArgumentParser(description='FEN/EPD 批次載入與吞吐量測試')
+    parser.add_argument('path', help='FEN 或 EPD 檔案（每行一個局面）')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='每次讀取的位元組數（預設 1 MiB）')
+    parser.add_argument('--output', help='將結果寫入 JSON 檔')
+    args = parser.parse_args(argv)
+
+    result = run_benchmark(args.path, args.chunk_size)
+    print(f"{result['positions']:,} 個局面（{result['invalid']:,} 行格式錯誤）  "
+          f"{result['seconds']:.3f} 秒  {result['positions_per_sec'] or 0:,} positions/sec  "
+          f"{result['mb_per_sec'] or 0} MB/sec")
+    print(f"只讀取不解析: {result['io_seconds']:.3f} 秒  "
+          f"{result['io_lines_per_sec'] or 0:,} lines/sec")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,333 @@
+"""
+多盤對局伺服器模組 - 這個檔案負責：
+1. 以 SessionManager 在同一個程序中保存大量對局，每盤只有一個無畫面的 Position
+   （ChessBoard 的規則核心，不含視窗大小、縮放、選取狀態與繪圖資源）
+2. 以 asyncio 提供本機 TCP 連線，協定為一行一個 JSON 物件的請求與回應
+3. 支援快照與還原：把所有對局的起始局面與走法寫入 JSON 檔，重新啟動後可完整還原（含悔棋紀錄）；
+   快照檔固定為啟動時 --snapshot 指定的檔案，序列化、讀檔與重播走法在執行緒池中進行，不阻塞其他連線
+
+請求格式：{"id": <任意值>, "op": <操作>, ...}，回應會帶回同一個 id，並有 "ok" 欄位；
+失敗時 "ok" 為 false 並附上 "error"。操作：
+    new       {"fen"?}                         建立對局，返回 game
+    move      {"game", "move": "e2e4"}         走棋（UCI 記譜）
+    undo      {"game"}                         悔一步
+    state     {"game"}                         查詢局面
+    close     {"game"}                         結束並移除對局
+    snapshot  {}                               寫入快照檔
+    restore   {}                               由快照檔還原（取代目前所有對局）
+    stats     {}                               伺服器統計
+move、new、undo、state 加上 "legal": true 時，回應會附上目前局面的合法走法列表。
+
+執行方式：
+    python game_server.py --port 8765 --snapshot sessions.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from position import Position, START_FEN, move_to_uci, parse_uci_move
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+MAX_GAMES = 100000          # 同時保存的對局數上限
+MAX_REQUEST_BYTES = 1 << 16  # 單一請求行的長度上限
+
+
+def load_games(data):
+    """
+    由快照資料重建對局（不修改任何 SessionManager，可在執行緒池中執行）
+    每一步都必須是當時局面的合法走法，任何一盤不合法時拋出 ValueError
+    返回：({對局編號: Position}, {對局編號: 起始 FEN}, 下一個對局編號)
+    """
+    games = {}
+    start_fens = {}
+    for key, record in data['games'].items():
+        if not isinstance(record['fen'], str):
+            raise ValueError(f"快照中對局 {key} 的 fen 必須是字串")
+        position = Position.from_fen(record['fen'])
+        for move in record['moves']:
+            if move not in position.generate_moves():
+                raise ValueError(f"快照中對局 {key} 含有不合法的走法: {move!r}")
+            position.make_move(move)
+        games[int(key)] = position
+        start_fens[int(key)] = record['fen']
+    return games, start_fens, max(data.get('next_id', 1), max(games, default=0) + 1)
+
+
+def read_snapshot(path):
+    """讀取快照檔並重建對局，返回值同 load_games"""
+    with open(path, encoding='utf-8') as f:
+        return load_games(json.load(f))
+
+
+def write_snapshot(data, path):
+    """將快照資料寫入檔案（先寫暫存檔再取代，避免寫到一半留下損壞的檔案）"""
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(temp_path, path)
+
+
+class SessionManager:
+    """
+    對局管理類別：以對局編號保存輕量的無畫面局面
+    屬性：
+        games: {對局編號: Position}
+        start_fens: {對局編號: 起始局面 FEN}（快照時與走法一起保存）
+        max_games: 同時保存的對局數上限
+    """
+    def __init__(self, max_games=MAX_GAMES):
+        """建立空的對局管理器"""
+        self.games = {}
+        self.start_fens = {}
+        self.max_games = max_games
+        self._next_id = 1
+
+    def __len__(self):
+        """返回目前保存的對局數"""
+        return len(self.games)
+
+    def new_game(self, fen=None):
+        """
+        建立新對局並返回對局編號，fen 為 None 時使用標準初始局面
+        局面先經過 Position.set_fen 的檢查（雙方各一個國王、非走棋方沒有被將軍等），
+        通過後才登記對局；不合法時拋出 ValueError，不會留下任何對局
+        """
+        if len(self.games) >= self.max_games:
+            raise ValueError(f"對局數已達上限 {self.max_games}")
+        if fen is not None and not isinstance(fen, str):
+            raise ValueError('fen 必須是字串')
+        position = Position.from_fen(fen or START_FEN)
+        game_id = self._next_id
+        self._next_id += 1
+        self.games[game_id] = position
+        self.start_fens[game_id] = position.to_fen()
+        return game_id
+
+    def get(self, game_id):
+        """取得對局的局面，不存在時拋出 KeyError"""
+        try:
+            return self.games[game_id]
+        except KeyError:
+            raise KeyError(f"沒有編號 {game_id} 的對局") from None
+
+    def make_move(self, game_id, text):
+        """在對局上走一步（UCI 記譜，只接受 generate_moves 產生的合法走法），返回 16 位元走法"""
+        position = self.get(game_id)
+        move = parse_uci_move(position, text)
+        position.make_move(move)
+        return move
+
+    def undo(self, game_id):
+        """悔一步，沒有走法可悔時拋出 ValueError"""
+        position = self.get(game_id)
+        if not position.history:
+            raise ValueError('沒有可以悔的走法')
+        return position.unmake_move()
+
+    def close(self, game_id):
+        """移除對局"""
+        self.get(game_id)
+        del self.games[game_id]
+        del self.start_fens[game_id]
+
+    def snapshot_data(self):
+        """返回可序列化為 JSON 的快照：每盤的起始局面與 16 位元走法列表"""
+        return {
+            'next_id': self._next_id,
+            'games': {str(game_id): {'fen': self.start_fens[game_id],
+                                     'moves': [record[0] for record in position.history]}
+                      for game_id, position in self.games.items()},
+        }
+
+    def restore_data(self, data):
+        """
+        由快照重建所有對局（取代目前的對局），返回還原的對局數
+        任何一盤不合法時拋出 ValueError，目前的對局保持不變
+        """
+        self.install(*load_games(data))
+        return len(self.games)
+
+    def install(self, games, start_fens, next_id):
+        """以 load_games 重建的對局取代目前所有對局"""
+        self.games = games
+        self.start_fens = start_fens
+        self._next_id = next_id
+
+    def snapshot(self, path):
+        """將快照寫入檔案，返回對局數"""
+        write_snapshot(self.snapshot_data(), path)
+        return len(self.games)
+
+    def restore(self, path):
+        """由快照檔還原，返回還原的對局數"""
+        self.install(*read_snapshot(path))
+        return len(self.games)
+
+
+class GameServer:
+    """
+    對局伺服器類別：把 JSON 請求轉給 SessionManager 並回覆
+    屬性：
+        sessions: 對局管理器
+        snapshot_path: 快照檔路徑（用戶端不能指定其他路徑）
+        requests: 已處理的請求數
+        moves: 已執行的走法數
+        connections: 目前的連線數
+    """
+    def __init__(self, sessions=None, snapshot_path=None):
+        """建立伺服器"""
+        self.sessions = sessions or SessionManager()
+        self.snapshot_path = snapshot_path
+        self.requests = 0
+        self.moves = 0
+        self.connections = 0
+        self._started = time.perf_counter()
+        self._snapshot_lock = asyncio.Lock()  # 同一時間只進行一個快照或還原
+
+    async def handle_connection(self, reader, writer):
+        """處理一個連線：逐行讀取請求並依序回覆，直到對方關閉連線"""
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+                    break
+                if not line:
+                    break
+                response = await self.handle_line(line)
+                writer.write(json.dumps(response, separators=(',', ':')).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def handle_line(self, line):
+        """解析一行 JSON 請求並返回回應字典"""
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return {'ok': False, 'error': '無效的 JSON'}
+        if not isinstance(request, dict):
+            return {'ok': False, 'error': '請求必須是 JSON 物件'}
+        return await self.handle_request(request)
+
+    async def handle_request(self, request):
+        """執行一個請求並返回回應字典（快照與還原的處理函式是協程，會在這裡等待）"""
+        self.requests += 1
+        response = {'id': request.get('id')}
+        handler = getattr(self, '_op_' + str(request.get('op')), None)
+        if handler is None:
+            response.update(ok=False, error=f"未知的操作: {request.get('op')!r}")
+            return response
+        try:
+            result = handler(request)
+            if asyncio.iscoroutine(result):
+                result = await result
+            response.update(result)
+            response['ok'] = True
+        except (KeyError, ValueError, TypeError, OSError) as error:
+            response.update(ok=False, error=str(error.args[0]) if error.args else repr(error))
+        return response
+
+    def _game_state(self, game_id, request):
+        """整理對局狀態：FEN、狀態、已走步數，要求時附上合法走法"""
+        position = self.sessions.get(game_id)
+        state = {'game': game_id, 'fen': position.to_fen(), 'status': position.game_status(),
+                 'ply': len(position.history)}
+        if request.get('legal'):
+            state['legal'] = [move_to_uci(move) for move in position.generate_moves()]
+        return state
+
+    def _op_new(self, request):
+        game_id = self.sessions.new_game(request.get('fen'))
+        try:
+            return self._game_state(game_id, request)
+        except Exception:
+            self.sessions.close(game_id)  # 回應失敗時不留下沒有人知道編號的對局
+            raise
+
+    def _op_move(self, request):
+        self.sessions.make_move(request['game'], request['move'])
+        self.moves += 1
+        return self._game_state(request['game'], request)
+
+    def _op_undo(self, request):
+        self.sessions.undo(request['game'])
+        return self._game_state(request['game'], request)
+
+    def _op_state(self, request):
+        return self._game_state(request['game'], request)
+
+    def _op_close(self, request):
+        self.sessions.close(request['game'])
+        return {'game': request['game']}
+
+    def _require_snapshot_path(self):
+        """返回伺服器的快照檔路徑，沒有設定時拋出 ValueError"""
+        if not self.snapshot_path:
+            raise ValueError('伺服器沒有設定快照檔（--snapshot）')
+        return self.snapshot_path
+
+    async def _op_snapshot(self, request):
+        # 在事件迴圈上複製走法列表（之後的走棋不影響這份資料），序列化與寫檔交給執行緒池
+        path = self._require_snapshot_path()
+        data = self.sessions.snapshot_data()
+        async with self._snapshot_lock:
+            await asyncio.get_running_loop().run_in_executor(None, write_snapshot, data, path)
+        return {'games': len(data['games'])}
+
+    async def _op_restore(self, request):
+        # 讀檔與重播走法在執行緒池中建立新的對局，完成後才一次取代目前的對局
+        path = self._require_snapshot_path()
+        async with self._snapshot_lock:
+            games, start_fens, next_id = await asyncio.get_running_loop().run_in_executor(
+                None, read_snapshot, path)
+        self.sessions.install(games, start_fens, next_id)
+        return {'games': len(games)}
+
+    def _op_stats(self, request):
+        elapsed = time.perf_counter() - self._started
+        return {'games': len(self.sessions), 'connections': self.connections,
+                'requests': self.requests, 'moves': self.moves, 'uptime': round(elapsed, 3)}
+
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, snapshot_path=None):
+    """啟動伺服器並持續執行；有快照檔時先還原，結束時再寫回"""
+    server = GameServer(snapshot_path=snapshot_path)
+    if snapshot_path and os.path.exists(snapshot_path):
+        print(f"由 {snapshot_path} 還原 {server.sessions.restore(snapshot_path)} 盤對局")
+    listener = await asyncio.start_server(server.handle_connection, host, port,
+                                          limit=MAX_REQUEST_BYTES)
+    print(f"對局伺服器在 {host}:{port} 等待連線", flush=True)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        if snapshot_path:
+            print(f"已將 {server.sessions.snapshot(snapshot_path)} 盤對局寫入 {snapshot_path}")
+
+
+def main(argv=None):
+    """命令列入口：啟動對局伺服器"""
+    parser = argparse.ArgumentParser(description='西洋棋多盤對局伺服器')
+    parser.add_argument('--host', default=DEFAULT_HOST, help='監聽位址（預設只接受本機連線）')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='監聽埠號')
+    parser.add_argument('--snapshot', help='快照檔：啟動時還原、結束時寫回')
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.snapshot))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
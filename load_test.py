@@ -0,0 +1,168 @@
+"""
+對局伺服器壓力測試模組 - 這個檔案負責：
+1. 以多個並行的 asyncio 連線對 game_server.py 送出請求，每個連線輪流操作多盤對局
+2. 每步從伺服器回傳的合法走法中隨機選一步，對局結束或達到步數上限後重新開局
+3. 量測每個請求的往返延遲，回報 moves/sec 與 p50/p99/最大延遲
+4. 可自行在本機啟動一個伺服器子程序進行測試
+
+執行方式：
+    python load_test.py --spawn                               # 啟動本機伺服器並測試
+    python load_test.py --port 8765 --clients 50 --games 20 --duration 30
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+from game_server import DEFAULT_HOST, DEFAULT_PORT
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'game_server.py')
+MAX_GAME_PLIES = 200  # 每盤最多走幾步就重新開局
+
+
+class LoadClient:
+    """
+    壓力測試連線類別：一條連線依序送出請求並記錄延遲
+    屬性：
+        latencies: 每個請求的往返延遲（秒）
+        moves: 成功執行的走法數
+        errors: 失敗的請求數
+    """
+    def __init__(self, reader, writer, rng):
+        """以已建立的連線建立測試用戶端"""
+        self.reader = reader
+        self.writer = writer
+        self.rng = rng
+        self.latencies = []
+        self.moves = 0
+        self.errors = 0
+        self._next_id = 0
+
+    async def request(self, **fields):
+        """送出一個請求並等待回應，返回回應字典"""
+        self._next_id += 1
+        fields['id'] = self._next_id
+        start = time.perf_counter()
+        self.writer.write(json.dumps(fields, separators=(',', ':')).encode() + b'\n')
+        await self.writer.drain()
+        line = await self.reader.readline()
+        self.latencies.append(time.perf_counter() - start)
+        response = json.loads(line)
+        if not response.get('ok'):
+            self.errors += 1
+        return response
+
+    async def run(self, games, deadline):
+        """輪流在 games 盤對局上各走一步，直到 deadline（time.perf_counter() 時間）"""
+        states = [await self.request(op='new', legal=True) for _ in range(games)]
+        while time.perf_counter() < deadline:
+            for index, state in enumerate(states):
+                if not state.get('legal') or state['ply'] >= MAX_GAME_PLIES:
+                    await self.request(op='close', game=state['game'])
+                    states[index] = await self.request(op='new', legal=True)
+                    continue
+                response = await self.request(op='move', game=state['game'],
+                                              move=self.rng.choice(state['legal']), legal=True)
+                if response.get('ok'):
+                    self.moves += 1
+                    states[index] = response
+        for state in states:
+            await self.request(op='close', game=state['game'])
+        self.writer.close()
+
+
+def percentile(values, fraction):
+    """返回已排序列表的百分位數（最近排名法）"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))
+    return values[index]
+
+
+async def run_load_test(host, port, clients, games, duration, seed=0):
+    """
+    執行壓力測試：clients 條連線、每條連線 games 盤對局，持續 duration 秒
+    返回包含走法數、請求數、moves/sec 與延遲百分位數（毫秒）的結果紀錄
+    """
+    rng = random.Random(seed)
+    connections = [await asyncio.open_connection(host, port) for _ in range(clients)]
+    workers = [LoadClient(reader, writer, random.Random(rng.random())) for reader, writer in connections]
+    start = time.perf_counter()
+    await asyncio.gather(*(worker.run(games, start + duration) for worker in workers))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for worker in workers for latency in worker.latencies)
+    moves = sum(worker.moves for worker in workers)
+    return {
+        'clients': clients,
+        'games': clients * games,
+        'seconds': round(elapsed, 3),
+        'moves': moves,
+        'requests': len(latencies),
+        'errors': sum(worker.errors for worker in workers),
+        'moves_per_sec': round(moves / elapsed, 1) if elapsed > 0 else None,
+        'requests_per_sec': round(len(latencies) / elapsed, 1) if elapsed > 0 else None,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3) if latencies else 0.0,
+    }
+
+
+async def _wait_for_server(host, port, timeout=10.0):
+    """等待伺服器開始接受連線"""
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+def main(argv=None):
+    """命令列入口：對本機對局伺服器執行壓力測試"""
+    parser = argparse.ArgumentParser(description='對局伺服器壓力測試')
+    parser.add_argument('--host', default=DEFAULT_HOST, help='伺服器位址')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='伺服器埠號')
+    parser.add_argument('--clients', type=int, default=20, help='並行連線數')
+    parser.add_argument('--games', type=int, default=50, help='每條連線同時進行的對局數')
+    parser.add_argument('--duration', type=float, default=10.0, help='測試秒數')
+    parser.add_argument('--spawn', action='store_true', help='自行啟動本機伺服器子程序')
+    parser.add_argument('--output', help='將結果寫入 JSON 檔')
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.spawn:
+        server = subprocess.Popen([sys.executable, SERVER_SCRIPT, '--host', args.host,
+                                   '--port', str(args.port)], stdout=subprocess.DEVNULL)
+    try:
+        if server is not None:
+            asyncio.run(_wait_for_server(args.host, args.port))
+        result = asyncio.run(run_load_test(args.host, args.port, args.clients,
+                                           args.games, args.duration))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print(f"{result['clients']} 條連線  {result['games']:,} 盤對局  {result['seconds']:.1f} 秒")
+    print(f"{result['moves']:,} 步  {result['moves_per_sec']:,} moves/sec  "
+          f"{result['requests_per_sec']:,} requests/sec  錯誤 {result['errors']}")
+    print(f"延遲 p50 {result['p50_ms']:.2f} ms  p99 {result['p99_ms']:.2f} ms  "
+          f"最大 {result['max_ms']:.2f} ms")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,49 +1,123 @@
 """
 主程式檔案 - 這個檔案是西洋棋遊戲的入口點，負責：
 1. 初始化遊戲視窗和基本設置
-2. 處理主要遊戲循環
+2. 處理主要遊戲循環（閒置時阻塞等待事件，只局部更新有變動的畫面區域）
 3. 處理視窗調整大小事件
 4. 管理視窗控制按鈕（最小化、最大化、關閉）
-5. 處理滑鼠事件和遊戲狀態更新
+5. 處理滑鼠事件、悔棋/重做/儲存棋譜快捷鍵、攻擊格子顯示切換和遊戲狀態更新
+6. 可選擇讓電腦（AI）執其中一方，例如：python main.py --ai black --think-time 2
+7. 可由 FEN 指定起始局面，例如：python main.py --fen "<FEN>"
+8. 可指定開局庫讓電腦在開局階段直接走開局庫的走法，例如：python main.py --ai black --book book.bin
+9. 可指定殘局庫讓電腦在少子殘局走出完美走法，例如：python main.py --ai black --tablebase tablebases
+10. 量測每一幀各階段的耗時：F3 切換畫面上的效能 HUD，F4 切換取樣式分析器，
+    --profile-output 將每一幀的樣本寫成 JSON Lines 檔，例如：python main.py --hud --profile-output frames.jsonl
 """
 
+import argparse
 import pygame
 import sys
 from constants import (
     DEFAULT_WINDOW_SIZE, MIN_WINDOW_SIZE, MAX_WINDOW_SIZE,
-    BEIGE, BUTTON_SIZE, BUTTON_MARGIN
+    BEIGE, BUTTON_SIZE, BUTTON_MARGIN, COLOR_NAMES
 )
 from board import ChessBoard
-from ui import update_button_positions, draw_tooltip
+from book import OpeningBook
+from pgn import write_games
+from position import Position
+from profiler import FrameProfiler, SamplingProfiler
+from render import BoardRenderer
+from search import AIPlayer, Searcher
+from tablebase import Tablebase
+from ui import update_button_positions, draw_tooltip, draw_hud
 
-# 初始化 Pygame 遊戲引擎
-pygame.init()
+AI_POLL_INTERVAL = 50  # 電腦思考時檢查結果的間隔（毫秒）
+HUD_INTERVAL = 250     # 效能 HUD 開啟時的更新間隔（毫秒）
+DEFAULT_PGN_PATH = 'games.pgn'  # Ctrl+S 儲存對局的預設檔案
+DEFAULT_STACKS_PATH = 'profile.stacks'  # F4 停止取樣時寫出的 collapsed stack 檔
 
-# 初始化遊戲視窗
-screen = pygame.display.set_mode((DEFAULT_WINDOW_SIZE, DEFAULT_WINDOW_SIZE), pygame.RESIZABLE)
-pygame.display.set_caption("西洋棋")
+# 對局狀態對應的視窗標題
+STATUS_CAPTIONS = {
+    None: "西洋棋",
+    'check': "西洋棋 - 將軍",
+    'checkmate': "西洋棋 - 將死",
+    'stalemate': "西洋棋 - 逼和",
+}
 
-def main():
+def shutdown(profiler, sampler, stacks_path):
+    """結束遊戲：關閉樣本檔、停止取樣（寫出堆疊檔）並關閉 Pygame"""
+    profiler.close()
+    if sampler.running:
+        sampler.stop()
+        sampler.write_collapsed(stacks_path)
+    pygame.quit()
+    sys.exit()
+
+def main(ai_color=None, think_time=1.0, fen=None, pgn_path=DEFAULT_PGN_PATH, book_path=None,
+         tablebase_dir=None, profile_output=None, show_hud=False, stacks_path=DEFAULT_STACKS_PATH):
     """
     主程式循環函數：
+    - 初始化 Pygame 與遊戲視窗（只在執行遊戲時才初始化，匯入本模組不會開啟視窗）
     - 初始化遊戲時鐘和棋盤
     - 處理遊戲事件（關閉、調整視窗大小等）
     - 處理視窗控制按鈕事件
+    - 輪到電腦時在背景思考，完成後走棋
     - 更新遊戲狀態和畫面
+    
+    參數：
+        ai_color: 電腦執哪一方（WHITE/BLACK），None 表示雙方都由玩家操作
+        think_time: 電腦每步的思考時間（秒）
+        fen: 起始局面的 FEN 字串，None 表示標準初始局面
+        pgn_path: 按 Ctrl+S 時儲存對局的 PGN 檔
+        book_path: 電腦使用的開局庫檔案，None 表示不使用開局庫
+        tablebase_dir: 電腦使用的殘局庫目錄，None 表示不使用殘局庫
+        profile_output: 每一幀的量測樣本寫入的 JSON Lines 檔，None 表示不輸出
+        show_hud: 是否一開始就顯示效能 HUD
+        stacks_path: 取樣式分析器停止時寫出的 collapsed stack 檔
     """
-    global screen
-    clock = pygame.time.Clock()
+    # 初始化 Pygame 遊戲引擎與遊戲視窗
+    pygame.init()
+    screen = pygame.display.set_mode((DEFAULT_WINDOW_SIZE, DEFAULT_WINDOW_SIZE), pygame.RESIZABLE)
+    pygame.display.set_caption(STATUS_CAPTIONS[None])
     current_size = DEFAULT_WINDOW_SIZE
-    board = ChessBoard(current_size)
+    board = ChessBoard(current_size, fen)
+    book = OpeningBook(book_path) if book_path else None
+    tablebase = Tablebase(tablebase_dir) if tablebase_dir else None
+    ai = (AIPlayer(ai_color, think_time, Searcher(tablebase=tablebase), book)
+          if ai_color is not None else None)
     
     # 建立視窗右上角的控制按鈕
     buttons = update_button_positions(screen.get_width())
     
+    # 增量繪製器與目前顯示中的提示框
+    renderer = BoardRenderer()
+    tooltip = None       # (提示文字, 滑鼠位置)
+    tooltip_rect = None  # 提示框在畫面上的矩形
+    hover_piece = None   # 目前懸停的棋子
+    hover_text = None    # 懸停棋子的提示文字
+    
+    # 效能量測：每一幀的分段計時、畫面上的 HUD 與取樣式分析器
+    profiler = FrameProfiler(output_path=profile_output)
+    sampler = SamplingProfiler()
+    hud_rect = None      # HUD 在畫面上的矩形
+    hud_time = 0         # 上次繪製 HUD 的時間（毫秒）
+    ai_turn = ai is not None and board.position.side_to_move == ai.color  # 是否輪到電腦走棋
+    
     while True:
-        for event in pygame.event.get():
+        # 閒置時阻塞等待事件（不佔用 CPU）；輪到電腦、電腦思考中或顯示 HUD 時則定時醒來
+        # 迴圈只由事件與這些逾時驅動，不另外以 clock.tick 限制幀率，事件處理完立刻重畫
+        if ai is not None and (ai.thinking or ai.has_result or ai_turn):
+            events = [pygame.event.wait(AI_POLL_INTERVAL)]
+        elif show_hud:
+            events = [pygame.event.wait(HUD_INTERVAL)]
+        else:
+            events = [pygame.event.wait()]
+        profiler.start_frame()  # 等待事件的閒置時間不計入幀時間
+        events += pygame.event.get()
+        profiler.count('events', len(events))
+        
+        for event in events:
             if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
+                shutdown(profiler, sampler, stacks_path)
             elif event.type == pygame.VIDEORESIZE:
                 # 處理視窗大小調整
                 new_size = min(max(min(event.w, event.h), MIN_WINDOW_SIZE), MAX_WINDOW_SIZE)
@@ -51,6 +125,51 @@ def main():
                 current_size = new_size
                 board.resize(current_size)
                 buttons = update_button_positions(screen.get_width())
+                renderer.invalidate()
+                tooltip = tooltip_rect = None
+            elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWRESTORED):
+                # 視窗被遮蔽或還原後內容可能遺失，整個畫面重畫
+                renderer.invalidate()
+                tooltip = tooltip_rect = None
+            elif event.type == pygame.KEYDOWN and event.mod & pygame.KMOD_CTRL and event.key == pygame.K_s:
+                # Ctrl+S 將目前的對局附加到 PGN 檔
+                write_games(pgn_path, [board.game_record()], mode='a')
+                print(f"對局已儲存到 {pgn_path}")
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_a and not event.mod & pygame.KMOD_CTRL:
+                # A 鍵切換是否標記被對方攻擊的格子
+                board.toggle_attacks()
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                # F3 切換效能 HUD
+                show_hud = not show_hud
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F4:
+                # F4 切換取樣式分析器，停止時寫出堆疊檔並輸出最常出現的函式
+                if sampler.toggle():
+                    print("取樣式分析器開始取樣（再按 F4 停止）")
+                else:
+                    sampler.write_collapsed(stacks_path)
+                    print(sampler.report())
+                    print(f"堆疊已寫入 {stacks_path}")
+            elif (event.type == pygame.KEYDOWN and event.mod & pygame.KMOD_CTRL
+                    and event.key in (pygame.K_z, pygame.K_y)):
+                # Ctrl+Z 悔棋、Ctrl+Y 重做（對電腦下棋時先取消思考，一次退回或重做到玩家的回合）
+                if ai is not None:
+                    ai.cancel()
+                if event.key == pygame.K_z:
+                    board.undo_move()
+                    if ai is not None and board.position.side_to_move == ai.color:
+                        board.undo_move()
+                elif event.key == pygame.K_y:
+                    board.redo_move()
+                    if ai is not None and board.position.side_to_move == ai.color:
+                        board.redo_move()
+                pygame.display.set_caption(STATUS_CAPTIONS[board.game_status()])
+            elif event.type == pygame.MOUSEBUTTONDOWN and not (
+                    ai is not None and board.position.side_to_move == ai.color):
+                # 處理滑鼠點擊（選擇或移動棋子，選取時會計算合法目標格）
+                profiler.mark('events')
+                board.handle_click(event.pos)
+                pygame.display.set_caption(STATUS_CAPTIONS[board.game_status()])
+                profiler.mark('click')
             
             # 處理按鈕事件
             for button in buttons:
@@ -60,33 +179,111 @@ def main():
                 elif action == "maximize":
                     if screen.get_flags() & pygame.FULLSCREEN:
                         screen = pygame.display.set_mode((current_size, current_size), pygame.RESIZABLE)
+                        board.resize(current_size)
                     else:
+                        # 全螢幕時棋盤以螢幕的短邊直接繪製（棋子依新的棋格大小重新繪製並快取）
                         screen = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
+                        board.resize(min(screen.get_size()))
                     buttons = update_button_positions(screen.get_width())
+                    renderer.invalidate()
+                    tooltip = tooltip_rect = None
                 elif action == "quit":
-                    pygame.quit()
-                    sys.exit()
+                    shutdown(profiler, sampler, stacks_path)
+        profiler.mark('events')
+        
+        # 輪到電腦時（包括玩家剛在這一幀走完）立刻開始思考，思考完成後走棋
+        ai_turn = (ai is not None and board.position.side_to_move == ai.color
+                   and board.game_status() not in ('checkmate', 'stalemate'))
+        if ai_turn:
+            if not ai.thinking and not ai.has_result:
+                ai.start(board.position)  # 開局庫中的局面會立刻得到走法
+            move = ai.poll()
+            if move is not None:
+                board.make_move(move)
+                pygame.display.set_caption(STATUS_CAPTIONS[board.game_status()])
+        profiler.mark('ai')
         
-        # 繪製遊戲畫面
-        screen.fill(BEIGE)
-        board.draw(screen)
+        # 計算滑鼠懸停的提示框內容
+        mouse_pos = pygame.mouse.get_pos()
+        piece, position = board.get_piece_at_position(mouse_pos)
+        if piece is not hover_piece:
+            # 只在懸停的棋子改變時才重新組合提示文字
+            hover_piece = piece
+            hover_text = f"{piece.chinese_name} 在位置 {position}" if piece else None
+        new_tooltip = (hover_text, mouse_pos) if piece else None
+        profiler.mark('hover')
+        
+        # 提示框改變時，先擦除舊的提示框並讓底下的格子重畫
+        dirty = []
+        if tooltip_rect is not None and new_tooltip != tooltip:
+            screen.fill(BEIGE, tooltip_rect)
+            renderer.mark_dirty(tooltip_rect)
+            dirty.append(tooltip_rect)
+            tooltip_rect = None
+        
+        # HUD 到了更新時間或被關閉時，同樣先擦除並讓底下的格子重畫
+        now = pygame.time.get_ticks()
+        refresh_hud = show_hud and now - hud_time >= HUD_INTERVAL
+        if hud_rect is not None and (refresh_hud or not show_hud):
+            screen.fill(BEIGE, hud_rect)
+            renderer.mark_dirty(hud_rect)
+            dirty.append(hud_rect)
+            hud_rect = None
+        
+        # 只重畫有變動的格子
+        dirty += renderer.draw(board, screen)
         
-        # 繪製按鈕
+        # 繪製與更新區域重疊的按鈕
         for button in buttons:
-            button.draw(screen)
+            if button.rect.collidelist(dirty) != -1:
+                button.draw(screen)
+                dirty.append(button.rect)
+        profiler.mark('draw')
         
-        # 處理滑鼠點擊和懸停事件
-        mouse_pos = pygame.mouse.get_pos()
-        if event.type == pygame.MOUSEBUTTONDOWN:
-            piece, position = board.handle_click(mouse_pos)
-        else:
-            piece, position = board.get_piece_at_position(mouse_pos)
-            if piece:
-                tooltip_text = f"{piece.chinese_name} 在位置 {position}"
-                draw_tooltip(screen, tooltip_text, mouse_pos)
+        # 提示框內容改變或被重畫的區域蓋住時重新繪製
+        if new_tooltip is not None and (new_tooltip != tooltip or dirty):
+            tooltip_rect = draw_tooltip(screen, *new_tooltip)
+            dirty.append(tooltip_rect)
+        tooltip = new_tooltip
+        profiler.mark('tooltip')
+        
+        # HUD 畫在最上層：剛擦除或被重畫的區域蓋住時重新繪製
+        if show_hud and (hud_rect is None or hud_rect.collidelist(dirty) != -1):
+            hud_rect = draw_hud(screen, profiler.hud_lines())
+            hud_time = now
+            dirty.append(hud_rect)
+        profiler.mark('hud')
         
-        pygame.display.flip()  # 更新畫面
-        clock.tick(60)  # 限制幀率為60fps
+        if dirty:
+            pygame.display.update(dirty)  # 只更新有變動的區域
+        profiler.count('dirty', len(dirty))
+        profiler.mark('update')
+        profiler.end_frame()
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description='西洋棋遊戲')
+    parser.add_argument('--ai', choices=COLOR_NAMES, help='讓電腦執白方（white）或黑方（black）')
+    parser.add_argument('--think-time', type=float, default=1.0, help='電腦每步思考時間（秒）')
+    parser.add_argument('--fen', help='以指定的 FEN 局面開始對局')
+    parser.add_argument('--pgn', default=DEFAULT_PGN_PATH, help='按 Ctrl+S 時儲存對局的 PGN 檔')
+    parser.add_argument('--book', help='電腦使用的開局庫檔案（以 book.py build 建立）')
+    parser.add_argument('--tablebase', help='電腦使用的殘局庫目錄（以 tablebase.py build 建立）')
+    parser.add_argument('--hud', action='store_true', help='一開始就顯示效能 HUD（F3 切換）')
+    parser.add_argument('--profile-output', help='將每一幀的量測樣本寫入 JSON Lines 檔')
+    parser.add_argument('--profile-stacks', default=DEFAULT_STACKS_PATH,
+                        help='F4 停止取樣時寫出的 collapsed stack 檔')
+    args = parser.parse_args()
+    if args.fen:
+        try:
+            Position.from_fen(args.fen)
+        except ValueError as error:
+            parser.error(str(error))
+    if args.book:
+        try:
+            OpeningBook(args.book).close()
+        except (OSError, ValueError) as error:
+            parser.error(str(error))
+    if args.tablebase and not Tablebase(args.tablebase).available:
+        parser.error(f"殘局庫目錄中沒有殘局表: {args.tablebase}")
+    main(COLOR_NAMES.index(args.ai) if args.ai else None, args.think_time, args.fen, args.pgn,
+         args.book, args.tablebase, args.profile_output, args.hud, args.profile_stacks)
@@ -0,0 +1,152 @@
+"""
+記憶體測試模組 - 這個檔案負責：
+1. 以 tracemalloc 測量保存大量局面時每個 Position（含列表與復原紀錄）佔用的位元組數與配置次數
+2. 測量產生走法時每個走法保留的位元組數與配置次數（走法列表與其中的整數）
+3. 測量棋盤視圖（ChessBoard）同步與棋子合法移動列表的配置：
+   棋子與座標都是共享物件，同步棋盤與列出合法移動時不應該配置新的棋子或座標
+4. 以 JSON 輸出結果，方便比較修改前後的記憶體用量
+
+局面來源可以是 FEN/EPD 檔，沒有指定時由初始局面以固定亂數種子隨機走棋產生。
+
+執行方式：
+    python memory_bench.py                         # 隨機產生 10000 個局面
+    python memory_bench.py positions.epd --count 100000 --output memory.json
+"""
+
+import argparse
+import itertools
+import json
+import random
+import sys
+import tracemalloc
+
+from board import ChessBoard
+from constants import DEFAULT_WINDOW_SIZE
+from fen_io import iter_lines
+from position import Position, START_FEN
+
+DEFAULT_COUNT = 10000  # 預設測量的局面數
+RANDOM_GAME_PLIES = 60  # 隨機產生局面時每盤最多走的半回合數
+
+# 不計入測量的檔案（tracemalloc 自己的配置）
+_FILTERS = (tracemalloc.Filter(False, tracemalloc.__file__),)
+
+
+def random_fens(count, seed=0):
+    """由初始局面隨機走棋產生 count 個 FEN（固定亂數種子，結果可重現）"""
+    rng = random.Random(seed)
+    position = Position()
+    fens = []
+    while len(fens) < count:
+        position.setup_start()
+        for _ in range(rng.randrange(1, RANDOM_GAME_PLIES)):
+            moves = position.generate_moves()
+            if not moves:
+                break
+            position.make_move(rng.choice(moves))
+        fens.append(position.to_fen())
+    return fens
+
+
+def measure(func):
+    """
+    執行 func 並測量其返回值保留下來的記憶體
+    返回：(返回值, 保留的位元組數, 保留的記憶體區塊數)
+    """
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot().filter_traces(_FILTERS)
+        result = func()
+        after = tracemalloc.take_snapshot().filter_traces(_FILTERS)
+    finally:
+        tracemalloc.stop()
+    stats = after.compare_to(before, 'filename')
+    return (result, sum(stat.size_diff for stat in stats),
+            sum(stat.count_diff for stat in stats))
+
+
+def _per_item(total_bytes, blocks, items):
+    """將總量換算為每個項目的平均值"""
+    items = max(items, 1)
+    return {'bytes': round(total_bytes / items, 1), 'allocations': round(blocks / items, 2)}
+
+
+def run_benchmark(fens):
+    """
+    對 FEN 列表執行所有記憶體測量，返回結果字典：
+    positions（每個局面）、moves（每個產生的走法）、boards（每個棋盤視圖）、
+    sync（每次同步棋盤視圖）、valid_moves（每個合法移動位置）
+    """
+    count = len(fens)
+    result = {'positions': count}
+
+    positions, size, blocks = measure(lambda: [Position.from_fen(fen) for fen in fens])
+    result['per_position'] = _per_item(size, blocks, count)
+
+    move_lists, size, blocks = measure(lambda: [position.generate_moves() for position in positions])
+    moves = sum(len(moves) for moves in move_lists)
+    result['moves'] = moves
+    result['per_move'] = _per_item(size, blocks, moves)
+    del move_lists
+
+    sample = fens[:min(count, 1000)]
+    boards, size, blocks = measure(
+        lambda: [ChessBoard(DEFAULT_WINDOW_SIZE, fen) for fen in sample])
+    result['per_board'] = _per_item(size, blocks, len(sample))
+
+    # 同一個棋盤輪流載入不同局面：格子只放共享的棋子實例，不應有新的配置留下
+    board = boards[0]
+
+    def sync_all():
+        for position in positions[:len(sample)]:
+            board.position = position
+            board.sync_board()
+
+    _, size, blocks = measure(sync_all)
+    result['per_sync'] = _per_item(size, blocks, len(sample))
+
+    def list_valid_moves():
+        lists = []
+        for other in boards:
+            for piece in itertools.chain.from_iterable(other.board):
+                if piece is not None:
+                    lists.append(piece.get_valid_moves(other))
+        return lists
+
+    valid_lists, size, blocks = measure(list_valid_moves)
+    targets = sum(len(targets) for targets in valid_lists)
+    result['valid_moves'] = targets
+    result['per_valid_move'] = _per_item(size, blocks, targets)
+    return result
+
+
+def main(argv=None):
+    """命令列入口：測量局面、走法與棋盤視圖的記憶體用量"""
+    parser = argparse.ArgumentParser(description='局面與走法的記憶體用量測試（tracemalloc）')
+    parser.add_argument('path', nargs='?', help='FEN 或 EPD 檔案（預設隨機產生局面）')
+    parser.add_argument('--count', type=int, default=DEFAULT_COUNT, help='測量的局面數')
+    parser.add_argument('--output', help='將結果寫入 JSON 檔')
+    args = parser.parse_args(argv)
+
+    if args.path:
+        fens = list(itertools.islice(iter_lines(args.path), args.count))
+    else:
+        fens = random_fens(args.count)
+    if not fens:
+        fens = [START_FEN]
+
+    result = run_benchmark(fens)
+    rows = (('每個局面', 'per_position'), ('每個走法', 'per_move'), ('每個棋盤視圖', 'per_board'),
+            ('每次同步棋盤', 'per_sync'), ('每個合法移動位置', 'per_valid_move'))
+    print(f"{result['positions']:,} 個局面  {result['moves']:,} 個走法  "
+          f"{result['valid_moves']:,} 個合法移動位置")
+    for label, key in rows:
+        print(f"{label:10s} {result[key]['bytes']:10.1f} bytes  {result[key]['allocations']:6.2f} 次配置")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
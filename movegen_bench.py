@@ -0,0 +1,203 @@
+"""
+走法產生測試模組 - 這個檔案負責：
+1. 依棋子種類（騎士、主教、城堡、皇后、國王）比較三種產生走法的方式：
+   - loop：每次呼叫都重建方向列表、逐格做 0 <= r < 8 邊界檢查（最早的寫法）
+   - lookup：查攻擊表（kindergarten bitboard）後以 iter_bits 逐位元取出目標格
+   - table：直接走訪 position.py 預先編碼的走法表與由近到遠的射線（generate_moves 使用的方式）
+2. 確認三種方式產生完全相同的走法，並回報各自的 moves/sec
+3. 以 JSON 輸出結果
+
+這裡比較的是不考慮牽制與將軍的 pseudo-legal 走法，只測量各種走訪方式本身的成本。
+
+執行方式：
+    python movegen_bench.py                       # 隨機產生 2000 個局面
+    python movegen_bench.py positions.epd --count 10000 --output movegen.json
+"""
+
+import argparse
+import itertools
+import json
+import sys
+import time
+
+from bitboard import (
+    KNIGHT_ATTACKS, KING_ATTACKS, ROOK_DIRECTIONS, BISHOP_DIRECTIONS,
+    iter_bits, rook_attacks, bishop_attacks, queen_attacks
+)
+from constants import BOARD_SIZE, KNIGHT, BISHOP, ROOK, QUEEN, KING, PIECE_NAMES
+from fen_io import iter_lines
+from memory_bench import random_fens
+from position import (
+    Position, CAPTURE, KNIGHT_MOVES, KING_MOVES, BISHOP_MOVE_RAYS, ROOK_MOVE_RAYS, QUEEN_MOVE_RAYS
+)
+
+DEFAULT_COUNT = 2000  # 預設測試的局面數
+DEFAULT_REPEAT = 3    # 每種方式重複測量的次數（取最快的一次）
+
+KINDS = (KNIGHT, BISHOP, ROOK, QUEEN, KING)
+_KNIGHT_OFFSETS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+_KING_OFFSETS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+
+
+def loop_moves(position, kind):
+    """以逐格走訪與邊界檢查產生走棋方某種棋子的 pseudo-legal 走法"""
+    moves = []
+    us = position.side_to_move
+    mailbox = position.mailbox
+    sliding = kind in (BISHOP, ROOK, QUEEN)
+    if kind == KNIGHT:
+        directions = list(_KNIGHT_OFFSETS)
+    elif kind == KING:
+        directions = list(_KING_OFFSETS)
+    else:
+        directions = []
+        if kind != ROOK:
+            directions += BISHOP_DIRECTIONS
+        if kind != BISHOP:
+            directions += ROOK_DIRECTIONS
+    for sq in iter_bits(position.pieces[us * 6 + kind]):
+        row, col = divmod(sq, BOARD_SIZE)
+        for dr, dc in directions:
+            r, c = row + dr, col + dc
+            while 0 <= r < BOARD_SIZE and 0 <= c < BOARD_SIZE:
+                to = r * BOARD_SIZE + c
+                target = mailbox[to]
+                if target is None:
+                    moves.append(sq | (to << 6))
+                else:
+                    if target // 6 != us:
+                        moves.append(sq | (to << 6) | (CAPTURE << 12))
+                    break
+                if not sliding:
+                    break
+                r += dr
+                c += dc
+    return moves
+
+
+def lookup_moves(position, kind):
+    """以攻擊表查詢加上 iter_bits 產生走棋方某種棋子的 pseudo-legal 走法"""
+    moves = []
+    us = position.side_to_move
+    occ = position.occupied
+    own = position.occupancy[us]
+    enemy = position.occupancy[us ^ 1]
+    for sq in iter_bits(position.pieces[us * 6 + kind]):
+        if kind == KNIGHT:
+            targets = KNIGHT_ATTACKS[sq]
+        elif kind == BISHOP:
+            targets = bishop_attacks(sq, occ)
+        elif kind == ROOK:
+            targets = rook_attacks(sq, occ)
+        elif kind == QUEEN:
+            targets = queen_attacks(sq, occ)
+        else:
+            targets = KING_ATTACKS[sq]
+        targets &= ~own
+        for to in iter_bits(targets & enemy):
+            moves.append(sq | (to << 6) | (CAPTURE << 12))
+        for to in iter_bits(targets & ~enemy):
+            moves.append(sq | (to << 6))
+    return moves
+
+
+def table_moves(position, kind):
+    """以預先編碼的走法表與射線產生走棋方某種棋子的 pseudo-legal 走法"""
+    moves = []
+    append = moves.append
+    us = position.side_to_move
+    occ = position.occupied
+    own = position.occupancy[us]
+    enemy = position.occupancy[us ^ 1]
+    if kind in (KNIGHT, KING):
+        table = KNIGHT_MOVES if kind == KNIGHT else KING_MOVES
+        for sq in iter_bits(position.pieces[us * 6 + kind]):
+            for bit, quiet, capture in table[sq]:
+                if not bit & own:
+                    append(capture if bit & enemy else quiet)
+        return moves
+    move_rays = {BISHOP: BISHOP_MOVE_RAYS, ROOK: ROOK_MOVE_RAYS, QUEEN: QUEEN_MOVE_RAYS}[kind]
+    for sq in iter_bits(position.pieces[us * 6 + kind]):
+        for ray in move_rays[sq]:
+            for bit, quiet, capture in ray:
+                if bit & occ:
+                    if bit & enemy:
+                        append(capture)
+                    break
+                append(quiet)
+    return moves
+
+
+METHODS = {'loop': loop_moves, 'lookup': lookup_moves, 'table': table_moves}
+
+
+def _time_method(func, positions, kind, repeat):
+    """測量 func 在所有局面上產生某種棋子走法的最短耗時，返回 (走法數, 秒數)"""
+    best = None
+    count = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = 0
+        for position in positions:
+            count += len(func(position, kind))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return count, best
+
+
+def run_benchmark(fens, repeat=DEFAULT_REPEAT):
+    """
+    對 FEN 列表依棋子種類比較三種走法產生方式
+    返回：{'positions', 'kinds': {種類名稱: {'moves', 'matches', 方式: moves/sec}}, 'generate_moves'}
+    """
+    positions = [Position.from_fen(fen) for fen in fens]
+    result = {'positions': len(positions), 'kinds': {}}
+    for kind in KINDS:
+        matches = all(
+            sorted(loop_moves(position, kind)) == sorted(lookup_moves(position, kind))
+            == sorted(table_moves(position, kind))
+            for position in positions)
+        entry = {'matches': matches}
+        for name, func in METHODS.items():
+            count, seconds = _time_method(func, positions, kind, repeat)
+            entry['moves'] = count
+            entry[name] = int(count / seconds) if seconds > 0 else None
+        result['kinds'][PIECE_NAMES[kind]] = entry
+
+    count, seconds = _time_method(lambda position, _: position.generate_moves(),
+                                  positions, None, repeat)
+    result['generate_moves'] = {'moves': count,
+                                'moves_per_sec': int(count / seconds) if seconds > 0 else None}
+    return result
+
+
+def main(argv=None):
+    """命令列入口：依棋子種類比較走法產生方式的速度"""
+    parser = argparse.ArgumentParser(description='依棋子種類比較走法產生方式的速度')
+    parser.add_argument('path', nargs='?', help='FEN 或 EPD 檔案（預設隨機產生局面）')
+    parser.add_argument('--count', type=int, default=DEFAULT_COUNT, help='測試的局面數')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='重複測量次數（取最快）')
+    parser.add_argument('--output', help='將結果寫入 JSON 檔')
+    args = parser.parse_args(argv)
+
+    if args.path:
+        fens = list(itertools.islice(iter_lines(args.path), args.count))
+    else:
+        fens = random_fens(args.count)
+
+    result = run_benchmark(fens, args.repeat)
+    print(f"{result['positions']:,} 個局面（moves/sec）")
+    print(f"{'棋子':8s} {'走法數':>8s} {'loop':>12s} {'lookup':>12s} {'table':>12s}")
+    for name, entry in result['kinds'].items():
+        mark = '' if entry['matches'] else '  走法不一致！'
+        print(f"{name:8s} {entry['moves']:8,d} {entry['loop']:12,d} {entry['lookup']:12,d} "
+              f"{entry['table']:12,d}{mark}")
+    print(f"generate_moves（完全合法）: {result['generate_moves']['moves_per_sec']:,} moves/sec")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+    return 0 if all(entry['matches'] for entry in result['kinds'].values()) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,269 @@
+"""
+平行搜尋模組 - 這個檔案負責：
+1. 以多個工作程序（process pool）分擔根節點走法，突破 GIL 只能使用單核心的限制
+2. 每一層迭代先以完整視窗搜尋主要變例走法，其餘走法分成與工作程序數量相同的幾批，
+   每批只傳送一次局面；工作程序依序以零寬度視窗驗證，分數更高的走法就地以完整視窗重新搜尋
+3. 每個工作程序保留自己的搜尋器與置換表，在同一次搜尋的各層之間重複利用
+4. 因時間用完而沒有完成的迭代整個捨棄，採用上一次完整迭代的結果
+5. 提供擴展性測試：比較不同工作程序數量的耗時、nodes/sec 與相對 1 個程序的加速比
+
+執行方式：
+    python parallel_search.py --workers 8 --time 5          # 分析初始局面
+    python parallel_search.py --bench --workers 1,2,4,8 --depth 5 --output scaling.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from position import Position, START_FEN, move_to_uci
+from search import Searcher, INFINITY, MATE_BOUND, MAX_PLY, format_info
+
+# 擴展性測試使用的局面
+BENCH_POSITIONS = [
+    START_FEN,
+    'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+    'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+    'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+]
+
+# 工作程序內的搜尋器（由 _init_worker 建立）
+_worker_searcher = None
+_worker_search_id = None
+
+
+def _init_worker(tt_size):
+    """工作程序初始化：建立該程序專用的搜尋器"""
+    global _worker_searcher
+    _worker_searcher = Searcher(tt_size)
+
+
+def _search_root_batch(position, moves, depth, alpha, deadline, search_id):
+    """
+    工作程序任務：在同一個局面上依序搜尋一批根走法（局面每批只傳送一次）
+    alpha 為 -INFINITY 時以完整視窗搜尋；否則先以 (alpha, alpha + 1) 零寬度視窗驗證，
+    分數超過 alpha 時再以 (alpha, INFINITY) 重新搜尋取得精確分數，alpha 隨之提高
+    參數：
+        deadline: 以 time.time() 表示的截止時間，None 表示不限時間
+        search_id: 搜尋編號，換成新的搜尋時讓置換表進入新世代
+    返回：({走法: 精確分數}, 是否完成整批, 節點數, 置換表查詢次數, 置換表命中次數)
+          只有超過 alpha 的走法有精確分數；時間用完時「是否完成」為 False
+    """
+    global _worker_search_id
+    searcher = _worker_searcher
+    if search_id != _worker_search_id:
+        searcher.tt.new_search()
+        _worker_search_id = search_id
+    searcher.nodes = 0
+    searcher.tt.reset_stats()
+    scores = {}
+    complete = True
+    for move in moves:
+        time_limit = None
+        if deadline is not None:
+            time_limit = deadline - time.time()
+            if time_limit <= 0:
+                complete = False
+                break
+        if alpha > -INFINITY:
+            score = searcher.search_move(position, move, depth, alpha, alpha + 1, time_limit)
+            if score is None:
+                complete = False
+                break
+            if score <= alpha:
+                continue
+            if deadline is not None:
+                time_limit = deadline - time.time()
+        score = searcher.search_move(position, move, depth, alpha, INFINITY, time_limit)
+        if score is None:
+            complete = False
+            break
+        if score > alpha:
+            scores[move] = alpha = score
+    return scores, complete, searcher.nodes, searcher.tt.probes, searcher.tt.hits
+
+
+class ParallelSearcher:
+    """
+    平行搜尋器類別：以根節點分割的方式在多個程序間分配搜尋工作
+    屬性：
+        workers: 工作程序數量
+        nodes: 本次搜尋所有工作程序的節點數總和
+        tt_probes, tt_hits: 本次搜尋所有工作程序的置換表查詢與命中次數
+        last_info: 最後一次完成的迭代資訊（格式與 Searcher 相同）
+    """
+    def __init__(self, workers=None, tt_size=1 << 18):
+        """建立工作程序池，workers 預設為 CPU 核心數"""
+        self.workers = workers or os.cpu_count() or 1
+        self.nodes = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.last_info = None
+        self._search_id = 0
+        self._orderer = Searcher(1)  # 只用來以 MVV-LVA 排列根走法（不搜尋，置換表只需一格）
+        self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                             initializer=_init_worker, initargs=(tt_size,))
+
+    def close(self):
+        """關閉工作程序池"""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def search(self, position, max_depth=MAX_PLY, time_limit=None, on_iteration=None):
+        """
+        迭代加深的平行搜尋，參數與返回值同 Searcher.search
+        """
+        self._search_id += 1
+        self.nodes = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.last_info = None
+        start = time.perf_counter()
+        deadline = time.time() + time_limit if time_limit else None
+
+        root_moves = self._orderer._order_moves(position, position.generate_moves(), 0, 0)
+        if not root_moves:
+            return None
+        best_move = root_moves[0]
+        scores = {}
+        for depth in range(1, max_depth + 1):
+            # 上一層的最佳走法優先，其餘依上一層分數排序
+            ordered = sorted(root_moves, key=lambda move: (move != best_move,
+                                                           -scores.get(move, -INFINITY)))
+            result = self._search_iteration(position, ordered, depth, deadline)
+            if result is None:
+                break
+            best_move, best_score, scores = result
+            elapsed = time.perf_counter() - start
+            self.last_info = {
+                'depth': depth,
+                'score': best_score,
+                'nodes': self.nodes,
+                'time': elapsed,
+                'nps': int(self.nodes / elapsed) if elapsed > 0 else 0,
+                'tt_hit_rate': self.tt_hits / self.tt_probes if self.tt_probes else 0.0,
+                'hashfull': 0,
+                'pv': [best_move],
+            }
+            if on_iteration is not None:
+                on_iteration(self.last_info)
+            if abs(best_score) > MATE_BOUND:
+                break
+            if time_limit and elapsed > time_limit * 0.5:
+                break
+        return best_move
+
+    def _search_iteration(self, position, ordered, depth, deadline):
+        """
+        搜尋一層迭代：
+        1. 以完整視窗搜尋第一個走法，得到 alpha
+        2. 其餘走法輪流分配成 workers 批（每批都混有排序靠前與靠後的走法），
+           以 alpha 為起點平行搜尋，每批在工作程序內自行驗證與重新搜尋
+        3. 各批回傳的精確分數中最高者為最佳走法（零寬度視窗的結果只是界限，不會記入 scores）
+        返回：(最佳走法, 最佳分數, {走法: 精確分數})，時間用完而沒有完成整層時返回 None
+        """
+        submit = self._executor.submit
+        first = ordered[0]
+        scores, complete = self._collect(submit(_search_root_batch, position, [first], depth,
+                                                -INFINITY, deadline, self._search_id))
+        if not complete:
+            return None
+        best_move, best_score = first, scores[first]
+
+        rest = ordered[1:]
+        futures = [submit(_search_root_batch, position, rest[index::self.workers], depth,
+                          best_score, deadline, self._search_id)
+                   for index in range(min(self.workers, len(rest)))]
+        for future in futures:
+            batch_scores, batch_complete = self._collect(future)
+            complete = complete and batch_complete
+            scores.update(batch_scores)
+        if not complete:
+            return None
+        for move in rest:
+            score = scores.get(move)
+            if score is not None and score > best_score:
+                best_move, best_score = move, score
+        return best_move, best_score, scores
+
+    def _collect(self, future):
+        """取得工作程序任務結果並累計統計，返回 ({走法: 精確分數}, 是否完成)"""
+        scores, complete, nodes, probes, hits = future.result()
+        self.nodes += nodes
+        self.tt_probes += probes
+        self.tt_hits += hits
+        return scores, complete
+
+
+def run_scaling_benchmark(worker_counts, depth, positions=BENCH_POSITIONS):
+    """
+    擴展性測試：對每個工作程序數量，以固定深度搜尋所有測試局面
+    一定會測量 1 個程序作為加速比的基準（worker_counts 沒有 1 時自動加入）
+    返回：每種工作程序數量的結果紀錄列表（耗時、節點數、nodes/sec、相對 1 個程序的加速比），依程序數量排序
+    """
+    results = []
+    baseline = None
+    for workers in sorted(set(worker_counts) | {1}):
+        with ParallelSearcher(workers) as searcher:
+            # 先讓所有工作程序啟動，避免把程序建立時間算進測試
+            searcher.search(Position.from_fen(START_FEN), max_depth=1)
+            total_nodes = 0
+            start = time.perf_counter()
+            for fen in positions:
+                searcher.search(Position.from_fen(fen), max_depth=depth)
+                total_nodes += searcher.nodes
+            elapsed = time.perf_counter() - start
+        if baseline is None:
+            baseline = elapsed
+        results.append({
+            'workers': workers,
+            'depth': depth,
+            'seconds': round(elapsed, 3),
+            'nodes': total_nodes,
+            'nps': int(total_nodes / elapsed) if elapsed > 0 else 0,
+            'speedup': round(baseline / elapsed, 2) if elapsed > 0 else None,
+        })
+    return results
+
+
+def main(argv=None):
+    """命令列入口：平行分析單一局面，或執行擴展性測試"""
+    parser = argparse.ArgumentParser(description='西洋棋平行搜尋')
+    parser.add_argument('--workers', default=str(os.cpu_count() or 1),
+                        help='工作程序數量；擴展性測試時可用逗號分隔多個數量')
+    parser.add_argument('--fen', default=START_FEN, help='要分析的 FEN 局面')
+    parser.add_argument('--time', type=float, default=5.0, help='思考時間（秒）')
+    parser.add_argument('--depth', type=int, default=None, help='最大搜尋深度')
+    parser.add_argument('--bench', action='store_true', help='執行擴展性測試')
+    parser.add_argument('--output', help='將擴展性測試結果寫入 JSON 檔')
+    args = parser.parse_args(argv)
+    worker_counts = [int(count) for count in args.workers.split(',')]
+
+    if args.bench:
+        results = run_scaling_benchmark(worker_counts, args.depth or 4)
+        for record in results:
+            print(f"{record['workers']:3d} 個程序  深度 {record['depth']}  {record['seconds']:8.3f} 秒  "
+                  f"{record['nodes']:>10,} 節點  {record['nps']:>9,} nodes/sec  加速比 {record['speedup']:.2f}x")
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump({'results': results}, f, indent=2)
+        return 0
+
+    with ParallelSearcher(worker_counts[0]) as searcher:
+        best = searcher.search(Position.from_fen(args.fen), max_depth=args.depth or MAX_PLY,
+                               time_limit=None if args.depth else args.time,
+                               on_iteration=lambda info: print(format_info(info)))
+    print(f"最佳走法: {move_to_uci(best) if best is not None else '(無)'}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
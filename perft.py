@@ -0,0 +1,134 @@
+"""
+走法產生效能測試模組（perft）- 這個檔案負責：
+1. 從指定局面計算深度 N 的所有葉節點數量，驗證走法產生器的正確性
+2. divide 模式：列出每個根走法各自的葉節點數量，方便與其他引擎比對
+3. 內建標準參考局面（初始局面、Kiwipete 等）與其已知的節點數
+4. 回報每個深度的節點數與每秒節點數（nodes/sec），並可輸出 JSON 檔追蹤效能變化
+
+執行方式：
+    python perft.py                         # 跑完整參考局面組，預設最大深度 4
+    python perft.py --depth 5 --output perft.json
+    python perft.py --fen "<FEN>" --depth 3 --divide
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from position import Position, START_FEN, move_to_uci
+
+# 標準參考局面：(名稱, FEN, 深度 1 起的已知節點數)
+REFERENCE_POSITIONS = [
+    ('start', START_FEN,
+     [20, 400, 8902, 197281, 4865609, 119060324]),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     [48, 2039, 97862, 4085603, 193690690]),
+    ('position3', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+     [14, 191, 2812, 43238, 674624, 11030083]),
+    ('position4', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+     [6, 264, 9467, 422333, 15833292]),
+    ('position5', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+     [44, 1486, 62379, 2103487, 89941194]),
+    ('position6', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+     [46, 2079, 89890, 3894594, 164075551]),
+]
+
+
+def perft(position, depth):
+    """
+    計算從目前局面出發、深度 depth 的葉節點數量
+    最後一層直接以合法走法數量計數，不再實際走棋
+    """
+    moves = position.generate_moves()
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    for move in moves:
+        position.make_move(move)
+        nodes += perft(position, depth - 1)
+        position.unmake_move()
+    return nodes
+
+
+def divide(position, depth):
+    """
+    divide 模式：返回 {根走法 UCI 字串: 葉節點數量} 的字典
+    """
+    counts = {}
+    for move in position.generate_moves():
+        position.make_move(move)
+        counts[move_to_uci(move)] = perft(position, depth - 1)
+        position.unmake_move()
+    return counts
+
+
+def run_perft(name, fen, depth, expected=None):
+    """
+    對單一局面從深度 1 跑到 depth，返回每個深度的結果紀錄列表
+    每筆紀錄包含節點數、預期節點數、是否正確、耗時與每秒節點數
+    """
+    position = Position.from_fen(fen)
+    results = []
+    for current in range(1, depth + 1):
+        start = time.perf_counter()
+        nodes = perft(position, current)
+        elapsed = time.perf_counter() - start
+        known = expected[current - 1] if expected and current <= len(expected) else None
+        results.append({
+            'name': name,
+            'fen': fen,
+            'depth': current,
+            'nodes': nodes,
+            'expected': known,
+            'ok': known is None or nodes == known,
+            'seconds': round(elapsed, 6),
+            'nps': int(nodes / elapsed) if elapsed > 0 else None,
+        })
+    return results
+
+
+def main(argv=None):
+    """命令列入口：解析參數、執行 perft 並輸出結果"""
+    parser = argparse.ArgumentParser(description='西洋棋走法產生器 perft 測試')
+    parser.add_argument('--depth', type=int, default=4, help='最大搜尋深度（預設 4）')
+    parser.add_argument('--fen', help='只測試指定的 FEN 局面')
+    parser.add_argument('--divide', action='store_true', help='列出每個根走法的節點數')
+    parser.add_argument('--output', help='將結果寫入 JSON 檔')
+    args = parser.parse_args(argv)
+
+    if args.divide:
+        position = Position.from_fen(args.fen or START_FEN)
+        counts = divide(position, args.depth)
+        for move, nodes in sorted(counts.items()):
+            print(f"{move}: {nodes}")
+        print(f"\n走法數: {len(counts)}  節點數: {sum(counts.values())}")
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump({'fen': args.fen or START_FEN, 'depth': args.depth,
+                           'divide': counts}, f, indent=2)
+        return 0
+
+    if args.fen:
+        suite = [('custom', args.fen, None)]
+    else:
+        suite = REFERENCE_POSITIONS
+
+    results = []
+    for name, fen, expected in suite:
+        depth = args.depth if expected is None else min(args.depth, len(expected))
+        for record in run_perft(name, fen, depth, expected):
+            results.append(record)
+            status = '' if record['expected'] is None else ('OK' if record['ok'] else
+                                                           f"錯誤（預期 {record['expected']}）")
+            print(f"{name:10s} 深度 {record['depth']}: {record['nodes']:>12,} 節點 "
+                  f"{record['seconds']:9.3f} 秒 {record['nps'] or 0:>10,} nodes/sec {status}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'results': results}, f, indent=2)
+    return 0 if all(record['ok'] for record in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
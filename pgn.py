@@ -0,0 +1,423 @@
+"""
+PGN 棋譜模組 - 這個檔案負責：
+1. 標準代數記譜（SAN）與 16 位元走法之間的轉換，解碼時只接受合法走法
+2. 串流讀取大型 PGN 資料庫：以記憶體映射分塊讀檔，一次只解析並產生一盤棋，記憶體用量固定
+3. 每盤棋的走法以 16 位元整數存放在 array('H') 緩衝區，而不是 Python 物件列表
+4. 將對局寫回 PGN（標籤、含回合數的 SAN 走法、每行不超過 80 字元）
+5. 測量讀取吞吐量（games/sec、moves/sec）
+
+執行方式：
+    python pgn.py games.pgn                       # 解析整個檔案並回報 games/sec
+    python pgn.py games.pgn --output copy.pgn     # 同時把解析結果重新寫出
+"""
+
+import argparse
+import json
+import re
+import sys
+import time
+from array import array
+
+from constants import WHITE, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING
+from bitboard import (
+    FILE_LETTERS, KNIGHT_ATTACKS, KING_ATTACKS, square_name, parse_square, lsb, iter_bits,
+    rook_attacks, bishop_attacks, queen_attacks
+)
+from fen_io import DEFAULT_CHUNK_SIZE, iter_lines
+from position import (
+    Position, START_FEN, KING_CASTLE, QUEEN_CASTLE, CAPTURE, EP_CAPTURE,
+    move_from, move_to, move_flags, move_promotion
+)
+
+SAN_PIECE_LETTERS = ' NBRQK'  # SAN 中各種棋子的字母（兵沒有字母）
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')  # 對局結果記號
+# 標準七項標籤（Seven Tag Roster），寫出時依此順序排在最前面
+SEVEN_TAG_ROSTER = ('Event', 'Site', 'Date', 'Round', 'White', 'Black', 'Result')
+LINE_WIDTH = 80  # 走法文字每行的最大長度
+
+_SAN_MOVE = re.compile(r'([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$')
+_TAG_PAIR = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+_MOVETEXT_TOKEN = re.compile(r'[{}();]|[^\s{}();]+')
+_MOVE_NUMBER = re.compile(r'\d+\.+')
+
+# 依棋子種類查詢「哪些格子上的該種棋子能走到 sq」（馬、象、車、后、王的攻擊是對稱的）
+_ATTACKS_TO = {
+    KNIGHT: lambda sq, occ: KNIGHT_ATTACKS[sq],
+    BISHOP: bishop_attacks,
+    ROOK: rook_attacks,
+    QUEEN: queen_attacks,
+    KING: lambda sq, occ: KING_ATTACKS[sq],
+}
+
+
+def parse_san(position, san):
+    """
+    將 SAN 字串（如 'Nf3'、'exd5'、'e8=Q+'、'O-O'）解碼為目前局面的合法走法
+    - 一般走法：以攻擊表找出能走到目標格的同種棋子，再以直列/橫列區分，
+      每個候選走法實際走一步，確認己方國王沒有被攻擊才算合法
+      （不必每步都產生完整的合法走法列表）
+    - 入堡：從合法走法中尋找入堡走法
+    不合法或有歧義時拋出 ValueError
+    """
+    text = san.rstrip('+#!?')
+    if text in ('O-O', '0-0', 'O-O-O', '0-0-0'):
+        flag = KING_CASTLE if len(text) == 3 else QUEEN_CASTLE
+        for move in position.generate_moves():
+            if move >> 12 == flag:
+                return move
+        raise ValueError(f"不合法的入堡: {san!r}")
+    match = _SAN_MOVE.match(text)
+    if match is None:
+        raise ValueError(f"無法解析的 SAN: {san!r}")
+    letter, from_file, from_rank, target, promotion = match.groups()
+    kind = SAN_PIECE_LETTERS.index(letter) if letter else PAWN
+    to_sq = parse_square(target)
+    us = position.side_to_move
+    mailbox = position.mailbox
+    target_piece = mailbox[to_sq]
+    if target_piece is not None and target_piece // 6 == us:
+        raise ValueError(f"不合法的走法: {san!r}")
+
+    if kind == PAWN:
+        candidates = _pawn_origins(position, to_sq, from_file)
+        last_rank = to_sq >> 3 == (0 if us == WHITE else 7)
+        if last_rank != (promotion is not None):
+            raise ValueError(f"升變記號錯誤: {san!r}")
+    else:
+        if promotion is not None:
+            raise ValueError(f"無法解析的 SAN: {san!r}")
+        candidates = iter_bits(_ATTACKS_TO[kind](to_sq, position.occupied)
+                               & position.pieces[us * 6 + kind])
+    promotion_kind = SAN_PIECE_LETTERS.index(promotion) if promotion else QUEEN
+
+    found = None
+    king = us * 6 + KING
+    for from_sq in candidates:
+        if from_file is not None and FILE_LETTERS[from_sq & 7] != from_file:
+            continue
+        if from_rank is not None and square_name(from_sq)[1] != from_rank:
+            continue
+        move = position.infer_move(from_sq, to_sq, promotion_kind)
+        position.make_move(move)
+        legal = not position.is_square_attacked(lsb(position.pieces[king]), us ^ 1)
+        position.unmake_move()
+        if not legal:
+            continue
+        if found is not None:
+            raise ValueError(f"有歧義的 SAN: {san!r}")
+        found = move
+    if found is None:
+        raise ValueError(f"不合法的走法: {san!r}")
+    return found
+
+
+def _pawn_origins(position, to_sq, from_file):
+    """返回能以兵走到 to_sq 的起點格列表（from_file 不為 None 表示吃子）"""
+    us = position.side_to_move
+    mailbox = position.mailbox
+    pawn = us * 6 + PAWN
+    step = 8 if us == WHITE else -8  # 由終點往回一格
+    behind = to_sq + step
+    if not 0 <= behind < 64:
+        return []
+    if from_file is not None:
+        # 吃子：起點在終點後方一格的相鄰直列，終點必須有對方棋子或為過路兵格
+        if mailbox[to_sq] is None and to_sq != position.ep_square:
+            return []
+        col = FILE_LETTERS.index(from_file)
+        if abs(col - (to_sq & 7)) != 1:
+            return []
+        from_sq = (behind & ~7) | col
+        return [from_sq] if mailbox[from_sq] == pawn else []
+    if mailbox[to_sq] is not None:
+        return []
+    if mailbox[behind] == pawn:
+        return [behind]
+    # 兵前進兩格：中間格必須是空的，終點在第 4（白）或第 5（黑）橫列
+    if mailbox[behind] is None and to_sq >> 3 == (4 if us == WHITE else 3):
+        from_sq = behind + step
+        return [from_sq] if mailbox[from_sq] == pawn else []
+    return []
+
+
+def move_to_san(position, move, legal_moves=None):
+    """
+    將目前局面的合法走法轉換為 SAN 字串（含將軍 + 與將死 # 記號）
+    參數：
+        legal_moves: 目前局面的合法走法列表，None 時呼叫 generate_moves 取得
+    """
+    if legal_moves is None:
+        legal_moves = position.generate_moves()
+    flags = move_flags(move)
+    from_sq, to_sq = move_from(move), move_to(move)
+    if flags == KING_CASTLE:
+        text = 'O-O'
+    elif flags == QUEEN_CASTLE:
+        text = 'O-O-O'
+    else:
+        kind = position.mailbox[from_sq] % 6
+        is_capture = flags & CAPTURE or flags == EP_CAPTURE
+        if kind == PAWN:
+            text = FILE_LETTERS[from_sq & 7] + 'x' if is_capture else ''
+        else:
+            text = SAN_PIECE_LETTERS[kind]
+            # 同種棋子也能走到同一格時，依序以直列、橫列或兩者區分
+            rivals = [other & 63 for other in legal_moves
+                      if (other >> 6) & 63 == to_sq and other & 63 != from_sq
+                      and position.mailbox[other & 63] % 6 == kind]
+            if rivals:
+                if all(sq & 7 != from_sq & 7 for sq in rivals):
+                    text += FILE_LETTERS[from_sq & 7]
+                elif all(sq >> 3 != from_sq >> 3 for sq in rivals):
+                    text += square_name(from_sq)[1]
+                else:
+                    text += square_name(from_sq)
+            if is_capture:
+                text += 'x'
+        text += square_name(to_sq)
+        promotion = move_promotion(move)
+        if promotion is not None:
+            text += '=' + SAN_PIECE_LETTERS[promotion]
+    position.make_move(move)
+    if position.in_check():
+        text += '+' if position.generate_moves() else '#'
+    position.unmake_move()
+    return text
+
+
+class Game:
+    """
+    對局紀錄類別
+    屬性：
+        headers: PGN 標籤字典（依讀入或設定的順序）
+        moves: 以 16 位元整數存放走法的 array('H')
+        result: 對局結果（'1-0'、'0-1'、'1/2-1/2' 或 '*'）
+    """
+    def __init__(self, headers=None, moves=(), result='*'):
+        """建立對局紀錄，moves 可以是任何 16 位元走法的序列"""
+        self.headers = dict(headers or {})
+        self.moves = array('H', moves)
+        self.result = result
+
+    def __len__(self):
+        """返回半回合數"""
+        return len(self.moves)
+
+    @property
+    def start_fen(self):
+        """起始局面的 FEN（FEN 標籤，沒有時為標準初始局面）"""
+        return self.headers.get('FEN', START_FEN)
+
+    def start_position(self, position=None):
+        """將 position（None 時建立新的局面）設定為起始局面並返回"""
+        if position is None:
+            position = Position()
+        if 'FEN' in self.headers:
+            position.set_fen(self.headers['FEN'])
+        else:
+            position.setup_start()
+        return position
+
+    def end_position(self, position=None):
+        """返回走完所有走法後的局面"""
+        position = self.start_position(position)
+        for move in self.moves:
+            position.make_move(move)
+        return position
+
+
+def iter_games(path, chunk_size=DEFAULT_CHUNK_SIZE, skip_invalid=False, encoding='utf-8'):
+    """
+    串流讀取 PGN 檔案，一盤一盤產生 Game
+    - 註解 {...}、; 行尾註解、變著 (...)、NAG（$1）與 % 跳脫行會被略過
+    - 每步 SAN 都在對局局面上解碼並確認合法
+    參數：
+        skip_invalid: 略過含有不合法走法的對局；否則拋出 ValueError（訊息含對局序號）
+        encoding: 檔案編碼，無法解碼的位元組以替代字元表示
+    """
+    position = Position()
+    game = None
+    started = False      # 是否已設定起始局面並開始解碼走法
+    error = None         # 目前對局的解碼錯誤
+    comment = False      # 是否在 {...} 註解中
+    variation = 0        # 變著的巢狀深度
+    number = 0           # 對局序號
+
+    for line in iter_lines(path, chunk_size, encoding):
+        if not comment and line[0] == '[':
+            tag = _TAG_PAIR.match(line)
+            if tag is not None:
+                if game is None or started:
+                    if game is not None:
+                        # 上一盤沒有結果記號就開始新的標籤：視為已結束
+                        if error is None:
+                            yield game
+                    game, started, error, variation = Game(), False, None, 0
+                    number += 1
+                game.headers[tag.group(1)] = tag.group(2).replace('\\"', '"').replace('\\\\', '\\')
+                continue
+        if line[0] == '%':
+            continue
+        for token in _MOVETEXT_TOKEN.findall(line):
+            if comment:
+                if token == '}':
+                    comment = False
+                continue
+            if token == '{':
+                comment = True
+            elif token == ';':
+                break
+            elif token == '(':
+                variation += 1
+            elif token == ')':
+                variation -= 1
+            elif variation or token[0] == '$':
+                continue
+            elif token in RESULTS:
+                if game is None:
+                    continue
+                game.result = token
+                if error is None:
+                    yield game
+                game, started, error = None, False, None
+            else:
+                token = _MOVE_NUMBER.sub('', token, 1) if token[0].isdigit() else token
+                if not token:
+                    continue
+                if game is None:
+                    game, started, error, variation = Game(), False, None, 0
+                    number += 1
+                if error is not None:
+                    continue
+                try:
+                    if not started:
+                        game.start_position(position)
+                        started = True
+                    move = parse_san(position, token)
+                except ValueError as exc:
+                    if not skip_invalid:
+                        raise ValueError(f"{path} 第 {number} 盤: {exc}") from None
+                    error = exc
+                    continue
+                position.make_move(move)
+                game.moves.append(move)
+    if game is not None and error is None and (started or game.headers):
+        yield game
+
+
+def format_game(game):
+    """將對局輸出為 PGN 文字（標籤區、空行、走法區，結尾有空行）"""
+    headers = dict(game.headers)
+    headers['Result'] = game.result
+    if 'FEN' in headers:
+        # 有 FEN 標籤時 SetUp 標籤排在其他額外標籤之前
+        headers = {'SetUp': '1', **headers}
+    lines = []
+    for name in SEVEN_TAG_ROSTER:
+        lines.append(f'[{name} "{_escape_tag(headers.pop(name, "?"))}"]')
+    for name, value in headers.items():
+        lines.append(f'[{name} "{_escape_tag(value)}"]')
+    lines.append('')
+
+    position = game.start_position()
+    number = position.fullmove_number
+    tokens = []
+    if position.side_to_move != WHITE and game.moves:
+        tokens.append(f'{number}...')
+    for move in game.moves:
+        if position.side_to_move == WHITE:
+            tokens.append(f'{number}.')
+        tokens.append(move_to_san(position, move))
+        position.make_move(move)
+        number = position.fullmove_number
+    tokens.append(game.result)
+
+    text = ''
+    for token in tokens:
+        if not text:
+            text = token
+        elif len(text) + 1 + len(token) > LINE_WIDTH:
+            lines.append(text)
+            text = token
+        else:
+            text += ' ' + token
+    lines.append(text)
+    return '\n'.join(lines) + '\n\n'
+
+
+def _escape_tag(value):
+    """跳脫標籤值中的反斜線與雙引號"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def write_game(stream, game):
+    """將一盤對局寫入已開啟的文字檔"""
+    stream.write(format_game(game))
+
+
+def write_games(path, games, mode='w'):
+    """
+    將多盤對局寫入 PGN 檔
+    參數：
+        mode: 'w' 覆寫，'a' 附加到檔尾
+    返回：寫出的對局數
+    """
+    count = 0
+    with open(path, mode, encoding='utf-8') as f:
+        for game in games:
+            write_game(f, game)
+            count += 1
+    return count
+
+
+def run_benchmark(path, chunk_size=DEFAULT_CHUNK_SIZE, skip_invalid=True, output=None):
+    """
+    測量 PGN 讀取吞吐量（包含 SAN 解碼），output 不為 None 時同時寫出每盤棋
+    返回包含對局數、走法數、耗時、games/sec 與 moves/sec 的結果紀錄
+    """
+    games = 0
+    moves = 0
+    start = time.perf_counter()
+    stream = open(output, 'w', encoding='utf-8') if output else None
+    try:
+        for game in iter_games(path, chunk_size, skip_invalid):
+            games += 1
+            moves += len(game.moves)
+            if stream is not None:
+                write_game(stream, game)
+    finally:
+        if stream is not None:
+            stream.close()
+    seconds = time.perf_counter() - start
+    return {
+        'path': path,
+        'games': games,
+        'moves': moves,
+        'seconds': round(seconds, 6),
+        'games_per_sec': round(games / seconds, 1) if seconds > 0 else None,
+        'moves_per_sec': int(moves / seconds) if seconds > 0 else None,
+    }
+
+
+def main(argv=None):
+    """命令列入口：串流解析 PGN 檔並回報吞吐量"""
+    parser = argparse.ArgumentParser(description='PGN 串流讀取與吞吐量測試')
+    parser.add_argument('path', help='PGN 檔案')
+    parser.add_argument('--output', help='將解析出的對局重新寫成 PGN 檔')
+    parser.add_argument('--strict', action='store_true', help='遇到不合法的走法時停止（預設略過該盤）')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='每次讀取的位元組數（預設 1 MiB）')
+    parser.add_argument('--json', help='將結果寫入 JSON 檔')
+    args = parser.parse_args(argv)
+
+    result = run_benchmark(args.path, args.chunk_size, not args.strict, args.output)
+    print(f"{result['games']:,} 盤  {result['moves']:,} 步  {result['seconds']:.3f} 秒  "
+          f"{result['games_per_sec'] or 0:,} games/sec  {result['moves_per_sec'] or 0:,} moves/sec")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
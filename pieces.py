@@ -1,208 +1,148 @@
 """
 棋子管理模組 - 這個檔案負責：
 1. 定義西洋棋的所有棋子類型和行為
-2. 處理棋子的圖形繪製
-3. 實現各種棋子的移動規則
-4. 提供棋子的中文名稱轉換
+2. 實現各種棋子的移動規則
+3. 提供棋子的中文名稱轉換
+
+棋子只保存資料，不持有任何 pygame 圖像；圖像由 UI 層（render.py）在繪製時才建立。
+棋子物件都是不可變的共享物件（flyweight）：
+- PieceKind：每種顏色與種類只有一個，保存顏色、種類與中文名稱（共 12 個）
+- ChessPiece：每種棋子在每一格只有一個（共 12 x 64 個），以 piece_at 取得，
+  所有棋盤視圖共用，同步棋盤時不必配置新物件
+兩者都使用 __slots__，沒有每個物件各自的 __dict__。
 """
 
-import pygame
-from constants import DEFAULT_WINDOW_SIZE, BOARD_SIZE
+from constants import BOARD_SIZE, COLOR_NAMES, PIECE_NAMES
+from bitboard import iter_bits
 
-class ChessPiece:
+# 棋子種類對應的中文名稱
+CHINESE_NAMES = {
+    'pawn': '兵',
+    'rook': '城堡',
+    'knight': '騎士',
+    'bishop': '主教',
+    'queen': '皇后',
+    'king': '國王'
+}
+
+# 每一格的 (row, col) 座標，合法移動列表直接引用這些共享的 tuple
+SQUARE_COORDS = tuple(divmod(sq, BOARD_SIZE) for sq in range(BOARD_SIZE * BOARD_SIZE))
+
+
+class PieceKind:
     """
-    棋子類別：定義每個棋子的屬性和行為
+    棋子種類類別：一種顏色加一種類型的共享描述（不可變）
     屬性：
+        code: 棋子編號（color * 6 + piece_type，見 constants.py）
         color: 棋子顏色（black/white）
         piece_type: 棋子類型（pawn/rook/knight/bishop/queen/king）
+        chinese_name: 棋子的中文名稱
+    """
+    __slots__ = ('code', 'color', 'piece_type', 'chinese_name')
+
+    def __init__(self, code):
+        """由棋子編號建立種類描述"""
+        piece_type = PIECE_NAMES[code % 6]
+        object.__setattr__(self, 'code', code)
+        object.__setattr__(self, 'color', COLOR_NAMES[code // 6])
+        object.__setattr__(self, 'piece_type', piece_type)
+        object.__setattr__(self, 'chinese_name', CHINESE_NAMES[piece_type])
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} 是不可變的共享物件")
+
+    def __repr__(self):
+        return f"PieceKind({self.color}, {self.piece_type})"
+
+
+# 12 種棋子的共享描述，索引即棋子編號
+PIECE_KINDS = tuple(PieceKind(code) for code in range(12))
+
+
+class ChessPiece:
+    """
+    棋子類別：定義每個棋子的屬性和行為（不可變，請以 piece_at 取得共享的實例）
+    屬性：
+        kind: 共享的棋子種類描述（PieceKind）
         position: 棋子在棋盤上的位置 (row, col)
-        surface: 棋子的圖形表面
+        color: 棋子顏色（black/white）
+        piece_type: 棋子類型（pawn/rook/knight/bishop/queen/king）
         chinese_name: 棋子的中文名稱
     """
+    __slots__ = ('kind', 'position')
+
     def __init__(self, color, piece_type, position):
         """初始化棋子的基本屬性"""
-        self.color = color          # 棋子顏色
-        self.piece_type = piece_type  # 棋子類型
-        self.position = position    # 棋子位置
-        self.image = None          # 棋子圖像
-        self.chinese_name = self.get_chinese_name()  # 取得中文名稱
-        self.load_image()          # 載入棋子圖像
-    
+        code = COLOR_NAMES.index(color) * 6 + PIECE_NAMES.index(piece_type)
+        object.__setattr__(self, 'kind', PIECE_KINDS[code])  # 棋子種類
+        object.__setattr__(self, 'position', tuple(position))  # 棋子位置
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} 是不可變的共享物件")
+
+    def __repr__(self):
+        return f"ChessPiece({self.color}, {self.piece_type}, {self.position})"
+
+    @property
+    def color(self):
+        """棋子顏色"""
+        return self.kind.color
+
+    @property
+    def piece_type(self):
+        """棋子類型"""
+        return self.kind.piece_type
+
+    @property
+    def chinese_name(self):
+        """棋子的中文名稱"""
+        return self.kind.chinese_name
+
     def get_chinese_name(self):
         """
         取得棋子的中文名稱
         返回：對應的中文名稱字串
         """
-        names = {
-            'pawn': '兵',
-            'rook': '城堡',
-            'knight': '騎士',
-            'bishop': '主教',
-            'queen': '皇后',
-            'king': '國王'
-        }
-        return names.get(self.piece_type, '')
-    
-    def load_image(self):
-        """
-        使用基本圖形繪製棋子：
-        - 使用 Pygame 繪製簡單的幾何圖形來表示不同類型的棋子
-        - 兵：圓形
-        - 城堡：方形
-        - 騎士：三角形
-        - 主教：尖頂三角形
-        - 皇后：雙圓形
-        - 國王：圓形加十字
-        """
-        size = DEFAULT_WINDOW_SIZE // BOARD_SIZE
-        # 建立透明背景的表面
-        self.surface = pygame.Surface((size - 10, size - 10), pygame.SRCALPHA)
-        color = (255, 255, 255) if self.color == 'white' else (0, 0, 0)
-        
-        # 根據不同棋子類型繪製不同形狀
-        if self.piece_type == 'pawn':  # 兵 - 圓形
-            pygame.draw.circle(self.surface, color, (size//2 - 5, size//2 - 5), size//4)
-        elif self.piece_type == 'rook':  # 城堡 - 方形
-            pygame.draw.rect(self.surface, color, (size//4 - 5, size//4 - 5, size//2, size//2))
-        elif self.piece_type == 'knight':  # 騎士 - 三角形
-            points = [(size//4 - 5, size//2 - 5), 
-                     (size//2 - 5, size//4 - 5),
-                     (3*size//4 - 5, size//2 - 5)]
-            pygame.draw.polygon(self.surface, color, points)
-        elif self.piece_type == 'bishop':  # 主教 - 尖頂三角形
-            pygame.draw.polygon(self.surface, color, 
-                              [(size//2 - 5, size//4 - 5),
-                               (size//4 - 5, 3*size//4 - 5),
-                               (3*size//4 - 5, 3*size//4 - 5)])
-        elif self.piece_type == 'queen':  # 皇后 - 雙圓形
-            pygame.draw.circle(self.surface, color, (size//2 - 5, size//2 - 5), size//3)
-            pygame.draw.circle(self.surface, (128, 128, 128), (size//2 - 5, size//2 - 5), size//6)
-        elif self.piece_type == 'king':  # 國王 - 圓形加十字
-            pygame.draw.circle(self.surface, color, (size//2 - 5, size//2 - 5), size//3)
-            pygame.draw.line(self.surface, (128, 128, 128), 
-                           (size//2 - 5, size//4 - 5),
-                           (size//2 - 5, 3*size//4 - 5), 3)
-            pygame.draw.line(self.surface, (128, 128, 128),
-                           (size//4 - 5, size//2 - 5),
-                           (3*size//4 - 5, size//2 - 5), 3)
+        return self.kind.chinese_name
 
     def get_valid_moves(self, board):
         """
         計算棋子的合法移動位置：
-        根據不同棋子類型實現其特定的移動規則
-        
+        由棋盤的位元棋盤後端產生完全合法的走法（不會讓己方國王被將軍，
+        只有輪到走棋的一方有走法），規則如下
+        - 兵：向前一格（初始可兩格），斜向吃子
+        - 城堡：直線移動任意格數（直到被擋住或吃子）
+        - 騎士：走L形（兩格直走一格橫移）
+        - 主教：斜線移動任意格數
+        - 皇后：直線加斜線移動任意格數
+        - 國王：向任意方向移動一格，符合條件時可入堡
+        - 兵可吃過路兵，走到底線時升變
+
         參數：
-            board: 棋盤物件，用於檢查其他棋子位置
-            
+            board: 棋盤物件（ChessBoard），依局面快取合法走法
+
         返回：
             valid_moves: 包含所有合法移動位置的列表，每個位置為 (row, col) 座標
+                         （引用 SQUARE_COORDS 中的共享 tuple，不會為每個走法配置新物件）
         """
-        valid_moves = []
         row, col = self.position
-        
-        if self.piece_type == 'pawn':
-            # 兵的移動規則：
-            # 1. 通常只能向前移動一格
-            # 2. 第一次移動可以選擇走一格或兩格
-            # 3. 吃子時可以斜向前進一格
-            if self.color == 'white':
-                # 白方兵向上移動
-                if row > 0 and board.board[row-1][col] is None:
-                    valid_moves.append((row-1, col))
-                    # 初始位置可前進兩格
-                    if row == 6 and board.board[row-2][col] is None:
-                        valid_moves.append((row-2, col))
-                # 斜向吃子
-                if row > 0 and col > 0 and board.board[row-1][col-1] and board.board[row-1][col-1].color != self.color:
-                    valid_moves.append((row-1, col-1))
-                if row > 0 and col < 7 and board.board[row-1][col+1] and board.board[row-1][col+1].color != self.color:
-                    valid_moves.append((row-1, col+1))
-            
-            else:
-                # 黑方兵向下移動
-                if row < 7 and board.board[row+1][col] is None:
-                    valid_moves.append((row+1, col))
-                    # 初始位置可前進兩格
-                    if row == 1 and board.board[row+2][col] is None:
-                        valid_moves.append((row+2, col))
-                # 斜向吃子
-                if row < 7 and col > 0 and board.board[row+1][col-1] and board.board[row+1][col-1].color != self.color:
-                    valid_moves.append((row+1, col-1))
-                if row < 7 and col < 7 and board.board[row+1][col+1] and board.board[row+1][col+1].color != self.color:
-                    valid_moves.append((row+1, col+1))
-        
-        elif self.piece_type == 'rook':
-            # 城堡移動規則：可以直線移動任意格數（直到被擋住或吃子）
-            directions = [(0, 1), (0, -1), (1, 0), (-1, 0)]
-            for dx, dy in directions:
-                current_row, current_col = row + dx, col + dy
-                while 0 <= current_row < 8 and 0 <= current_col < 8:
-                    target = board.board[current_row][current_col]
-                    if target is None:
-                        valid_moves.append((current_row, current_col))
-                    elif target.color != self.color:
-                        valid_moves.append((current_row, current_col))
-                        break
-                    else:
-                        break
-                    current_row += dx
-                    current_col += dy
-        
-        elif self.piece_type == 'knight':
-            # 騎士移動規則：走L形（兩格直走一格橫移）
-            moves = [(-2, -1), (-2, 1), (-1, -2), (-1, 2),
-                    (1, -2), (1, 2), (2, -1), (2, 1)]
-            for dx, dy in moves:
-                new_row, new_col = row + dx, col + dy
-                if 0 <= new_row < 8 and 0 <= new_col < 8:
-                    target = board.board[new_row][new_col]
-                    if target is None or target.color != self.color:
-                        valid_moves.append((new_row, new_col))
-        
-        elif self.piece_type == 'bishop':
-            # 主教移動規則：可以斜線移動任意格數
-            directions = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
-            for dx, dy in directions:
-                current_row, current_col = row + dx, col + dy
-                while 0 <= current_row < 8 and 0 <= current_col < 8:
-                    target = board.board[current_row][current_col]
-                    if target is None:
-                        valid_moves.append((current_row, current_col))
-                    elif target.color != self.color:
-                        valid_moves.append((current_row, current_col))
-                        break
-                    else:
-                        break
-                    current_row += dx
-                    current_col += dy
-        
-        elif self.piece_type == 'queen':
-            # 皇后移動規則：結合城堡和主教的移動方式（直線+斜線）
-            directions = [(0, 1), (0, -1), (1, 0), (-1, 0),
-                         (1, 1), (1, -1), (-1, 1), (-1, -1)]
-            for dx, dy in directions:
-                current_row, current_col = row + dx, col + dy
-                while 0 <= current_row < 8 and 0 <= current_col < 8:
-                    target = board.board[current_row][current_col]
-                    if target is None:
-                        valid_moves.append((current_row, current_col))
-                    elif target.color != self.color:
-                        valid_moves.append((current_row, current_col))
-                        break
-                    else:
-                        break
-                    current_row += dx
-                    current_col += dy
-        
-        elif self.piece_type == 'king':
-            # 國王移動規則：可以向任意方向移動一格
-            directions = [(0, 1), (0, -1), (1, 0), (-1, 0),
-                         (1, 1), (1, -1), (-1, 1), (-1, -1)]
-            for dx, dy in directions:
-                new_row, new_col = row + dx, col + dy
-                if 0 <= new_row < 8 and 0 <= new_col < 8:
-                    target = board.board[new_row][new_col]
-                    if target is None or target.color != self.color:
-                        valid_moves.append((new_row, new_col))
-        
-        return valid_moves
+        targets = board.legal_targets(row * BOARD_SIZE + col)
+        return [SQUARE_COORDS[sq] for sq in iter_bits(targets)]
+
+
+def _build_piece_table():
+    """建立所有棋子在所有格子上的共享實例，索引為 code * 64 + sq"""
+    table = []
+    for code in range(12):
+        kind = PIECE_KINDS[code]
+        for sq in range(BOARD_SIZE * BOARD_SIZE):
+            table.append(ChessPiece(kind.color, kind.piece_type, SQUARE_COORDS[sq]))
+    return tuple(table)
+
+
+_PIECE_TABLE = _build_piece_table()
+
+
+def piece_at(code, sq):
+    """取得棋子編號 code 位於格子 sq 的共享棋子實例"""
+    return _PIECE_TABLE[code * 64 + sq]
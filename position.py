@@ -0,0 +1,864 @@
+"""
+局面模組 - 這個檔案負責：
+1. 以位元棋盤（12 個棋子位元棋盤加上佔位遮罩）表示西洋棋局面
+2. 維護每格棋子編號的 mailbox 陣列，供快速查詢某格上的棋子
+3. 擺放、移除、移動棋子並同步更新所有位元棋盤
+4. 產生單一棋子的可移動目標格（pseudo-legal）與攻擊查詢
+5. 以 make_move / unmake_move 走棋與悔棋，透過復原紀錄堆疊回到前一個局面
+6. 以每個局面只計算一次的牽制遮罩與將軍遮罩產生完全合法的走法，
+   包含入堡、吃過路兵與升變，並判斷將死與逼和；騎士、國王與滑動棋子的走法
+   直接走訪每格預先編碼好的走法表（KNIGHT_MOVES、ROOK_MOVE_RAYS 等）
+7. 在每次走棋與悔棋時遞增更新 64 位元 Zobrist 雜湊值（key）
+8. 雙方的攻擊圖與走棋方國王的危險格以雜湊值快取（LRU），同一局面的將軍判斷、攻擊查詢與走法產生共用一次計算
+
+棋子編號：piece = color * 6 + piece_type，共 12 種（見 constants.py）。
+走法編號：16 位元整數，bits 0-5 為起點格、bits 6-11 為終點格、bits 12-15 為旗標。
+"""
+
+from collections import OrderedDict
+
+from constants import (
+    BOARD_SIZE, WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING
+)
+from bitboard import (
+    FULL, FILE_A, FILE_H, RANK_MASKS, SQUARE_BB, BETWEEN, ROOK_RAYS, BISHOP_RAYS,
+    KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS,
+    KNIGHT_TARGETS, KING_TARGETS, ROOK_RAY_SQUARES, BISHOP_RAY_SQUARES,
+    square_name, parse_square, lsb, popcount, iter_bits, pawn_attacks_bb,
+    rook_attacks, bishop_attacks, queen_attacks
+)
+from zobrist import PIECE_KEYS, SIDE_KEY, CASTLING_KEYS, EP_FILE_KEYS
+
+NUM_PIECES = 12  # 6 種棋子 x 2 種顏色
+ATTACK_CACHE_SIZE = 64  # 每個局面物件快取幾個局面的攻擊圖（超過時移除最久未使用的，悔棋、重做回到算過的局面時直接取用）
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'  # 標準初始局面
+PIECE_LETTERS = 'PNBRQKpnbrqk'  # FEN 中的棋子字母，索引即棋子編號
+
+# 走法旗標（bits 12-15）
+QUIET = 0           # 一般移動
+DOUBLE_PUSH = 1     # 兵前進兩格
+KING_CASTLE = 2     # 王翼入堡
+QUEEN_CASTLE = 3    # 后翼入堡
+CAPTURE = 4         # 吃子
+EP_CAPTURE = 5      # 吃過路兵
+PROMOTION = 8       # 升變（8-11 依序升為騎士、主教、城堡、皇后，再加 CAPTURE 表示升變吃子）
+
+# 入堡權利位元
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+ALL_CASTLING = 15
+
+# 棋子離開或抵達某格時要保留的入堡權利（國王或城堡的原始格會清除對應權利）
+CASTLING_KEEP = [ALL_CASTLING] * 64
+CASTLING_KEEP[60] = ALL_CASTLING & ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)  # e1
+CASTLING_KEEP[63] = ALL_CASTLING & ~WHITE_KINGSIDE                      # h1
+CASTLING_KEEP[56] = ALL_CASTLING & ~WHITE_QUEENSIDE                     # a1
+CASTLING_KEEP[4] = ALL_CASTLING & ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)   # e8
+CASTLING_KEEP[7] = ALL_CASTLING & ~BLACK_KINGSIDE                       # h8
+CASTLING_KEEP[0] = ALL_CASTLING & ~BLACK_QUEENSIDE                      # a8
+
+# FEN 解析用的對照表
+_FEN_PIECES = {char: piece for piece, char in enumerate(PIECE_LETTERS)}
+_FEN_EXPAND = str.maketrans({str(count): '.' * count for count in range(1, BOARD_SIZE + 1)})
+_FEN_CASTLING = {'K': WHITE_KINGSIDE, 'Q': WHITE_QUEENSIDE, 'k': BLACK_KINGSIDE, 'q': BLACK_QUEENSIDE}
+_EMPTY_MAILBOX = [None] * 64
+# 入堡權利位元對應的 (國王原始格, 城堡原始格, 顏色)
+_CASTLING_HOMES = {
+    WHITE_KINGSIDE: (60, 63, WHITE), WHITE_QUEENSIDE: (60, 56, WHITE),
+    BLACK_KINGSIDE: (4, 7, BLACK), BLACK_QUEENSIDE: (4, 0, BLACK),
+}
+
+
+def _move_entries(from_sq, targets):
+    """將目標格序列轉換為 (目標格位元, 一般走法, 吃子走法) 的 tuple，走法產生時直接取用"""
+    return tuple((SQUARE_BB[to], from_sq | (to << 6), from_sq | (to << 6) | (CAPTURE << 12))
+                 for to in targets)
+
+
+# 每一格預先編碼好的走法表：騎士、國王為目標格列表，滑動棋子為由近到遠的射線列表
+KNIGHT_MOVES = [_move_entries(sq, KNIGHT_TARGETS[sq]) for sq in range(64)]
+KING_MOVES = [_move_entries(sq, KING_TARGETS[sq]) for sq in range(64)]
+BISHOP_MOVE_RAYS = [tuple(_move_entries(sq, ray) for ray in BISHOP_RAY_SQUARES[sq]) for sq in range(64)]
+ROOK_MOVE_RAYS = [tuple(_move_entries(sq, ray) for ray in ROOK_RAY_SQUARES[sq]) for sq in range(64)]
+QUEEN_MOVE_RAYS = [BISHOP_MOVE_RAYS[sq] + ROOK_MOVE_RAYS[sq] for sq in range(64)]
+
+
+def encode_move(from_sq, to_sq, flags=QUIET):
+    """將起點、終點與旗標編碼為 16 位元走法"""
+    return from_sq | (to_sq << 6) | (flags << 12)
+
+
+def move_from(move):
+    """取得走法的起點格"""
+    return move & 63
+
+
+def move_to(move):
+    """取得走法的終點格"""
+    return (move >> 6) & 63
+
+
+def move_flags(move):
+    """取得走法的旗標"""
+    return move >> 12
+
+
+def move_promotion(move):
+    """取得升變後的棋子種類，非升變走法返回 None"""
+    flags = move >> 12
+    if flags & PROMOTION:
+        return KNIGHT + (flags & 3)
+    return None
+
+
+def move_to_uci(move):
+    """將走法轉換為 UCI 長代數記譜，例如 'e2e4'、'e7e8q'"""
+    text = square_name(move & 63) + square_name((move >> 6) & 63)
+    promotion = move_promotion(move)
+    if promotion is not None:
+        text += 'nbrq'[promotion - KNIGHT]
+    return text
+
+
+def parse_uci_move(position, text):
+    """將 UCI 長代數記譜（如 'e2e4'、'e7e8q'）轉換為 position 的合法走法，不合法時拋出 ValueError"""
+    for move in position.generate_moves():
+        if move_to_uci(move) == text:
+            return move
+    raise ValueError(f"不合法的走法: {text!r}")
+
+
+def make_piece(color, piece_type):
+    """由顏色與種類組合出棋子編號"""
+    return color * 6 + piece_type
+
+
+def piece_color(piece):
+    """取得棋子編號的顏色"""
+    return piece // 6
+
+
+def piece_type(piece):
+    """取得棋子編號的種類"""
+    return piece % 6
+
+
+class Position:
+    """
+    局面類別：以位元棋盤儲存的棋局狀態
+    屬性：
+        pieces: 長度 12 的列表，每個元素是該種棋子的 64 位元棋盤
+        occupancy: [白方佔位, 黑方佔位] 兩個位元棋盤
+        occupied: 全部棋子的佔位位元棋盤
+        mailbox: 長度 64 的列表，記錄每格上的棋子編號（None 表示空格）
+        side_to_move: 輪到哪一方走棋（WHITE/BLACK）
+        castling: 入堡權利位元（WHITE_KINGSIDE 等的組合）
+        ep_square: 可吃過路兵的目標格，沒有則為 None
+        halfmove_clock: 距離上次吃子或動兵的半回合數
+        fullmove_number: 目前的回合數
+        key: 64 位元 Zobrist 雜湊值，涵蓋棋子、走棋方、入堡權利與過路兵直列
+        history: 復原紀錄堆疊，每筆為
+                 (走法, 被吃棋子, 入堡權利, 過路兵格, 半回合數, 雜湊值)
+    使用 __slots__：大量保存局面（對局伺服器、批次載入）時每個物件不帶 __dict__
+    攻擊圖快取（_attack_cache）在 enable_attack_cache 或第一次查詢攻擊圖時才建立，以雜湊值為鍵的 LRU（OrderedDict）；
+    大量保存或搜尋用的局面不建立快取
+    """
+    __slots__ = ('pieces', 'occupancy', 'occupied', 'mailbox', 'side_to_move', 'castling',
+                 'ep_square', 'halfmove_clock', 'fullmove_number', 'key', 'history',
+                 '_attack_cache')
+
+    def __init__(self):
+        """建立一個空的局面"""
+        self.pieces = [0] * NUM_PIECES
+        self.occupancy = [0, 0]
+        self.occupied = 0
+        self.mailbox = [None] * 64
+        self.side_to_move = WHITE
+        self.castling = 0
+        self.ep_square = None
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        self.key = 0
+        self.history = []
+        self._attack_cache = None
+
+    def clear(self):
+        """清空局面：原地重設所有欄位，沿用既有的列表物件（批次載入局面時不必重新配置）"""
+        pieces = self.pieces
+        for piece in range(NUM_PIECES):
+            pieces[piece] = 0
+        self.occupancy[0] = self.occupancy[1] = 0
+        self.occupied = 0
+        self.mailbox[:] = _EMPTY_MAILBOX
+        self.side_to_move = WHITE
+        self.castling = 0
+        self.ep_square = None
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        self.key = 0
+        self.history.clear()
+        if self._attack_cache is not None:
+            self._attack_cache.clear()  # 保留已啟用的快取，只清除內容
+
+    def setup_start(self):
+        """
+        擺放標準初始局面：
+        - 黑方在 row 0、1，白方在 row 6、7
+        - 白方先走，雙方都保有入堡權利
+        """
+        self.clear()
+        piece_order = [ROOK, KNIGHT, BISHOP, QUEEN, KING, BISHOP, KNIGHT, ROOK]
+        for col in range(BOARD_SIZE):
+            self.put_piece(make_piece(BLACK, piece_order[col]), col)
+            self.put_piece(make_piece(BLACK, PAWN), BOARD_SIZE + col)
+            self.put_piece(make_piece(WHITE, PAWN), 6 * BOARD_SIZE + col)
+            self.put_piece(make_piece(WHITE, piece_order[col]), 7 * BOARD_SIZE + col)
+        self.castling = ALL_CASTLING
+        self.key = self.compute_key()
+
+    def set_fen(self, fen):
+        """
+        由 FEN 字串設定局面：
+        依序解析棋子擺放、走棋方、入堡權利、過路兵格，半回合數與回合數可省略
+        （因此 EPD 行的前四個欄位也可以直接傳入，之後的操作欄位會被忽略）
+        棋子直接寫入位元棋盤與 mailbox，雜湊值在擺放時一併累計
+        格式錯誤，或局面不可能出現（雙方不是各有一個國王、第 1 或第 8 橫列有兵、
+        非走棋方的國王正被將軍、過路兵格不在走棋方對應的橫列）時拋出 ValueError，局面內容此時不保證完整
+        國王或城堡不在原始格的入堡權利、沒有對應的兵可吃的過路兵格會直接清除
+        """
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError(f"FEN 欄位不足: {fen!r}")
+        placement, side, castling, ep = fields[0], fields[1], fields[2], fields[3]
+        # 數字展開成對應數量的 '.'，合法的擺放展開後剛好是 8 個 8 格橫列以 '/' 相隔
+        squares = placement.translate(_FEN_EXPAND)
+        if len(squares) != 71 or squares[8::9] != '///////':
+            raise ValueError(f"FEN 棋子擺放必須是 8 個 8 格的橫列: {placement!r}")
+        self.clear()
+        pieces = self.pieces
+        mailbox = self.mailbox
+        codes = _FEN_PIECES
+        square_bb = SQUARE_BB
+        piece_keys = PIECE_KEYS
+        key = 0
+        try:
+            for sq, char in enumerate(squares.replace('/', '')):
+                if char != '.':
+                    piece = codes[char]
+                    mailbox[sq] = piece
+                    pieces[piece] |= square_bb[sq]
+                    key ^= piece_keys[piece][sq]
+        except KeyError:
+            raise ValueError(f"FEN 含有無效字元 {char!r}: {placement!r}") from None
+        white = pieces[0] | pieces[1] | pieces[2] | pieces[3] | pieces[4] | pieces[5]
+        black = pieces[6] | pieces[7] | pieces[8] | pieces[9] | pieces[10] | pieces[11]
+        self.occupancy[WHITE] = white
+        self.occupancy[BLACK] = black
+        self.occupied = white | black
+        for king in (pieces[KING], pieces[6 + KING]):
+            if king == 0 or king & (king - 1):
+                raise ValueError(f"FEN 雙方必須各有一個國王: {placement!r}")
+        if (pieces[PAWN] | pieces[6 + PAWN]) & (RANK_MASKS[0] | RANK_MASKS[7]):
+            raise ValueError(f"FEN 第 1 或第 8 橫列不能有兵: {placement!r}")
+
+        if side == 'w':
+            self.side_to_move = WHITE
+        elif side == 'b':
+            self.side_to_move = BLACK
+        else:
+            raise ValueError(f"FEN 走棋方必須是 w 或 b: {side!r}")
+        if castling != '-':
+            for char in castling:
+                bit = _FEN_CASTLING.get(char)
+                if bit is None:
+                    raise ValueError(f"FEN 入堡權利無效: {castling!r}")
+                self.castling |= bit
+            for bit, (king_sq, rook_sq, color) in _CASTLING_HOMES.items():
+                base = color * 6
+                if not (mailbox[king_sq] == base + KING and mailbox[rook_sq] == base + ROOK):
+                    self.castling &= ~bit
+        if ep != '-':
+            if (len(ep) != 2 or ep[0] not in 'abcdefgh'
+                    or ep[1] != ('6' if self.side_to_move == WHITE else '3')):
+                raise ValueError(f"FEN 過路兵格無效（白方走棋時必須在第 6 橫列，黑方在第 3 橫列）: {ep!r}")
+            ep_square = parse_square(ep)
+            # 剛走兩格的兵必須在過路兵格前方，且過路兵格與兵的原始格都是空的
+            step = BOARD_SIZE if self.side_to_move == WHITE else -BOARD_SIZE
+            if (mailbox[ep_square + step] == (self.side_to_move ^ 1) * 6 + PAWN
+                    and mailbox[ep_square] is None and mailbox[ep_square - step] is None):
+                self.ep_square = ep_square
+        if len(fields) > 5 and fields[4].isdigit() and fields[5].isdigit():
+            self.halfmove_clock = int(fields[4])
+            self.fullmove_number = int(fields[5])
+        them = self.side_to_move ^ 1
+        if self.is_square_attacked(lsb(pieces[them * 6 + KING]), self.side_to_move):
+            raise ValueError(f"FEN 非走棋方的國王正被將軍: {fen!r}")
+        if self.side_to_move == BLACK:
+            key ^= SIDE_KEY
+        key ^= CASTLING_KEYS[self.castling]
+        if self.ep_square is not None:
+            key ^= EP_FILE_KEYS[self.ep_square & 7]
+        self.key = key
+
+    def to_fen(self, clocks=True):
+        """
+        將局面輸出為 FEN 字串
+        參數：
+            clocks: 是否包含半回合數與回合數（False 時即為 EPD 的前四個欄位）
+        """
+        mailbox = self.mailbox
+        ranks = []
+        for row in range(BOARD_SIZE):
+            text = ''
+            empty = 0
+            for piece in mailbox[row * BOARD_SIZE:(row + 1) * BOARD_SIZE]:
+                if piece is None:
+                    empty += 1
+                    continue
+                if empty:
+                    text += str(empty)
+                    empty = 0
+                text += PIECE_LETTERS[piece]
+            if empty:
+                text += str(empty)
+            ranks.append(text)
+        castling = ''.join(char for char, bit in _FEN_CASTLING.items() if self.castling & bit) or '-'
+        fields = ['/'.join(ranks), 'wb'[self.side_to_move], castling,
+                  square_name(self.ep_square) if self.ep_square is not None else '-']
+        if clocks:
+            fields.append(str(self.halfmove_clock))
+            fields.append(str(self.fullmove_number))
+        return ' '.join(fields)
+
+    @classmethod
+    def from_fen(cls, fen):
+        """由 FEN 字串建立新的局面"""
+        position = cls()
+        position.set_fen(fen)
+        return position
+
+    def copy(self):
+        """複製局面（含復原紀錄），讓搜尋或其他執行緒可以獨立走棋"""
+        other = Position.__new__(Position)
+        other.pieces = self.pieces[:]
+        other.occupancy = self.occupancy[:]
+        other.occupied = self.occupied
+        other.mailbox = self.mailbox[:]
+        other.side_to_move = self.side_to_move
+        other.castling = self.castling
+        other.ep_square = self.ep_square
+        other.halfmove_clock = self.halfmove_clock
+        other.fullmove_number = self.fullmove_number
+        other.key = self.key
+        other.history = self.history[:]
+        other._attack_cache = None
+        return other
+
+    def compute_key(self):
+        """由目前局面從頭計算 Zobrist 雜湊值（只在設定局面與驗證時使用）"""
+        key = 0
+        for sq, piece in enumerate(self.mailbox):
+            if piece is not None:
+                key ^= PIECE_KEYS[piece][sq]
+        if self.side_to_move == BLACK:
+            key ^= SIDE_KEY
+        key ^= CASTLING_KEYS[self.castling]
+        if self.ep_square is not None:
+            key ^= EP_FILE_KEYS[self.ep_square & 7]
+        return key
+
+    def put_piece(self, piece, sq):
+        """在空格 sq 放上棋子 piece"""
+        bit = SQUARE_BB[sq]
+        self.pieces[piece] |= bit
+        self.occupancy[piece // 6] |= bit
+        self.occupied |= bit
+        self.mailbox[sq] = piece
+        self.key ^= PIECE_KEYS[piece][sq]
+
+    def remove_piece(self, sq):
+        """移除 sq 上的棋子並返回其編號"""
+        piece = self.mailbox[sq]
+        bit = SQUARE_BB[sq]
+        self.pieces[piece] ^= bit
+        self.occupancy[piece // 6] ^= bit
+        self.occupied ^= bit
+        self.mailbox[sq] = None
+        self.key ^= PIECE_KEYS[piece][sq]
+        return piece
+
+    def piece_at(self, sq):
+        """返回 sq 上的棋子編號，空格返回 None"""
+        return self.mailbox[sq]
+
+    def attacks_from(self, sq):
+        """返回 sq 上棋子的攻擊範圍位元棋盤（不論目標格是否有己方棋子）"""
+        piece = self.mailbox[sq]
+        if piece is None:
+            return 0
+        kind = piece % 6
+        if kind == PAWN:
+            return PAWN_ATTACKS[piece // 6][sq]
+        if kind == KNIGHT:
+            return KNIGHT_ATTACKS[sq]
+        if kind == BISHOP:
+            return bishop_attacks(sq, self.occupied)
+        if kind == ROOK:
+            return rook_attacks(sq, self.occupied)
+        if kind == QUEEN:
+            return queen_attacks(sq, self.occupied)
+        return KING_ATTACKS[sq]
+
+    def pseudo_targets(self, sq):
+        """
+        計算 sq 上棋子可移動的目標格（pseudo-legal，不檢查是否讓國王被將軍）：
+        - 兵：向前一格（初始可兩格），斜向吃子
+        - 其他棋子：攻擊範圍扣除己方棋子
+        返回：目標格的位元棋盤
+        """
+        piece = self.mailbox[sq]
+        if piece is None:
+            return 0
+        color = piece // 6
+        if piece % 6 != PAWN:
+            return self.attacks_from(sq) & ~self.occupancy[color]
+        empty = ~self.occupied
+        targets = PAWN_ATTACKS[color][sq] & self.occupancy[color ^ 1]
+        if color == WHITE:
+            push = (SQUARE_BB[sq] >> 8) & empty
+            if push and sq >> 3 == 6:
+                push |= (push >> 8) & empty
+        else:
+            push = (SQUARE_BB[sq] << 8) & empty
+            if push and sq >> 3 == 1:
+                push |= (push << 8) & empty
+        return targets | push
+
+    def is_square_attacked(self, sq, by_color):
+        """判斷 sq 是否被 by_color 一方的任一棋子攻擊"""
+        pieces = self.pieces
+        base = by_color * 6
+        if PAWN_ATTACKS[by_color ^ 1][sq] & pieces[base + PAWN]:
+            return True
+        if KNIGHT_ATTACKS[sq] & pieces[base + KNIGHT]:
+            return True
+        if KING_ATTACKS[sq] & pieces[base + KING]:
+            return True
+        queens = pieces[base + QUEEN]
+        if bishop_attacks(sq, self.occupied) & (pieces[base + BISHOP] | queens):
+            return True
+        return bool(rook_attacks(sq, self.occupied) & (pieces[base + ROOK] | queens))
+
+    def attackers_to(self, sq, by_color, occ):
+        """返回在佔位 occ 下，by_color 一方所有攻擊 sq 的棋子位元棋盤"""
+        pieces = self.pieces
+        base = by_color * 6
+        queens = pieces[base + QUEEN]
+        return ((PAWN_ATTACKS[by_color ^ 1][sq] & pieces[base + PAWN])
+                | (KNIGHT_ATTACKS[sq] & pieces[base + KNIGHT])
+                | (KING_ATTACKS[sq] & pieces[base + KING])
+                | (bishop_attacks(sq, occ) & (pieces[base + BISHOP] | queens))
+                | (rook_attacks(sq, occ) & (pieces[base + ROOK] | queens)))
+
+    def attacked_squares(self, by_color, occ):
+        """返回在佔位 occ 下，by_color 一方攻擊到的所有格子"""
+        pieces = self.pieces
+        base = by_color * 6
+        attacked = pawn_attacks_bb(pieces[base + PAWN], by_color)
+        for sq in iter_bits(pieces[base + KNIGHT]):
+            attacked |= KNIGHT_ATTACKS[sq]
+        queens = pieces[base + QUEEN]
+        for sq in iter_bits(pieces[base + BISHOP] | queens):
+            attacked |= bishop_attacks(sq, occ)
+        for sq in iter_bits(pieces[base + ROOK] | queens):
+            attacked |= rook_attacks(sq, occ)
+        for sq in iter_bits(pieces[base + KING]):
+            attacked |= KING_ATTACKS[sq]
+        return attacked
+
+    def enable_attack_cache(self):
+        """啟用攻擊圖快取：之後產生走法時的國王危險格也經由快取計算（UI 的棋盤使用）"""
+        if self._attack_cache is None:
+            self._attack_cache = OrderedDict()
+
+    def _attack_entry(self):
+        """
+        返回目前局面的快取項目 [白方攻擊圖, 黑方攻擊圖, 走棋方國王的危險格]（尚未計算的為 None）
+        快取超過 ATTACK_CACHE_SIZE 個局面時移除最久未使用的一個
+        """
+        cache = self._attack_cache
+        if cache is None:
+            cache = self._attack_cache = OrderedDict()
+        key = self.key
+        entry = cache.get(key)
+        if entry is None:
+            entry = cache[key] = [None, None, None]
+            if len(cache) > ATTACK_CACHE_SIZE:
+                cache.popitem(last=False)
+        else:
+            cache.move_to_end(key)
+        return entry
+
+    def attack_maps(self):
+        """
+        返回雙方的攻擊圖 (白方攻擊到的格子, 黑方攻擊到的格子)
+        以雜湊值快取：每個局面只計算一次，悔棋、重做回到算過的局面時直接取用
+        """
+        entry = self._attack_entry()
+        if entry[0] is None:
+            occ = self.occupied
+            entry[0] = self.attacked_squares(WHITE, occ)
+            entry[1] = self.attacked_squares(BLACK, occ)
+        return entry[0], entry[1]
+
+    def king_danger(self):
+        """
+        返回走棋方國王不能走進的格子：移除國王後敵方攻擊到的格子（國王不能沿著將軍線後退）
+        與攻擊圖一起快取；啟用快取的局面產生走法時經由這裡計算，同一局面之後的 in_check 與產生走法直接查表
+        """
+        entry = self._attack_entry()
+        danger = entry[2]
+        if danger is None:
+            us = self.side_to_move
+            danger = entry[2] = self.attacked_squares(us ^ 1, self.occupied ^ self.pieces[us * 6 + KING])
+        return danger
+
+    def is_attacked(self, sq, by_color):
+        """以攻擊圖判斷 sq 是否被 by_color 一方攻擊（同一局面的重複查詢只需一次位元運算）"""
+        return bool(self.attack_maps()[by_color] & SQUARE_BB[sq])
+
+    def attack_counts(self, by_color):
+        """返回長度 64 的列表：每格被 by_color 一方幾個棋子攻擊"""
+        counts = [0] * 64
+        occ = self.occupied
+        for sq in iter_bits(self.attack_maps()[by_color]):
+            counts[sq] = popcount(self.attackers_to(sq, by_color, occ))
+        return counts
+
+    def in_check(self):
+        """
+        判斷走棋方的國王是否正被將軍：
+        已為這個局面算過危險格（例如先產生過走法）時直接查表，否則只檢查國王所在的一格
+        """
+        king = self.pieces[self.side_to_move * 6 + KING]
+        if not king:
+            return False
+        cache = self._attack_cache
+        if cache is not None:
+            entry = cache.get(self.key)
+            if entry is not None and entry[2] is not None:
+                return bool(entry[2] & king)
+        return self.is_square_attacked(lsb(king), self.side_to_move ^ 1)
+
+    def generate_moves(self):
+        """
+        產生走棋方的所有合法走法：
+        1. 以國王被移除後的敵方攻擊範圍計算國王可走的格子
+        2. 雙重將軍時只能走國王
+        3. 單一將軍時，其他棋子只能吃掉將軍的棋子或擋在中間（將軍遮罩）
+        4. 被牽制的棋子只能沿著牽制線移動（牽制遮罩）
+        5. 加上兵的前進、吃子、升變、吃過路兵與入堡
+        返回：16 位元走法的列表
+        """
+        moves = []
+        append = moves.append
+        us = self.side_to_move
+        them = us ^ 1
+        pieces = self.pieces
+        base = us * 6
+        tbase = them * 6
+        occ = self.occupied
+        own = self.occupancy[us]
+        enemy = self.occupancy[them]
+        king_bb = pieces[base + KING]
+        ksq = lsb(king_bb)
+
+        # 國王走法：不可走到敵方攻擊的格子（計算時移除國王，避免沿著將軍線後退）
+        # 啟用攻擊圖快取的局面（UI 的棋盤）經由快取計算，同一局面之後的 in_check、
+        # 再次產生走法（悔棋/重做、game_status）直接沿用；搜尋與 perft 每個局面通常只走訪一次，不經過快取
+        if self._attack_cache is not None:
+            danger = self.king_danger()
+        else:
+            danger = self.attacked_squares(them, occ ^ king_bb)
+        king_targets = KING_ATTACKS[ksq] & ~own & ~danger
+        if king_targets:
+            for bit, quiet, capture in KING_MOVES[ksq]:
+                if bit & king_targets:
+                    append(capture if bit & enemy else quiet)
+
+        checkers = self.attackers_to(ksq, them, occ)
+        if checkers & (checkers - 1):
+            return moves
+        if checkers:
+            check_mask = checkers | BETWEEN[ksq][lsb(checkers)]
+        else:
+            check_mask = FULL
+
+        # 牽制：敵方滑動棋子與國王之間只隔一個己方棋子
+        their_rq = pieces[tbase + ROOK] | pieces[tbase + QUEEN]
+        their_bq = pieces[tbase + BISHOP] | pieces[tbase + QUEEN]
+        pinned = 0
+        pin_masks = {}
+        for sniper in iter_bits((ROOK_RAYS[ksq] & their_rq) | (BISHOP_RAYS[ksq] & their_bq)):
+            line = BETWEEN[ksq][sniper]
+            blockers = line & occ
+            if blockers and not blockers & (blockers - 1) and blockers & own:
+                pinned |= blockers
+                pin_masks[lsb(blockers)] = line | SQUARE_BB[sniper]
+
+        # 騎士與滑動棋子：走訪預先編碼的走法表，射線遇到第一個棋子即停止
+        target_mask = ~own & check_mask
+        for sq in iter_bits(pieces[base + KNIGHT] & ~pinned):
+            for bit, quiet, capture in KNIGHT_MOVES[sq]:
+                if bit & target_mask:
+                    append(capture if bit & enemy else quiet)
+        for kind, move_rays in ((BISHOP, BISHOP_MOVE_RAYS), (ROOK, ROOK_MOVE_RAYS),
+                                (QUEEN, QUEEN_MOVE_RAYS)):
+            for sq in iter_bits(pieces[base + kind]):
+                mask = target_mask & pin_masks[sq] if pinned & SQUARE_BB[sq] else target_mask
+                for ray in move_rays[sq]:
+                    for bit, quiet, capture in ray:
+                        if bit & occ:
+                            if bit & enemy & mask:
+                                append(capture)
+                            break
+                        if bit & mask:
+                            append(quiet)
+
+        # 兵：未被牽制的兵以位移一次產生，被牽制的兵逐一處理
+        pawns = pieces[base + PAWN]
+        free_pawns = pawns & ~pinned
+        empty = ~occ & FULL
+        if us == WHITE:
+            single = (free_pawns >> 8) & empty
+            double = ((single & RANK_MASKS[5]) >> 8) & empty & check_mask
+            single &= check_mask
+            left = ((free_pawns & ~FILE_A) >> 9) & enemy & check_mask
+            right = ((free_pawns & ~FILE_H) >> 7) & enemy & check_mask
+            push, left_delta, right_delta = 8, 9, 7
+        else:
+            single = (free_pawns << 8) & empty
+            double = ((single & RANK_MASKS[2]) << 8) & empty & check_mask
+            single &= check_mask
+            left = ((free_pawns & ~FILE_A) << 7) & enemy & check_mask
+            right = ((free_pawns & ~FILE_H) << 9) & enemy & check_mask
+            push, left_delta, right_delta = -8, -7, -9
+        for to in iter_bits(single):
+            self._add_pawn_move(moves, to + push, to, QUIET)
+        for to in iter_bits(double):
+            append((to + 2 * push) | (to << 6) | (DOUBLE_PUSH << 12))
+        for to in iter_bits(left):
+            self._add_pawn_move(moves, to + left_delta, to, CAPTURE)
+        for to in iter_bits(right):
+            self._add_pawn_move(moves, to + right_delta, to, CAPTURE)
+        for sq in iter_bits(pawns & pinned):
+            targets = self.pseudo_targets(sq) & check_mask & pin_masks[sq]
+            for to in iter_bits(targets):
+                if enemy & SQUARE_BB[to]:
+                    self._add_pawn_move(moves, sq, to, CAPTURE)
+                elif abs(to - sq) == 16:
+                    append(sq | (to << 6) | (DOUBLE_PUSH << 12))
+                else:
+                    self._add_pawn_move(moves, sq, to, QUIET)
+
+        # 吃過路兵：直接檢查吃完後國王是否暴露在滑動棋子的攻擊下
+        ep = self.ep_square
+        if ep is not None:
+            captured_sq = ep + 8 if us == WHITE else ep - 8
+            if check_mask & (SQUARE_BB[ep] | SQUARE_BB[captured_sq]):
+                for sq in iter_bits(PAWN_ATTACKS[them][ep] & pawns):
+                    after = (occ ^ SQUARE_BB[sq] ^ SQUARE_BB[captured_sq]) | SQUARE_BB[ep]
+                    if rook_attacks(ksq, after) & their_rq or bishop_attacks(ksq, after) & their_bq:
+                        continue
+                    append(sq | (ep << 6) | (EP_CAPTURE << 12))
+
+        # 入堡：不在將軍中、中間沒有棋子、國王經過的格子不被攻擊
+        if not checkers and self.castling:
+            if us == WHITE:
+                if (self.castling & WHITE_KINGSIDE and not occ & 0x6000000000000000
+                        and not danger & 0x6000000000000000):
+                    append(60 | (62 << 6) | (KING_CASTLE << 12))
+                if (self.castling & WHITE_QUEENSIDE and not occ & 0x0E00000000000000
+                        and not danger & 0x0C00000000000000):
+                    append(60 | (58 << 6) | (QUEEN_CASTLE << 12))
+            else:
+                if self.castling & BLACK_KINGSIDE and not occ & 0x60 and not danger & 0x60:
+                    append(4 | (6 << 6) | (KING_CASTLE << 12))
+                if self.castling & BLACK_QUEENSIDE and not occ & 0x0E and not danger & 0x0C:
+                    append(4 | (2 << 6) | (QUEEN_CASTLE << 12))
+        return moves
+
+    @staticmethod
+    def _add_pawn_move(moves, from_sq, to_sq, flags):
+        """加入兵的走法，走到底線時展開為四種升變（皇后優先）"""
+        if to_sq < 8 or to_sq >= 56:
+            for promotion in (3, 2, 1, 0):
+                moves.append(from_sq | (to_sq << 6) | ((flags | PROMOTION | promotion) << 12))
+        else:
+            moves.append(from_sq | (to_sq << 6) | (flags << 12))
+
+    def legal_targets(self, sq):
+        """返回 sq 上棋子的合法目標格位元棋盤（非走棋方的棋子沒有合法走法）"""
+        targets = 0
+        for move in self.generate_moves():
+            if move & 63 == sq:
+                targets |= SQUARE_BB[(move >> 6) & 63]
+        return targets
+
+    def is_checkmate(self):
+        """判斷走棋方是否被將死"""
+        return self.in_check() and not self.generate_moves()
+
+    def is_stalemate(self):
+        """判斷是否為逼和（沒有被將軍但無合法走法）"""
+        return not self.in_check() and not self.generate_moves()
+
+    def game_status(self):
+        """
+        判斷對局狀態：
+        返回 'checkmate'（將死）、'stalemate'（逼和）、'check'（將軍）或 None
+        """
+        if not self.generate_moves():
+            return 'checkmate' if self.in_check() else 'stalemate'
+        if self.in_check():
+            return 'check'
+        return None
+
+    def is_repetition(self):
+        """判斷目前局面自上次吃子或動兵以來是否曾經出現過（以雜湊值比對）"""
+        history = self.history
+        limit = min(self.halfmove_clock, len(history))
+        for back in range(4, limit + 1, 2):
+            if history[-back][5] == self.key:
+                return True
+        return False
+
+    def repetition_count(self):
+        """返回目前局面自上次吃子或動兵以來出現的次數（含目前這一次，達到 3 即為三次重複）"""
+        history = self.history
+        limit = min(self.halfmove_clock, len(history))
+        count = 1
+        for back in range(4, limit + 1, 2):
+            if history[-back][5] == self.key:
+                count += 1
+        return count
+
+    def is_insufficient_material(self):
+        """判斷雙方子力是否都不足以將死（只剩國王，或全盤只多一個騎士或主教）"""
+        pieces = self.pieces
+        heavy = 0
+        for color in (WHITE, BLACK):
+            base = color * 6
+            heavy |= pieces[base + PAWN] | pieces[base + ROOK] | pieces[base + QUEEN]
+        if heavy:
+            return False
+        minors = (pieces[KNIGHT] | pieces[BISHOP] | pieces[6 + KNIGHT] | pieces[6 + BISHOP])
+        return minors & (minors - 1) == 0
+
+    def infer_move(self, from_sq, to_sq, promotion=QUEEN):
+        """
+        由起點與終點推算完整的走法編號（補上吃子、兵前進兩格、過路兵、入堡、升變旗標）
+        參數：
+            from_sq, to_sq: 起點與終點格
+            promotion: 兵走到底線時升變的棋子種類，預設為皇后
+        返回：16 位元走法
+        """
+        piece = self.mailbox[from_sq]
+        kind = piece % 6
+        flags = CAPTURE if self.mailbox[to_sq] is not None else QUIET
+        if kind == PAWN:
+            if abs(to_sq - from_sq) == 16:
+                flags = DOUBLE_PUSH
+            elif to_sq == self.ep_square and (to_sq - from_sq) % 8:
+                flags = EP_CAPTURE
+            elif to_sq >> 3 in (0, 7):
+                flags |= PROMOTION | (promotion - KNIGHT)
+        elif kind == KING and abs(to_sq - from_sq) == 2:
+            flags = KING_CASTLE if to_sq > from_sq else QUEEN_CASTLE
+        return encode_move(from_sq, to_sq, flags)
+
+    def make_move(self, move):
+        """
+        執行走法並將復原紀錄推入 history：
+        1. 移除被吃的棋子（含過路兵）
+        2. 移動棋子，升變時換成新棋子，入堡時一併移動城堡
+        3. 更新入堡權利、過路兵格、半回合數與回合數，並交換走棋方
+        4. 雜湊值隨棋子進出、入堡權利、過路兵直列與走棋方同步 XOR 更新
+        """
+        from_sq = move & 63
+        to_sq = (move >> 6) & 63
+        flags = move >> 12
+        color = self.side_to_move
+        key = self.key
+        captured = None
+        if flags == EP_CAPTURE:
+            captured = self.remove_piece(to_sq + 8 if color == WHITE else to_sq - 8)
+        elif flags & CAPTURE:
+            captured = self.remove_piece(to_sq)
+        self.history.append((move, captured, self.castling, self.ep_square,
+                             self.halfmove_clock, key))
+
+        piece = self.remove_piece(from_sq)
+        if flags & PROMOTION:
+            self.put_piece(color * 6 + KNIGHT + (flags & 3), to_sq)
+        else:
+            self.put_piece(piece, to_sq)
+        if flags == KING_CASTLE:
+            self.put_piece(self.remove_piece(to_sq + 1), to_sq - 1)
+        elif flags == QUEEN_CASTLE:
+            self.put_piece(self.remove_piece(to_sq - 2), to_sq + 1)
+
+        key = self.key ^ CASTLING_KEYS[self.castling]
+        if self.ep_square is not None:
+            key ^= EP_FILE_KEYS[self.ep_square & 7]
+        self.castling &= CASTLING_KEEP[from_sq] & CASTLING_KEEP[to_sq]
+        key ^= CASTLING_KEYS[self.castling] ^ SIDE_KEY
+        if flags == DOUBLE_PUSH:
+            self.ep_square = (from_sq + to_sq) >> 1
+            key ^= EP_FILE_KEYS[from_sq & 7]
+        else:
+            self.ep_square = None
+        self.key = key
+        if piece % 6 == PAWN or captured is not None:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if color == BLACK:
+            self.fullmove_number += 1
+        self.side_to_move = color ^ 1
+
+    def unmake_move(self):
+        """
+        撤銷最後一步走法：
+        由 history 取出復原紀錄，將棋子、入堡權利與過路兵狀態還原
+        返回：被撤銷的走法
+        """
+        move, captured, castling, ep_square, halfmove_clock, key = self.history.pop()
+        from_sq = move & 63
+        to_sq = (move >> 6) & 63
+        flags = move >> 12
+        color = self.side_to_move ^ 1
+
+        if flags == KING_CASTLE:
+            self.put_piece(self.remove_piece(to_sq - 1), to_sq + 1)
+        elif flags == QUEEN_CASTLE:
+            self.put_piece(self.remove_piece(to_sq + 1), to_sq - 2)
+        piece = self.remove_piece(to_sq)
+        if flags & PROMOTION:
+            piece = color * 6 + PAWN
+        self.put_piece(piece, from_sq)
+        if flags == EP_CAPTURE:
+            self.put_piece(captured, to_sq + 8 if color == WHITE else to_sq - 8)
+        elif captured is not None:
+            self.put_piece(captured, to_sq)
+
+        self.castling = castling
+        self.ep_square = ep_square
+        self.halfmove_clock = halfmove_clock
+        self.key = key
+        if color == BLACK:
+            self.fullmove_number -= 1
+        self.side_to_move = color
+        return move
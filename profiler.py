@@ -0,0 +1,300 @@
+"""
+效能量測模組 - 這個檔案負責：
+1. 以分段計時器量測遊戲循環每一幀各階段的耗時（每個階段只呼叫一次 perf_counter）
+2. 以計數器記錄每一幀的事件數、更新矩形數等數量
+3. 以固定長度的環狀緩衝保存最近的幀，計算幀時間百分位數與各階段耗時，供畫面上的 HUD 顯示
+4. 將每一幀的樣本串流寫入 JSON Lines 檔，供離線分析（例如找出偶發的卡頓）
+5. 提供可在執行中切換的取樣式分析器：背景執行緒定時擷取主執行緒的呼叫堆疊，
+   停止時輸出 collapsed stack 格式（可直接交給 flamegraph 工具）與最常出現的函式
+
+不依賴 pygame，搜尋、對局伺服器等無畫面的程式也可以使用。
+
+樣本檔每一行是一幀：
+    {"frame": 編號, "t": 距離開始的秒數, "ms": 幀時間, "stages": {階段: 毫秒}, "counters": {名稱: 數量}}
+
+執行方式（分析樣本檔）：
+    python profiler.py frames.jsonl
+    python profiler.py frames.jsonl --output summary.json
+"""
+
+import argparse
+import collections
+import json
+import os
+import sys
+import threading
+import time
+
+DEFAULT_HISTORY = 600       # HUD 統計使用的最近幀數
+DEFAULT_STUTTER_MS = 50.0   # 超過這個幀時間視為卡頓
+DEFAULT_INTERVAL = 0.005    # 取樣式分析器的取樣間隔（秒）
+MAX_STACK_DEPTH = 64        # 每次取樣最多記錄的堆疊層數
+
+
+def percentile(sorted_values, fraction):
+    """返回已排序數列的百分位數（最近排名法），空數列返回 0"""
+    if not sorted_values:
+        return 0.0
+    index = min(int(fraction * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def summarize(samples, stutter_ms=DEFAULT_STUTTER_MS):
+    """
+    統計幀樣本
+    參數：
+        samples: (幀時間毫秒, {階段: 毫秒}, {計數器: 數量}) 的可迭代物件
+    返回：{'frames', 'stutters', 'frame_ms': {'mean', 'p50', 'p95', 'p99', 'max'},
+           'stages': {階段: {'mean', 'p95', 'max'}}, 'counters': {名稱: 每幀平均}}
+    """
+    frame_times = []
+    stages = collections.defaultdict(list)
+    counters = collections.Counter()
+    for ms, stage_ms, counts in samples:
+        frame_times.append(ms)
+        for name, value in stage_ms.items():
+            stages[name].append(value)
+        counters.update(counts)
+    frames = len(frame_times)
+    frame_times.sort()
+    result = {
+        'frames': frames,
+        'stutters': sum(1 for ms in frame_times if ms > stutter_ms),
+        'frame_ms': {
+            'mean': sum(frame_times) / frames if frames else 0.0,
+            'p50': percentile(frame_times, 0.50),
+            'p95': percentile(frame_times, 0.95),
+            'p99': percentile(frame_times, 0.99),
+            'max': frame_times[-1] if frames else 0.0,
+        },
+        'stages': {},
+        'counters': {name: count / frames for name, count in counters.items()} if frames else {},
+    }
+    for name, values in stages.items():
+        values.sort()
+        # 沒有經過這個階段的幀以 0 計入平均
+        result['stages'][name] = {'mean': sum(values) / frames, 'p95': percentile(values, 0.95),
+                                  'max': values[-1]}
+    return result
+
+
+class FrameProfiler:
+    """
+    幀量測類別：以「上一個記號到這個記號」的分段方式計時，每個階段只多一次 perf_counter 呼叫
+    用法：
+        profiler.start_frame()
+        ...處理事件...
+        profiler.mark('events')
+        ...繪製...
+        profiler.mark('draw')
+        profiler.end_frame()
+    同一幀內同名的階段會累加（例如事件處理中穿插的點擊處理）
+    屬性：
+        frames: 已記錄的幀數
+        stutters: 幀時間超過 stutter_ms 的幀數
+        samples: 最近 history 幀的 (幀時間毫秒, {階段: 毫秒}, {計數器: 數量})
+        output_path: 樣本串流寫入的檔案，None 表示不輸出
+    """
+    def __init__(self, history=DEFAULT_HISTORY, stutter_ms=DEFAULT_STUTTER_MS, output_path=None):
+        """建立量測器；指定 output_path 時每一幀寫一行 JSON"""
+        self.stutter_ms = stutter_ms
+        self.frames = 0
+        self.stutters = 0
+        self.samples = collections.deque(maxlen=history)
+        self.output_path = output_path
+        self._output = open(output_path, 'w', encoding='utf-8') if output_path else None
+        self._origin = time.perf_counter()
+        self._frame_start = None
+        self._last = 0.0
+        self._stages = {}
+        self._counters = {}
+
+    def start_frame(self):
+        """開始一幀（在阻塞等待事件之後呼叫，閒置等待的時間不計入幀時間）"""
+        self._frame_start = self._last = time.perf_counter()
+        self._stages = {}
+        self._counters = {}
+
+    def mark(self, stage):
+        """把上一個記號到現在的時間計入 stage"""
+        now = time.perf_counter()
+        self._stages[stage] = self._stages.get(stage, 0.0) + now - self._last
+        self._last = now
+
+    def count(self, name, amount=1):
+        """累加這一幀的計數器"""
+        self._counters[name] = self._counters.get(name, 0) + amount
+
+    def end_frame(self):
+        """結束一幀：記錄樣本，需要時寫入樣本檔，返回幀時間（毫秒）"""
+        if self._frame_start is None:
+            return 0.0
+        now = time.perf_counter()
+        ms = (now - self._frame_start) * 1000
+        stage_ms = {name: seconds * 1000 for name, seconds in self._stages.items()}
+        self.samples.append((ms, stage_ms, self._counters))
+        self.frames += 1
+        if ms > self.stutter_ms:
+            self.stutters += 1
+        if self._output is not None:
+            self._output.write(json.dumps({
+                'frame': self.frames,
+                't': round(self._frame_start - self._origin, 6),
+                'ms': round(ms, 4),
+                'stages': {name: round(value, 4) for name, value in stage_ms.items()},
+                'counters': self._counters,
+            }) + '\n')
+        self._frame_start = None
+        return ms
+
+    def summary(self):
+        """統計最近 history 幀（格式同 summarize）"""
+        return summarize(self.samples, self.stutter_ms)
+
+    def hud_lines(self):
+        """整理成 HUD 顯示的文字行"""
+        result = self.summary()
+        frame_ms = result['frame_ms']
+        lines = [f"frame p50 {frame_ms['p50']:.1f}  p95 {frame_ms['p95']:.1f}  "
+                 f"p99 {frame_ms['p99']:.1f}  max {frame_ms['max']:.1f} ms",
+                 f"frames {self.frames}  stutters {self.stutters} (>{self.stutter_ms:g} ms)"]
+        for name, stage in sorted(result['stages'].items(), key=lambda item: -item[1]['mean']):
+            lines.append(f"{name:8s} mean {stage['mean']:6.2f}  p95 {stage['p95']:6.2f}  "
+                         f"max {stage['max']:6.2f} ms")
+        return lines
+
+    def close(self):
+        """關閉樣本檔"""
+        if self._output is not None:
+            self._output.close()
+            self._output = None
+
+
+class SamplingProfiler:
+    """
+    取樣式分析器類別：背景執行緒每隔 interval 秒擷取目標執行緒的呼叫堆疊並計數
+    被量測的程式不需要任何修改，停止後即可取得各堆疊出現的次數
+    （Python 執行緒切換間隔預設 5 毫秒，實際取樣頻率不會高於此）
+    屬性：
+        interval: 取樣間隔（秒）
+        stacks: {(最外層函式, ..., 最內層函式): 次數}
+        samples: 總取樣次數
+    """
+    def __init__(self, interval=DEFAULT_INTERVAL, thread_id=None):
+        """建立分析器，thread_id 預設為建立分析器的執行緒"""
+        self.interval = interval
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self):
+        """是否正在取樣"""
+        return self._thread is not None
+
+    def start(self):
+        """開始取樣（清除上一次的結果）"""
+        if self._thread is not None:
+            return
+        self.stacks.clear()
+        self.samples = 0
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止取樣並返回 stacks"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        return self.stacks
+
+    def toggle(self):
+        """切換取樣狀態，返回切換後是否正在取樣"""
+        if self.running:
+            self.stop()
+            return False
+        self.start()
+        return True
+
+    def _run(self):
+        """背景執行緒：定時擷取目標執行緒的堆疊"""
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stack.reverse()
+            self.stacks[tuple(stack)] += 1
+            self.samples += 1
+
+    def top(self, limit=15):
+        """
+        返回最常出現的函式
+        返回：[(函式, 自身次數, 累計次數), ...]，依自身次數（位於堆疊最內層）排序
+        """
+        own = collections.Counter()
+        total = collections.Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for name in set(stack):
+                total[name] += count
+        return [(name, count, total[name]) for name, count in own.most_common(limit)]
+
+    def write_collapsed(self, path):
+        """以 collapsed stack 格式（每行「外層;...;內層 次數」）寫入檔案"""
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{';'.join(stack)} {count}\n")
+
+    def report(self, limit=15):
+        """整理成文字報告"""
+        lines = [f"{self.samples} 個樣本（每 {self.interval * 1000:g} ms）"]
+        for name, own, total in self.top(limit):
+            lines.append(f"{own / self.samples:6.1%} {total / self.samples:6.1%}  {name}")
+        return '\n'.join(lines)
+
+
+def iter_samples(path):
+    """逐行讀取樣本檔，產生 (幀時間毫秒, {階段: 毫秒}, {計數器: 數量})"""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                yield record['ms'], record['stages'], record.get('counters', {})
+
+
+def main(argv=None):
+    """命令列入口：統計樣本檔的幀時間與各階段耗時"""
+    parser = argparse.ArgumentParser(description='統計遊戲循環的幀樣本檔（JSON Lines）')
+    parser.add_argument('path', help='main.py --profile-output 寫出的樣本檔')
+    parser.add_argument('--stutter-ms', type=float, default=DEFAULT_STUTTER_MS,
+                        help='超過這個幀時間視為卡頓（毫秒）')
+    parser.add_argument('--output', help='將統計結果寫入 JSON 檔')
+    args = parser.parse_args(argv)
+
+    result = summarize(iter_samples(args.path), args.stutter_ms)
+    frame_ms = result['frame_ms']
+    print(f"{result['frames']:,} 幀  卡頓 {result['stutters']:,} 幀（>{args.stutter_ms:g} ms）")
+    print(f"幀時間 mean {frame_ms['mean']:.2f}  p50 {frame_ms['p50']:.2f}  p95 {frame_ms['p95']:.2f}  "
+          f"p99 {frame_ms['p99']:.2f}  max {frame_ms['max']:.2f} ms")
+    print(f"{'階段':8s} {'mean':>8s} {'p95':>8s} {'max':>8s}")
+    for name, stage in sorted(result['stages'].items(), key=lambda item: -item[1]['mean']):
+        print(f"{name:8s} {stage['mean']:8.3f} {stage['p95']:8.3f} {stage['max']:8.3f}")
+    for name, value in sorted(result['counters'].items()):
+        print(f"{name}: 每幀平均 {value:.2f}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,258 @@
+"""
+繪圖模組 - 這個檔案負責：
+1. 以基本圖形直接在目標棋格大小下繪製棋子（不從固定大小的圖像放大，任何解析度都清晰）
+2. 依棋格大小快取整組棋子與提示圖層，只保留最近使用的幾組（超過上限時移除最久未使用的一組），
+   視窗在幾種大小或全螢幕之間來回切換時直接取用，不必重繪
+3. 繪製棋盤格子、被攻擊格子的圖層、可移動位置提示、棋子與選取高亮
+4. 棋盤一律以實際大小直接畫在畫面上並置中，不經過中間畫布、也不會每一幀縮放整個畫面
+5. 增量繪製：只重畫有變動的格子並回傳需要更新的矩形
+
+只有 UI 層（ChessBoard.draw、main.py）會載入這個模組；
+規則核心（position、board 的邏輯部分）不需要 pygame 也能使用。
+"""
+
+from collections import OrderedDict
+
+import pygame
+from constants import (
+    BOARD_SIZE, BEIGE, DARK_BROWN, HIGHLIGHT, VALID_MOVE_COLOR, ATTACK_COLOR,
+    COLOR_NAMES, PIECE_NAMES
+)
+
+SPRITE_CACHE_SIZE = 4  # 最多保留幾種棋格大小的圖像組
+
+
+def square_color(row, col):
+    """返回棋格的底色（交替的淺色和深色）"""
+    return BEIGE if (row + col) % 2 == 0 else DARK_BROWN
+
+
+def piece_margin(square_size):
+    """棋子圖像與棋格邊緣的距離（100 像素的棋格留 5 像素）"""
+    return max(square_size // 20, 1)
+
+
+def create_piece_surface(color_name, piece_type, square_size):
+    """
+    使用基本圖形在指定棋格大小下繪製棋子：
+    - 使用 Pygame 繪製簡單的幾何圖形來表示不同類型的棋子
+    - 兵：圓形
+    - 城堡：方形
+    - 騎士：三角形
+    - 主教：尖頂三角形
+    - 皇后：雙圓形
+    - 國王：圓形加十字
+    所有座標都依棋格大小計算，圖像大小為棋格扣掉兩側的邊距
+    """
+    size = square_size
+    margin = piece_margin(size)
+    # 建立透明背景的表面
+    surface = pygame.Surface((max(size - 2 * margin, 1), max(size - 2 * margin, 1)), pygame.SRCALPHA)
+    color = (255, 255, 255) if color_name == 'white' else (0, 0, 0)
+    center = size // 2 - margin        # 棋格中心在棋子圖像中的座標
+    near = size // 4 - margin          # 棋格 1/4 處
+    far = 3 * size // 4 - margin       # 棋格 3/4 處
+
+    # 根據不同棋子類型繪製不同形狀
+    if piece_type == 'pawn':  # 兵 - 圓形
+        pygame.draw.circle(surface, color, (center, center), size // 4)
+    elif piece_type == 'rook':  # 城堡 - 方形
+        pygame.draw.rect(surface, color, (near, near, size // 2, size // 2))
+    elif piece_type == 'knight':  # 騎士 - 三角形
+        pygame.draw.polygon(surface, color, [(near, center), (center, near), (far, center)])
+    elif piece_type == 'bishop':  # 主教 - 尖頂三角形
+        pygame.draw.polygon(surface, color, [(center, near), (near, far), (far, far)])
+    elif piece_type == 'queen':  # 皇后 - 雙圓形
+        pygame.draw.circle(surface, color, (center, center), size // 3)
+        pygame.draw.circle(surface, (128, 128, 128), (center, center), size // 6)
+    elif piece_type == 'king':  # 國王 - 圓形加十字
+        width = max(3 * size // 100, 1)
+        pygame.draw.circle(surface, color, (center, center), size // 3)
+        pygame.draw.line(surface, (128, 128, 128), (center, near), (center, far), width)
+        pygame.draw.line(surface, (128, 128, 128), (near, center), (far, center), width)
+    return surface
+
+
+class SpriteSet:
+    """
+    單一棋格大小的圖像組：所有棋子與提示圖層都直接以這個大小繪製
+    屬性：
+        square_size: 棋格大小
+        margin: 棋子圖像與棋格邊緣的距離
+        sprites: 以 (顏色, 種類) 為鍵的棋子圖像
+        move_marker: 可移動位置的半透明圓形圖層
+        highlight: 選中棋子的高亮圖層
+        attack_marker: 被對方攻擊格子的半透明圖層
+    """
+    def __init__(self, square_size):
+        """繪製指定棋格大小的所有棋子與提示圖層"""
+        self.square_size = square_size
+        self.margin = piece_margin(square_size)
+        self.sprites = {(color_name, piece_type): create_piece_surface(color_name, piece_type, square_size)
+                        for color_name in COLOR_NAMES for piece_type in PIECE_NAMES}
+
+        self.move_marker = pygame.Surface((square_size, square_size), pygame.SRCALPHA)
+        pygame.draw.circle(self.move_marker, VALID_MOVE_COLOR,
+                           (square_size // 2, square_size // 2), square_size // 4)
+        self.highlight = pygame.Surface((square_size, square_size), pygame.SRCALPHA)
+        self.highlight.fill(HIGHLIGHT)
+        self.attack_marker = pygame.Surface((square_size, square_size), pygame.SRCALPHA)
+        self.attack_marker.fill(ATTACK_COLOR)
+
+
+class SpriteAtlas:
+    """
+    棋子圖集類別：以棋格大小為鍵快取 SpriteSet，超過上限時移除最久未使用的一組
+    屬性：
+        max_sets: 最多保留的圖像組數
+        hits, misses: 命中與未命中（需要重新繪製）次數
+    """
+    def __init__(self, max_sets=SPRITE_CACHE_SIZE):
+        """建立空的圖集，第一次取用某個大小時才繪製"""
+        self.max_sets = max_sets
+        self.hits = 0
+        self.misses = 0
+        self._sets = OrderedDict()
+
+    def get(self, square_size):
+        """返回指定棋格大小的圖像組，快取中沒有時才繪製"""
+        sprite_set = self._sets.get(square_size)
+        if sprite_set is not None:
+            self._sets.move_to_end(square_size)
+            self.hits += 1
+            return sprite_set
+        self.misses += 1
+        sprite_set = self._sets[square_size] = SpriteSet(square_size)
+        if len(self._sets) > self.max_sets:
+            self._sets.popitem(last=False)
+        return sprite_set
+
+    def sizes(self):
+        """返回目前快取中的棋格大小（最久未使用的在前）"""
+        return list(self._sets)
+
+    def clear(self):
+        """清空快取"""
+        self._sets.clear()
+
+
+# 所有棋盤共用的棋子圖集
+atlas = SpriteAtlas()
+
+
+def _draw_square(screen, sprites, rect, row, col, piece, valid, selected, attacked):
+    """在畫面座標 rect 繪製一個棋格：底色、攻擊標記、可移動提示、棋子與選取高亮"""
+    screen.fill(square_color(row, col), rect)
+    if attacked:
+        screen.blit(sprites.attack_marker, rect)
+    if valid:
+        screen.blit(sprites.move_marker, rect)
+    if piece:
+        screen.blit(sprites.sprites[(piece.color, piece.piece_type)],
+                    (rect.x + sprites.margin, rect.y + sprites.margin))
+        if selected:
+            screen.blit(sprites.highlight, rect)
+
+
+def draw_board(board, screen):
+    """
+    繪製整個棋盤和棋子：
+    1. 繪製棋盤格子（交替的淺色和深色）
+    2. 開啟攻擊顯示時，標記被對方攻擊的格子
+    3. 繪製有效移動位置的提示標記
+    4. 繪製棋子
+    5. 繪製選中棋子的高亮效果
+    棋盤以目前的棋格大小直接畫在畫面中央
+    """
+    square_size = board.square_size
+    sprites = atlas.get(square_size)
+    attacked = board.threatened_squares() if board.show_attacks else 0
+    selected = board.selected_piece
+    x_offset, y_offset = board.board_origin()
+    for row in range(BOARD_SIZE):
+        for col in range(BOARD_SIZE):
+            rect = pygame.Rect(x_offset + col * square_size, y_offset + row * square_size,
+                               square_size, square_size)
+            piece = board.board[row][col]
+            _draw_square(screen, sprites, rect, row, col, piece, (row, col) in board.valid_moves,
+                         piece is not None and piece == selected,
+                         attacked >> (row * BOARD_SIZE + col) & 1)
+
+
+class BoardRenderer:
+    """
+    增量繪製器類別：記錄每格上次繪製的內容，每次只重畫有變動的格子
+    屬性：
+        last_state: 上次繪製時每格的 (棋子編號, 是否為可移動位置, 是否選中, 是否被攻擊)，
+                    None 表示下一次需要整個畫面重畫
+        offset: 上次繪製時棋盤左上角在畫面上的位置
+        square_size: 上次繪製時的棋格大小
+    """
+    def __init__(self):
+        """建立繪製器，第一次繪製時會整個畫面重畫"""
+        self.last_state = None
+        self.offset = None
+        self.square_size = None
+
+    def invalidate(self):
+        """要求下一次整個畫面重畫（視窗大小改變、切換全螢幕等）"""
+        self.last_state = None
+
+    def mark_dirty(self, rect):
+        """將與 rect（畫面座標）重疊的格子標記為需要重畫，例如提示框移開後露出的區域"""
+        if self.last_state is None or self.offset is None:
+            return
+        size = self.square_size
+        x_offset, y_offset = self.offset
+        first_col = max((rect.left - x_offset) // size, 0)
+        last_col = min((rect.right - 1 - x_offset) // size, BOARD_SIZE - 1)
+        first_row = max((rect.top - y_offset) // size, 0)
+        last_row = min((rect.bottom - 1 - y_offset) // size, BOARD_SIZE - 1)
+        for row in range(first_row, last_row + 1):
+            for col in range(first_col, last_col + 1):
+                self.last_state[row * BOARD_SIZE + col] = None
+
+    def draw(self, board, screen):
+        """
+        增量繪製棋盤：
+        1. 比對每格的棋子、可移動提示、選取狀態與攻擊標記，只重畫有變動的格子
+        2. 需要整個畫面重畫時（包括棋格大小或棋盤位置改變），先以底色清除畫面再畫所有格子
+        返回：需要傳給 pygame.display.update 的矩形列表（沒有變動時為空列表）
+        """
+        square_size = board.square_size
+        board.screen_size = screen.get_size()
+        sprites = atlas.get(square_size)
+        offset = board.board_origin()
+        if offset != self.offset or square_size != self.square_size:
+            self.offset = offset
+            self.square_size = square_size
+            self.invalidate()
+
+        valid_moves = set(board.valid_moves)
+        selected = board.selected_piece.position if board.selected_piece else None
+        mailbox = board.position.mailbox
+        attacked = board.threatened_squares() if board.show_attacks else 0
+        state = [(mailbox[sq], divmod(sq, BOARD_SIZE) in valid_moves,
+                  divmod(sq, BOARD_SIZE) == selected, attacked >> sq & 1)
+                 for sq in range(BOARD_SIZE * BOARD_SIZE)]
+
+        full_redraw = self.last_state is None
+        if full_redraw:
+            screen.fill(BEIGE)
+            dirty = [screen.get_rect()]
+        else:
+            dirty = []
+        grid = board.board
+        x_offset, y_offset = offset
+        for sq, square_state in enumerate(state):
+            if not full_redraw and square_state == self.last_state[sq]:
+                continue
+            row, col = divmod(sq, BOARD_SIZE)
+            rect = pygame.Rect(x_offset + col * square_size, y_offset + row * square_size,
+                               square_size, square_size)
+            if not full_redraw:
+                dirty.append(rect)
+            _draw_square(screen, sprites, rect, row, col, grid[row][col],
+                         square_state[1], square_state[2], square_state[3])
+        self.last_state = state
+        return dirty
@@ -0,0 +1,551 @@
+"""
+搜尋引擎模組 - 這個檔案負責：
+1. 以 negamax alpha-beta 搭配迭代加深搜尋最佳走法
+2. 以靜態搜尋（quiescence search）處理吃子序列，避免水平線效應
+3. 以置換表走法、MVV-LVA、殺手走法與歷史分數排序走法
+4. 提供固定大小、以深度優先取代的置換表（以 Zobrist 雜湊值索引）
+5. 提供在背景執行緒思考的電腦棋手，供 main.py 的遊戲循環使用
+6. 回報每次迭代的深度、分數、節點數、nodes/sec 與置換表命中率
+7. 指定殘局庫時，少子局面直接以殘局庫的完美結果取代搜尋
+
+執行方式（分析單一局面）：
+    python search.py --fen "<FEN>" --time 5
+    python search.py --fen "8/8/8/4k3/8/8/8/4K2Q w - - 0 1" --tablebase tablebases
+"""
+
+import argparse
+import threading
+import time
+
+from bitboard import popcount
+from constants import PAWN
+from position import (
+    Position, START_FEN, CAPTURE, PROMOTION, EP_CAPTURE, move_to_uci
+)
+from evaluation import evaluate, PIECE_VALUES
+from book import OpeningBook
+from tablebase import Tablebase, DRAW
+
+INFINITY = 1000000
+MATE_SCORE = 100000                 # 將死分數（扣除距離將死的層數）
+MATE_BOUND = MATE_SCORE - 1000      # 超過此值視為將死分數
+MAX_PLY = 128                       # 最大搜尋層數
+TIME_CHECK_INTERVAL = 256           # 每隔多少節點檢查一次時間與停止要求
+
+# 置換表節點類型
+EXACT = 0   # 精確分數
+LOWER = 1   # 下界（發生 beta 剪枝）
+UPPER = 2   # 上界（沒有走法超過 alpha）
+
+# 走法排序分數
+TT_MOVE_SCORE = 1000000
+CAPTURE_SCORE = 100000
+PROMOTION_SCORE = 90000
+KILLER_SCORES = (80000, 79000)
+
+
+class SearchAborted(Exception):
+    """搜尋因時間用完或收到停止要求而中斷"""
+
+
+class TranspositionTable:
+    """
+    置換表類別：固定大小的雜湊表，以 Zobrist 雜湊值的低位元索引
+    屬性：
+        size: 表格項目數（2 的次方）
+        entries: 每個項目為 (雜湊值, 深度, 分數, 節點類型, 最佳走法, 世代) 或 None
+        generation: 目前搜尋的世代，舊世代的項目可以直接被取代
+        probes, hits, stores: 查詢、命中與寫入次數統計
+    """
+    def __init__(self, size=1 << 20):
+        """建立置換表，size 會向下取整為 2 的次方"""
+        self.size = 1 << (max(size, 1).bit_length() - 1)
+        self.mask = self.size - 1
+        self.entries = [None] * self.size
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def clear(self):
+        """清空所有項目與統計"""
+        self.entries = [None] * self.size
+        self.generation = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        """重設查詢統計"""
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def new_search(self):
+        """開始新的搜尋：世代加一，讓上一次搜尋的項目優先被取代"""
+        self.generation = (self.generation + 1) & 0xFF
+
+    def probe(self, key):
+        """查詢雜湊值對應的項目，沒有命中返回 None"""
+        self.probes += 1
+        entry = self.entries[key & self.mask]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        return None
+
+    def store(self, key, depth, score, flag, move):
+        """
+        寫入項目（深度優先取代）：
+        空位、舊世代項目、或新結果深度不小於原項目時才覆蓋
+        """
+        index = key & self.mask
+        entry = self.entries[index]
+        if (entry is None or entry[5] != self.generation or depth >= entry[1]
+                or entry[0] == key and flag == EXACT):
+            self.entries[index] = (key, depth, score, flag, move, self.generation)
+            self.stores += 1
+
+    def hit_rate(self):
+        """返回查詢命中率（0.0 - 1.0）"""
+        return self.hits / self.probes if self.probes else 0.0
+
+    def hashfull(self):
+        """估計目前世代佔用表格的千分比（取前 1000 個項目抽樣）"""
+        sample = self.entries[:min(1000, self.size)]
+        used = sum(1 for entry in sample if entry is not None and entry[5] == self.generation)
+        return used * 1000 // len(sample)
+
+
+def score_to_tt(score, ply):
+    """將將死分數轉換為相對於目前節點的距離後存入置換表"""
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def tablebase_score(code, ply):
+    """將殘局庫代碼（tablebase.DRAW 或 2 + 將死半回合數）轉換為相對於根節點的分數"""
+    if code == DRAW:
+        return 0
+    plies = code - 2
+    if plies % 2:
+        return MATE_SCORE - ply - plies
+    return -MATE_SCORE + ply + plies
+
+
+def score_from_tt(score, ply):
+    """將置換表中的將死分數轉換回相對於根節點的距離"""
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+    return score
+
+
+class Searcher:
+    """
+    搜尋器類別：迭代加深的 negamax alpha-beta 搜尋
+    屬性：
+        tt: 置換表
+        killers: 每層兩個殺手走法（造成 beta 剪枝的安靜走法）
+        history: 歷史分數表 [棋子編號][終點格]
+        nodes: 本次搜尋的節點數
+        stop_requested: 設為 True 即可從其他執行緒要求停止搜尋
+        searching: search() 是否已開始（時間限制已設定）且尚未結束，
+                   其他執行緒看到 True 之後呼叫 set_time_limit 才不會被覆蓋
+        node_limit: 本次搜尋的節點數上限，None 表示不限
+        last_info: 最後一次完成的迭代資訊
+        tablebase: 殘局庫（tablebase.Tablebase），None 表示不使用
+        tb_hits: 本次搜尋以殘局庫取代搜尋的節點數
+    """
+    def __init__(self, tt_size=1 << 20, tablebase=None):
+        """建立搜尋器與指定大小的置換表"""
+        self.tt = TranspositionTable(tt_size)
+        self.tablebase = tablebase
+        self.tb_hits = 0
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        self.history = [[0] * 64 for _ in range(12)]
+        self.nodes = 0
+        self.stop_requested = False
+        self.searching = False
+        self.node_limit = None
+        self.last_info = None
+        self._deadline = None
+        self._start = 0.0
+        self._limit_start = 0.0
+        self._root_best = 0
+
+    def search(self, position, max_depth=MAX_PLY, time_limit=None, on_iteration=None, node_limit=None):
+        """
+        迭代加深搜尋：
+        從深度 1 開始逐層加深，直到達到 max_depth、時間用完或收到停止要求
+        參數：
+            position: 要搜尋的局面（搜尋結束時會還原為原本的狀態）
+            max_depth: 最大搜尋深度
+            time_limit: 時間限制（秒），None 表示不限時間
+            on_iteration: 每完成一次迭代時呼叫的函式，參數為迭代資訊字典
+            node_limit: 節點數上限，None 表示不限
+        返回：
+            最佳走法（沒有合法走法時返回 None）
+        """
+        self.nodes = 0
+        self.tb_hits = 0
+        self.stop_requested = False
+        self.last_info = None
+        self.tt.new_search()
+        self.tt.reset_stats()
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        for table in self.history:
+            for sq in range(64):
+                table[sq] >>= 1
+        self._start = self._limit_start = time.perf_counter()
+        self._deadline = self._start + time_limit if time_limit else None
+        self.node_limit = node_limit
+        self.searching = True
+        try:
+            return self._iterate(position, max_depth, on_iteration)
+        finally:
+            self.searching = False
+            self.node_limit = None
+
+    def _iterate(self, position, max_depth, on_iteration):
+        """迭代加深的主迴圈，返回最後一次完成的迭代的最佳走法"""
+        root_moves = position.generate_moves()
+        if not root_moves:
+            return None
+        best_move = root_moves[0]
+        root_depth = len(position.history)
+        for depth in range(1, max_depth + 1):
+            try:
+                score = self._negamax(position, depth, -INFINITY, INFINITY, 0)
+            except SearchAborted:
+                while len(position.history) > root_depth:
+                    position.unmake_move()
+                break
+            best_move = self._root_best
+            self.last_info = self._iteration_info(position, depth, score)
+            if on_iteration is not None:
+                on_iteration(self.last_info)
+            if abs(score) > MATE_BOUND:
+                break
+            # 剩餘時間不足以完成下一層時提早結束
+            if self._deadline is not None:
+                now = time.perf_counter()
+                if now - self._limit_start > (self._deadline - self._limit_start) * 0.5:
+                    break
+        return best_move
+
+    def set_time_limit(self, time_limit):
+        """
+        在搜尋進行中（可由其他執行緒）重新設定時間限制：從現在起算 time_limit 秒，None 表示不限時間
+        用於從無限時的預先思考（pondering）切換為正常計時；
+        search() 開始時會重設時間限制，因此要等 searching 為 True 之後呼叫才有效
+        """
+        self._limit_start = time.perf_counter()
+        self._deadline = self._limit_start + time_limit if time_limit else None
+
+    def search_move(self, position, move, depth, alpha, beta, time_limit=None):
+        """
+        以固定深度與搜尋視窗評估單一根走法（供平行搜尋的工作程序使用）
+        參數：
+            position: 根局面（結束時會還原）
+            move: 要評估的根走法
+            depth: 包含根走法在內的搜尋深度
+            alpha, beta: 以根局面走棋方角度表示的搜尋視窗
+            time_limit: 時間限制（秒），None 表示不限時間
+        返回：
+            走法的分數，時間用完或收到停止要求時返回 None
+        """
+        self.stop_requested = False
+        self._start = time.perf_counter()
+        self._deadline = self._start + time_limit if time_limit else None
+        root_depth = len(position.history)
+        position.make_move(move)
+        try:
+            return -self._negamax(position, depth - 1, -beta, -alpha, 1)
+        except SearchAborted:
+            return None
+        finally:
+            while len(position.history) > root_depth:
+                position.unmake_move()
+
+    def _iteration_info(self, position, depth, score):
+        """整理一次迭代的統計資訊"""
+        elapsed = time.perf_counter() - self._start
+        pv = self.principal_variation(position, depth)
+        if not pv or pv[0] != self._root_best:
+            pv = [self._root_best]
+        return {
+            'depth': depth,
+            'score': score,
+            'nodes': self.nodes,
+            'time': elapsed,
+            'nps': int(self.nodes / elapsed) if elapsed > 0 else 0,
+            'tt_hit_rate': self.tt.hit_rate(),
+            'hashfull': self.tt.hashfull(),
+            'tb_hits': self.tb_hits,
+            'pv': pv,
+        }
+
+    def principal_variation(self, position, depth):
+        """沿著置換表中的最佳走法取出主要變例（走法列表）"""
+        pv = []
+        seen = set()
+        while len(pv) < depth and position.key not in seen:
+            seen.add(position.key)
+            entry = self.tt.probe(position.key)
+            if entry is None or not entry[4] or entry[4] not in position.generate_moves():
+                break
+            pv.append(entry[4])
+            position.make_move(entry[4])
+        for _ in pv:
+            position.unmake_move()
+        return pv
+
+    def _check_time(self):
+        """檢查是否需要中斷搜尋（停止要求、時間用完或節點數達到上限）"""
+        if (self.stop_requested
+                or (self._deadline is not None and time.perf_counter() >= self._deadline)
+                or (self.node_limit is not None and self.nodes >= self.node_limit)):
+            raise SearchAborted()
+
+    def _order_moves(self, position, moves, tt_move, ply):
+        """
+        依排序分數由高到低排列走法：
+        置換表走法 > 吃子（MVV-LVA）> 升變 > 殺手走法 > 歷史分數
+        """
+        mailbox = position.mailbox
+        killers = self.killers[ply] if ply < MAX_PLY else (0, 0)
+        history = self.history
+
+        def score(move):
+            if move == tt_move:
+                return TT_MOVE_SCORE
+            flags = move >> 12
+            from_sq = move & 63
+            if flags & CAPTURE:
+                victim = PAWN if flags == EP_CAPTURE else mailbox[(move >> 6) & 63] % 6
+                return CAPTURE_SCORE + PIECE_VALUES[victim] * 10 - mailbox[from_sq] % 6
+            if flags & PROMOTION:
+                return PROMOTION_SCORE + (flags & 3)
+            if move == killers[0]:
+                return KILLER_SCORES[0]
+            if move == killers[1]:
+                return KILLER_SCORES[1]
+            return history[mailbox[from_sq]][(move >> 6) & 63]
+
+        moves.sort(key=score, reverse=True)
+        return moves
+
+    def _negamax(self, position, depth, alpha, beta, ply):
+        """
+        negamax alpha-beta 搜尋（主要變例搜尋 PVS）：
+        分數以走棋方的角度表示，返回值介於 alpha 與 beta 之間時為精確分數
+        """
+        self.nodes += 1
+        if self.nodes % TIME_CHECK_INTERVAL == 0:
+            self._check_time()
+        if ply > 0 and (position.halfmove_clock >= 100 or position.is_repetition()):
+            return 0
+        tablebase = self.tablebase
+        if (tablebase is not None and ply > 0
+                and popcount(position.occupied) <= tablebase.max_pieces):
+            code = tablebase.probe_code(position)
+            if code:
+                self.tb_hits += 1
+                return tablebase_score(code, ply)
+
+        in_check = position.in_check()
+        if in_check:
+            depth += 1  # 將軍延伸
+        if depth <= 0 or ply >= MAX_PLY - 1:
+            return self._quiescence(position, alpha, beta, ply)
+
+        key = position.key
+        tt_move = 0
+        entry = self.tt.probe(key)
+        if entry is not None:
+            tt_move = entry[4]
+            if ply > 0 and entry[1] >= depth:
+                tt_score = score_from_tt(entry[2], ply)
+                flag = entry[3]
+                if (flag == EXACT or (flag == LOWER and tt_score >= beta)
+                        or (flag == UPPER and tt_score <= alpha)):
+                    return tt_score
+
+        moves = position.generate_moves()
+        if not moves:
+            return -MATE_SCORE + ply if in_check else 0
+        self._order_moves(position, moves, tt_move, ply)
+
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move = 0
+        for index, move in enumerate(moves):
+            position.make_move(move)
+            if index == 0:
+                score = -self._negamax(position, depth - 1, -beta, -alpha, ply + 1)
+            else:
+                score = -self._negamax(position, depth - 1, -alpha - 1, -alpha, ply + 1)
+                if alpha < score < beta:
+                    score = -self._negamax(position, depth - 1, -beta, -alpha, ply + 1)
+            position.unmake_move()
+
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if not move >> 12 & (CAPTURE | PROMOTION):
+                            self._record_quiet_cutoff(position, move, depth, ply)
+                        break
+
+        if best_score >= beta:
+            flag = LOWER
+        elif best_score > original_alpha:
+            flag = EXACT
+        else:
+            flag = UPPER
+        self.tt.store(key, depth, score_to_tt(best_score, ply), flag, best_move)
+        if ply == 0:
+            self._root_best = best_move
+        return best_score
+
+    def _record_quiet_cutoff(self, position, move, depth, ply):
+        """安靜走法造成剪枝時，更新殺手走法與歷史分數"""
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        self.history[position.mailbox[move & 63]][(move >> 6) & 63] += depth * depth
+
+    def _quiescence(self, position, alpha, beta, ply):
+        """
+        靜態搜尋：只展開吃子與升變，直到局面安靜
+        以靜態評估作為不走棋時的下限（stand pat）
+        """
+        self.nodes += 1
+        if self.nodes % TIME_CHECK_INTERVAL == 0:
+            self._check_time()
+        stand_pat = evaluate(position)
+        if stand_pat >= beta or ply >= MAX_PLY - 1:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+        moves = [move for move in position.generate_moves() if move >> 12 & (CAPTURE | PROMOTION)]
+        self._order_moves(position, moves, 0, ply)
+        for move in moves:
+            position.make_move(move)
+            score = -self._quiescence(position, -beta, -alpha, ply + 1)
+            position.unmake_move()
+            if score > alpha:
+                if score >= beta:
+                    return score
+                alpha = score
+        return alpha
+
+
+def format_info(info):
+    """將迭代資訊整理成一行文字"""
+    score = info['score']
+    if abs(score) > MATE_BOUND:
+        plies = MATE_SCORE - abs(score)
+        score_text = f"將死 {'+' if score > 0 else '-'}{(plies + 1) // 2}"
+    else:
+        score_text = f"{score:+d}"
+    return (f"深度 {info['depth']:2d}  分數 {score_text:>8s}  節點 {info['nodes']:>9,}  "
+            f"{info['nps']:>8,} nodes/sec  置換表命中率 {info['tt_hit_rate']:.1%}  "
+            f"主要變例 {' '.join(move_to_uci(move) for move in info['pv'])}")
+
+
+class AIPlayer:
+    """
+    電腦棋手類別：在背景執行緒中搜尋，遊戲循環以 poll() 取得結果
+    屬性：
+        color: 電腦執哪一方（WHITE/BLACK）
+        think_time: 每步思考時間（秒）
+        searcher: 搜尋器，保留置換表讓後續思考可以重複利用
+        book: 開局庫（book.OpeningBook），局面在開局庫中時直接走開局庫的走法
+        thinking: 是否正在思考
+    """
+    def __init__(self, color, think_time=1.0, searcher=None, book=None):
+        """建立電腦棋手"""
+        self.color = color
+        self.think_time = think_time
+        self.searcher = searcher or Searcher()
+        self.book = book
+        self.thinking = False
+        self._result = None
+        self._thread = None
+
+    def start(self, position):
+        """開始思考：局面在開局庫中時直接取用，否則複製局面後在背景執行緒搜尋，不會更動傳入的局面"""
+        self._result = None
+        if self.book is not None:
+            move = self.book.choose(position)
+            if move is not None:
+                print(f"AI 開局庫走法 {move_to_uci(move)}")
+                self._result = move
+                return
+        self.thinking = True
+        self._thread = threading.Thread(target=self._run, args=(position.copy(),), daemon=True)
+        self._thread.start()
+
+    def _run(self, position):
+        """背景執行緒：搜尋並輸出統計資訊"""
+        move = self.searcher.search(position, time_limit=self.think_time)
+        if self.searcher.last_info is not None:
+            print(f"AI {format_info(self.searcher.last_info)}")
+        self._result = move
+        self.thinking = False
+
+    @property
+    def has_result(self):
+        """是否有尚未以 poll() 取走的走法"""
+        return self._result is not None
+
+    def poll(self):
+        """若思考完成返回走法並清除結果，否則返回 None"""
+        if self.thinking or self._result is None:
+            return None
+        move, self._result = self._result, None
+        return move
+
+    def cancel(self):
+        """要求停止目前的思考並捨棄結果"""
+        self.searcher.stop_requested = True
+        if self._thread is not None:
+            self._thread.join()
+        self._result = None
+        self.thinking = False
+
+
+def main(argv=None):
+    """命令列入口：分析指定局面並逐層輸出搜尋資訊"""
+    parser = argparse.ArgumentParser(description='西洋棋搜尋引擎分析')
+    parser.add_argument('--fen', default=START_FEN, help='要分析的 FEN 局面')
+    parser.add_argument('--time', type=float, default=5.0, help='思考時間（秒）')
+    parser.add_argument('--depth', type=int, default=MAX_PLY, help='最大搜尋深度')
+    parser.add_argument('--book', help='開局庫檔案：先列出局面在開局庫中的走法')
+    parser.add_argument('--tablebase', help='殘局庫目錄（以 tablebase.py build 建立）')
+    args = parser.parse_args(argv)
+
+    position = Position.from_fen(args.fen)
+    if args.book:
+        with OpeningBook(args.book) as book:
+            entries = book.probe(position)
+        for move, weight, games in entries:
+            print(f"開局庫 {move_to_uci(move)}  權重 {weight}  {games} 盤")
+        if not entries:
+            print('局面不在開局庫中')
+    searcher = Searcher(tablebase=Tablebase(args.tablebase) if args.tablebase else None)
+    best = searcher.search(position, max_depth=args.depth, time_limit=args.time,
+                           on_iteration=lambda info: print(format_info(info)))
+    print(f"最佳走法: {move_to_uci(best) if best is not None else '(無)'}")
+
+
+if __name__ == '__main__':
+    main()
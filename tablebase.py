@@ -0,0 +1,737 @@
+"""
+殘局庫模組 - 這個檔案負責：
+1. 以逆向分析（retrograde analysis）為少子殘局（KQK、KRK、KPK、KBNK 等，最多 4 子）產生完美走法表，
+   每個局面記錄走棋方的勝/和/負與距離將死的半回合數（DTM）
+2. 利用棋盤對稱性縮小索引：無兵殘局強方國王限定在 a1-d1-d4 三角形（10 格），有兵殘局限定在 a-d 直列
+3. 以多個工作程序平行分類所有局面、產生前一步局面，主程序依將死距離逐層傳遞結果
+4. 每個局面以 1 位元組存檔，查詢時以 mmap 對應檔案，算出索引後 O(1) 讀取
+5. 提供搜尋器與電腦棋手使用的查詢介面（probe_code、probe、best_move）
+
+吃子或升變會離開目前的殘局，改查子力較少的殘局表（建立時會先建立缺少的子表）；
+只剩國王、或全盤只多一個騎士或主教時直接判和。表格不考慮入堡、吃過路兵與五十步規則，
+因此不支援雙方都有兵的殘局（例如 KPKP）。
+
+檔案格式：
+    檔頭 24 位元組：魔術字 b'WCTB0001'、殘局名稱（8 位元組，右側補 0）、項目數（uint64，大端序）
+    項目 1 位元組：0 = 不合法或非標準形式的索引、1 = 和局、
+                   2 + n = n 個半回合後將死（n 為奇數：走棋方勝；n 為偶數：走棋方負）
+
+執行方式：
+    python tablebase.py build KQK KRK KPK --workers 8
+    python tablebase.py build KBNK --directory tablebases --output kbnk.json
+    python tablebase.py probe --fen "8/8/8/4k3/8/8/8/4K2Q w - - 0 1"
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bitboard import (
+    SQUARE_BB, KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS,
+    iter_bits, popcount, rook_attacks, bishop_attacks, queen_attacks
+)
+from constants import WHITE, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING
+from position import Position, CAPTURE, PROMOTION, move_to_uci
+
+TB_MAGIC = b'WCTB0001'
+HEADER = struct.Struct('>8s8sQ')  # 魔術字、殘局名稱、項目數
+TB_SUFFIX = '.wctb'
+DEFAULT_DIRECTORY = 'tablebases'
+MAX_PIECES = 4                    # 含雙方國王的棋子數上限（5 子的索引超過 3 億個項目）
+
+INVALID = 0  # 不合法或非標準形式的索引
+DRAW = 1     # 和局
+MAX_PLIES = 253  # 1 位元組能存的最大將死距離
+
+PIECE_ORDER = 'QRBNP'  # 殘局名稱中的棋子順序
+_LETTER_TYPES = {'Q': QUEEN, 'R': ROOK, 'B': BISHOP, 'N': KNIGHT, 'P': PAWN}
+_LETTER_VALUES = {'Q': 9, 'R': 5, 'B': 3, 'N': 3, 'P': 1}
+_PROMOTIONS = 'QRBN'
+
+# 建立時的後繼局面計數器特殊值
+_NEVER = 254    # 有和棋或獲勝的出口，不可能是負局
+_ILLEGAL = 255  # 不合法或非標準形式的索引
+
+
+def _transform_square(sq, transform):
+    """對格子套用對稱變換：位元 0 左右鏡射、位元 1 上下鏡射、位元 2 沿對角線轉置"""
+    row, col = divmod(sq, 8)
+    if transform & 1:
+        col = 7 - col
+    if transform & 2:
+        row = 7 - row
+    if transform & 4:
+        row, col = col, row
+    return row * 8 + col
+
+
+TRANSFORMS = [tuple(_transform_square(sq, t) for sq in range(64)) for t in range(8)]
+# 無兵殘局的國王區域：a1-d1-d4 三角形（row 7 為第 1 橫列）
+TRIANGLE = tuple(sq for sq in range(64) if sq % 8 <= 3 and 7 - sq // 8 <= sq % 8)
+# 有兵殘局的國王區域：a-d 直列（兵的方向固定，只能左右鏡射）
+HALF_BOARD = tuple(sq for sq in range(64) if sq % 8 <= 3)
+
+
+def sort_pieces(letters):
+    """依 PIECE_ORDER 排序棋子字母"""
+    return ''.join(sorted(letters, key=PIECE_ORDER.index))
+
+
+def _strength(letters):
+    """比較兩方子力強弱的鍵值：子力總和優先，其次依棋子順序比較"""
+    return (sum(_LETTER_VALUES[c] for c in letters),
+            [len(PIECE_ORDER) - PIECE_ORDER.index(c) for c in letters])
+
+
+def normalize_material(white, black):
+    """
+    把雙方（不含國王）的子力轉成殘局表名稱，強方一律當作白方
+    返回：(殘局名稱, 是否需要交換顏色)
+    """
+    white, black = sort_pieces(white), sort_pieces(black)
+    flipped = _strength(black) > _strength(white)
+    if flipped:
+        white, black = black, white
+    return 'K' + white + 'K' + black, flipped
+
+
+def is_trivial_draw(white, black):
+    """只剩國王，或全盤只多一個騎士或主教：不可能將死"""
+    return white + black in ('', 'B', 'N')
+
+
+def parse_signature(signature):
+    """
+    解析殘局名稱（例如 'KQK'、'KBNK'、'KQKR'）
+    返回：標準化後的 (白方子力, 黑方子力)，不含國王
+    名稱不合法、超過 MAX_PIECES 子或雙方都有兵時拋出 ValueError
+    """
+    text = signature.strip().upper()
+    if not text.startswith('K') or text.count('K') != 2:
+        raise ValueError(f"殘局名稱必須包含雙方國王，例如 KQK: {signature}")
+    white, black = text[1:].split('K')
+    if any(c not in PIECE_ORDER for c in white + black):
+        raise ValueError(f"未知的棋子字母: {signature}")
+    if 2 + len(white) + len(black) > MAX_PIECES:
+        raise ValueError(f"最多支援 {MAX_PIECES} 子殘局: {signature}")
+    if 'P' in white and 'P' in black:
+        raise ValueError(f"不支援雙方都有兵的殘局（表格不考慮吃過路兵）: {signature}")
+    name, _ = normalize_material(white, black)
+    return tuple(name[1:].split('K'))
+
+
+def table_dependencies(signature):
+    """返回吃子或升變後會進入的殘局表名稱（不含直接判和的子力）"""
+    sides = parse_signature(signature)
+    result = set()
+    for mover in (0, 1):
+        own, other = sides[mover], sides[mover ^ 1]
+        captures = [other[:i] + other[i + 1:] for i in range(len(other))]
+        variants = [(own, rest) for rest in captures]
+        for i, letter in enumerate(own):
+            if letter != 'P':
+                continue
+            for promotion in _PROMOTIONS:
+                promoted = own[:i] + promotion + own[i + 1:]
+                variants.append((promoted, other))
+                variants.extend((promoted, rest) for rest in captures)
+        for own_after, other_after in variants:
+            white, black = (own_after, other_after) if mover == 0 else (other_after, own_after)
+            if not is_trivial_draw(white, black):
+                result.add(normalize_material(white, black)[0])
+    return sorted(result, key=len)
+
+
+def _attacks(code, sq, occ):
+    """返回棋子 code 在 sq、佔位為 occ 時攻擊到的格子"""
+    kind = code % 6
+    if kind == PAWN:
+        return PAWN_ATTACKS[code // 6][sq]
+    if kind == KNIGHT:
+        return KNIGHT_ATTACKS[sq]
+    if kind == BISHOP:
+        return bishop_attacks(sq, occ)
+    if kind == ROOK:
+        return rook_attacks(sq, occ)
+    if kind == QUEEN:
+        return queen_attacks(sq, occ)
+    return KING_ATTACKS[sq]
+
+
+class TableLayout:
+    """
+    殘局表的索引配置：索引 = ((走棋方 * 國王區域格數 + 白王區域編號) * 64 + 黑王格) * 64 + 其他棋子格...
+    同一個對稱類別（變換後相同、或同種棋子交換位置）只有索引最小的標準形式會存放結果
+    屬性：
+        signature: 殘局名稱
+        pieces: 索引順序的棋子編號 [白王, 黑王, 白方其他棋子..., 黑方其他棋子...]
+        has_pawns: 是否有兵
+        region: 白王可以出現的格子
+        size: 索引總數（檔案的項目數）
+    """
+    def __init__(self, signature):
+        """依殘局名稱建立索引配置，名稱不合法時拋出 ValueError"""
+        white, black = parse_signature(signature)
+        self.signature = 'K' + white + 'K' + black
+        self.pieces = ([KING, 6 + KING] + [_LETTER_TYPES[c] for c in white]
+                       + [6 + _LETTER_TYPES[c] for c in black])
+        self.count = len(self.pieces)
+        self.has_pawns = 'P' in white + black
+        self.region = HALF_BOARD if self.has_pawns else TRIANGLE
+        self.region_index = [-1] * 64
+        for i, sq in enumerate(self.region):
+            self.region_index[sq] = i
+        self.size = 2 * len(self.region) * 64 ** (self.count - 1)
+        transforms = TRANSFORMS[:2] if self.has_pawns else TRANSFORMS
+        # 每個白王位置可用的變換（把白王帶進區域的變換，對角線上的格子有兩個）
+        self.king_transforms = [[t for t in transforms if self.region_index[t[sq]] >= 0]
+                                for sq in range(64)]
+        # 同種棋子的索引範圍，標準形式中依格子由小到大排列
+        self.groups = []
+        start = 2
+        while start < self.count:
+            end = start + 1
+            while end < self.count and self.pieces[end] == self.pieces[start]:
+                end += 1
+            if end - start > 1:
+                self.groups.append((start, end))
+            start = end
+
+    def index(self, stm, squares):
+        """以白王已在區域內的格子列表計算索引"""
+        index = stm * len(self.region) + self.region_index[squares[0]]
+        for sq in squares[1:]:
+            index = index * 64 + sq
+        return index
+
+    def canonical_index(self, stm, squares):
+        """返回局面所在對稱類別的標準形式索引"""
+        best = None
+        for table in self.king_transforms[squares[0]]:
+            mapped = [table[sq] for sq in squares]
+            for start, end in self.groups:
+                mapped[start:end] = sorted(mapped[start:end])
+            index = self.index(stm, mapped)
+            if best is None or index < best:
+                best = index
+        return best
+
+    def decode(self, index):
+        """由索引還原 (走棋方, 格子列表)"""
+        squares = []
+        for _ in range(self.count - 1):
+            index, sq = divmod(index, 64)
+            squares.append(sq)
+        stm, region = divmod(index, len(self.region))
+        squares.append(self.region[region])
+        squares.reverse()
+        return stm, squares
+
+    def is_canonical(self, index, stm, squares):
+        """判斷格子互不重疊、兵不在底線，且 index 就是標準形式"""
+        if len(set(squares)) != self.count:
+            return False
+        for code, sq in zip(self.pieces, squares):
+            if code % 6 == PAWN and sq // 8 in (0, 7):
+                return False
+        return self.canonical_index(stm, squares) == index
+
+    def setup(self, position, stm, squares):
+        """把格子列表擺到可重複使用的局面物件上"""
+        position.clear()
+        for code, sq in zip(self.pieces, squares):
+            position.put_piece(code, sq)
+        position.side_to_move = stm
+
+    def predecessors(self, index):
+        """
+        產生前一步局面：由剛走完的一方（對手）退回一步不吃子、不升變的走法，
+        排除退回後走棋方國王處於被將軍狀態的局面
+        返回：前一步局面標準形式索引的元組（同一個對稱類別只出現一次）
+        """
+        stm, squares = self.decode(index)
+        mover = stm ^ 1
+        pieces = self.pieces
+        occ = 0
+        for sq in squares:
+            occ |= SQUARE_BB[sq]
+        king_bit = SQUARE_BB[squares[stm]]
+        result = set()
+        for i, code in enumerate(pieces):
+            if code // 6 != mover:
+                continue
+            sq = squares[i]
+            if code % 6 == PAWN:
+                origins = self._pawn_origins(mover, sq, occ)
+            else:
+                origins = _attacks(code, sq, occ) & ~occ
+            for origin in iter_bits(origins):
+                before = list(squares)
+                before[i] = origin
+                before_occ = occ ^ SQUARE_BB[sq] ^ SQUARE_BB[origin]
+                if any(_attacks(c, s, before_occ) & king_bit
+                       for c, s in zip(pieces, before) if c // 6 == mover):
+                    continue
+                result.add(self.canonical_index(mover, before))
+        return tuple(result)
+
+    @staticmethod
+    def _pawn_origins(color, sq, occ):
+        """返回兵退回一步（含初始兩格）可能的出發格"""
+        step = 8 if color == WHITE else -8
+        origin = sq + step
+        if not 8 <= origin < 56 or occ & SQUARE_BB[origin]:
+            return 0
+        origins = SQUARE_BB[origin]
+        double_row = 4 if color == WHITE else 3
+        if sq // 8 == double_row and not occ & SQUARE_BB[origin + step]:
+            origins |= SQUARE_BB[origin + step]
+        return origins
+
+
+def _side_material(pieces, base):
+    """返回一方（不含國王）的子力字母，依 PIECE_ORDER 排列"""
+    return ''.join(letter * popcount(pieces[base + _LETTER_TYPES[letter]]) for letter in PIECE_ORDER)
+
+
+def _child_rank(code):
+    """依走完後對手的結果排序走法：讓對手輸得最快的最好，其次和棋，最後輸得最慢的"""
+    if code == DRAW:
+        return 1, 0
+    plies = code - 2
+    if plies % 2 == 0:
+        return 2, -plies
+    return 0, plies
+
+
+class EndgameTable:
+    """
+    單一殘局表的讀取類別：以 mmap 對應檔案，查詢時只讀取一個位元組
+    屬性：
+        path: 檔案路徑
+        layout: 索引配置
+    """
+    def __init__(self, path, signature):
+        """開啟殘局表檔案，格式不符時拋出 ValueError"""
+        self.path = path
+        self.layout = TableLayout(signature)
+        self._file = open(path, 'rb')
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+            if size < HEADER.size:
+                raise ValueError(f"不是殘局庫檔案: {path}")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, name, count = HEADER.unpack_from(self._map, 0)
+            if (magic != TB_MAGIC or name.rstrip(b'\0').decode('ascii') != self.layout.signature
+                    or count != self.layout.size or size != HEADER.size + count):
+                self._map.close()
+                raise ValueError(f"不是 {self.layout.signature} 殘局庫檔案或檔案不完整: {path}")
+        except BaseException:
+            self._file.close()
+            raise
+
+    def close(self):
+        """關閉檔案對應"""
+        if not self._map.closed:
+            self._map.close()
+        self._file.close()
+
+    def probe_code(self, position, flipped):
+        """查詢局面的代碼；flipped 為 True 時先交換雙方顏色（黑方是強方）"""
+        layout = self.layout
+        pieces = position.pieces
+        squares = []
+        previous = None
+        for code in layout.pieces:
+            if code == previous:
+                continue
+            previous = code
+            bb = pieces[(code + 6) % 12 if flipped else code]
+            squares.extend(sq ^ 56 if flipped else sq for sq in iter_bits(bb))
+        stm = position.side_to_move ^ flipped
+        return self._map[HEADER.size + layout.canonical_index(stm, squares)]
+
+
+class Tablebase:
+    """
+    殘局庫類別：管理一個目錄中的所有殘局表，第一次查詢某種子力時才開啟對應的檔案
+    屬性：
+        directory: 殘局表目錄
+        available: {殘局名稱: 檔案路徑}
+        max_pieces: 可查詢的最大棋子數（沒有任何殘局表時為 0）
+    """
+    def __init__(self, directory=DEFAULT_DIRECTORY):
+        """掃描目錄中的殘局表檔案（目錄不存在時視為空的殘局庫）"""
+        self.directory = directory
+        self.available = {}
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                if name.endswith(TB_SUFFIX):
+                    self.available[name[:-len(TB_SUFFIX)]] = os.path.join(directory, name)
+        self.max_pieces = max((len(name) for name in self.available), default=0)
+        self._tables = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """關閉所有已開啟的殘局表"""
+        for table in self._tables.values():
+            table.close()
+        self._tables.clear()
+
+    def table(self, signature):
+        """返回殘局表物件，沒有這個檔案時返回 None"""
+        table = self._tables.get(signature)
+        if table is None:
+            path = self.available.get(signature)
+            if path is None:
+                return None
+            table = self._tables[signature] = EndgameTable(path, signature)
+        return table
+
+    def probe_code(self, position):
+        """
+        查詢局面的原始代碼（DRAW 或 2 + 將死半回合數），不在殘局庫中時返回 None
+        只剩國王或只多一個輕子的局面不需要檔案，直接返回 DRAW
+        """
+        if position.castling:
+            return None
+        pieces = position.pieces
+        white = _side_material(pieces, 0)
+        black = _side_material(pieces, 6)
+        if is_trivial_draw(white, black):
+            return DRAW
+        if 2 + len(white) + len(black) > self.max_pieces or ('P' in white and 'P' in black):
+            return None
+        signature, flipped = normalize_material(white, black)
+        table = self.table(signature)
+        if table is None:
+            return None
+        return table.probe_code(position, flipped)
+
+    def probe(self, position):
+        """
+        查詢局面
+        返回：('win' | 'draw' | 'loss', 將死半回合數) 的元組（以走棋方的角度），不在殘局庫中時返回 None
+        """
+        code = self.probe_code(position)
+        if code is None or code == INVALID:
+            return None
+        if code == DRAW:
+            return 'draw', None
+        plies = code - 2
+        return ('win' if plies % 2 else 'loss'), plies
+
+    def rank_moves(self, position):
+        """
+        以殘局庫為所有合法走法排序（最好的在前）
+        返回：[(走法, 走完後對手的代碼), ...]，任一走法的結果查不到時返回 None
+        """
+        ranked = []
+        for move in position.generate_moves():
+            position.make_move(move)
+            code = self.probe_code(position)
+            position.unmake_move()
+            if code is None or code == INVALID:
+                return None
+            ranked.append((move, code))
+        ranked.sort(key=lambda item: _child_rank(item[1]), reverse=True)
+        return ranked
+
+    def best_move(self, position):
+        """返回殘局庫中的最佳走法（勝局走最快的將死、負局拖最久），查不到時返回 None"""
+        ranked = self.rank_moves(position)
+        return ranked[0][0] if ranked else None
+
+
+def table_path(directory, signature):
+    """返回殘局表的檔案路徑"""
+    return os.path.join(directory, signature + TB_SUFFIX)
+
+
+# 工作程序內的狀態（由 _init_worker 建立）：(索引配置, 子表殘局庫, 可重複使用的局面)
+_worker_state = None
+
+
+def _init_worker(signature, directory):
+    """工作程序初始化：建立索引配置並開啟子表"""
+    global _worker_state
+    _worker_state = (TableLayout(signature), Tablebase(directory), Position())
+
+
+def _classify_chunk(bounds):
+    """
+    工作程序任務：分類索引 [start, end) 的所有局面
+    - 不合法或非標準形式：計數器設為 _ILLEGAL
+    - 將死：0 半回合後負；逼和：和局
+    - 吃子與升變（出口）直接查子表；留在表內的走法只計算不同的後繼對稱類別數
+    返回：(start, 計數器位元組, 最慢的出口負局半回合數位元組, [(索引, 已確定的將死半回合數), ...])
+    """
+    start, end = bounds
+    layout, tablebase, position = _worker_state
+    counters = bytearray(end - start)
+    exit_losses = bytearray(end - start)
+    resolved = []
+    for offset, index in enumerate(range(start, end)):
+        stm, squares = layout.decode(index)
+        if not layout.is_canonical(index, stm, squares):
+            counters[offset] = _ILLEGAL
+            continue
+        layout.setup(position, stm, squares)
+        if position.is_square_attacked(squares[stm ^ 1], stm):
+            counters[offset] = _ILLEGAL
+            continue
+        moves = position.generate_moves()
+        if not moves:
+            if position.in_check():
+                resolved.append((index, 0))
+            else:
+                counters[offset] = _NEVER
+            continue
+        successors = set()
+        best_win = None
+        drawn = False
+        worst_loss = 0
+        for move in moves:
+            if move >> 12 & (CAPTURE | PROMOTION):
+                position.make_move(move)
+                code = tablebase.probe_code(position)
+                position.unmake_move()
+                if code is None:
+                    raise ValueError(f"{layout.signature} 缺少子表（{move_to_uci(move)} 之後）")
+                if code == DRAW:
+                    drawn = True
+                    continue
+                plies = code - 1  # 對手的將死距離再加上這一步
+                if plies % 2:
+                    best_win = plies if best_win is None else min(best_win, plies)
+                else:
+                    worst_loss = max(worst_loss, plies)
+            else:
+                from_sq, to_sq = move & 63, (move >> 6) & 63
+                after = [to_sq if sq == from_sq else sq for sq in squares]
+                successors.add(layout.canonical_index(stm ^ 1, after))
+        if best_win is not None:
+            resolved.append((index, best_win))
+            counters[offset] = _NEVER
+        elif drawn:
+            counters[offset] = _NEVER
+        else:
+            counters[offset] = len(successors)
+            exit_losses[offset] = worst_loss
+            if not successors:
+                resolved.append((index, worst_loss))
+    return start, bytes(counters), bytes(exit_losses), resolved
+
+
+def _predecessor_chunk(indices):
+    """工作程序任務：返回每個索引的前一步局面索引元組"""
+    layout = _worker_state[0]
+    return [layout.predecessors(index) for index in indices]
+
+
+def _chunks(items, size):
+    """把列表切成固定大小的片段"""
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def build_table(signature, directory=DEFAULT_DIRECTORY, workers=None, log=None):
+    """
+    以逆向分析建立一個殘局表（缺少的子表會先遞迴建立）
+    1. 工作程序平行分類所有索引，得到將死、出口結果與每個局面的後繼對稱類別數
+    2. 依將死半回合數由小到大逐層處理：
+       新確定的負局 → 所有前一步局面是勝局（半回合數 + 1）；
+       新確定的勝局 → 前一步局面的計數器減一，歸零時所有走法都輸，
+       成為負局（半回合數取表內最慢的一步與最慢的出口兩者中較大的）
+    3. 剩下未確定的合法局面都是和局
+    參數：
+        workers: 工作程序數，預設為 CPU 核心數；1 表示在目前程序中執行
+        log: 接收進度訊息的函式（例如 print），None 表示不輸出
+    返回：建立結果 {'signature', 'positions', 'wins', 'draws', 'losses', 'max_plies',
+                    'bytes', 'seconds', 'path', 'built'}（built 為本次建立的所有表，含子表）
+    """
+    layout = TableLayout(signature)
+    signature = layout.signature
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(directory, exist_ok=True)
+    built = []
+    for dependency in table_dependencies(signature):
+        if not os.path.exists(table_path(directory, dependency)):
+            built.extend(build_table(dependency, directory, workers, log)['built'])
+
+    start_time = time.perf_counter()
+    size = layout.size
+    values = bytearray(size)
+    counters = bytearray(size)
+    exit_losses = bytearray(size)
+    buckets = {}
+
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                       initargs=(signature, directory))
+        mapper = executor.map
+    else:
+        executor = None
+        _init_worker(signature, directory)
+        mapper = map
+    try:
+        chunk = max(1024, size // (workers * 16))
+        bounds = [(start, min(start + chunk, size)) for start in range(0, size, chunk)]
+        for start, chunk_counters, chunk_losses, resolved in mapper(_classify_chunk, bounds):
+            counters[start:start + len(chunk_counters)] = chunk_counters
+            exit_losses[start:start + len(chunk_losses)] = chunk_losses
+            for index, plies in resolved:
+                buckets.setdefault(plies, []).append(index)
+        if log:
+            log(f"{signature}: 分類 {size:,} 個索引 {time.perf_counter() - start_time:.1f} 秒")
+
+        while buckets:
+            plies = min(buckets)
+            if plies > MAX_PLIES:
+                raise ValueError(f"{signature} 的將死距離超過 {MAX_PLIES} 半回合")
+            newly = []
+            for index in buckets.pop(plies):
+                if values[index] == INVALID and counters[index] != _ILLEGAL:
+                    values[index] = 2 + plies
+                    newly.append(index)
+            if not newly:
+                continue
+            if len(newly) > 2048 and executor is not None:
+                batches = mapper(_predecessor_chunk, _chunks(newly, 2048))
+            else:
+                batches = [[layout.predecessors(index) for index in newly]]
+            for batch in batches:
+                for predecessors in batch:
+                    for index in predecessors:
+                        if values[index] != INVALID:
+                            continue
+                        if plies % 2 == 0:
+                            buckets.setdefault(plies + 1, []).append(index)
+                            continue
+                        remaining = counters[index]
+                        if remaining >= _NEVER:
+                            continue
+                        remaining -= 1
+                        counters[index] = remaining
+                        if remaining == 0:
+                            loss = max(plies + 1, exit_losses[index])
+                            buckets.setdefault(loss, []).append(index)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    positions = size - counters.count(_ILLEGAL)
+    wins = losses = 0
+    max_plies = 0
+    for code in range(2, 2 + MAX_PLIES + 1):
+        count = values.count(code)
+        if count:
+            max_plies = code - 2
+            if (code - 2) % 2:
+                wins += count
+            else:
+                losses += count
+    for index in range(size):
+        if values[index] == INVALID and counters[index] != _ILLEGAL:
+            values[index] = DRAW
+
+    path = table_path(directory, signature)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(HEADER.pack(TB_MAGIC, signature.encode('ascii'), size))
+        f.write(values)
+    os.replace(temp_path, path)
+
+    result = {
+        'signature': signature,
+        'positions': positions,
+        'wins': wins,
+        'draws': positions - wins - losses,
+        'losses': losses,
+        'max_plies': max_plies,
+        'bytes': HEADER.size + size,
+        'seconds': time.perf_counter() - start_time,
+        'workers': workers,
+        'path': path,
+    }
+    result['built'] = built + [{key: value for key, value in result.items() if key != 'built'}]
+    if log:
+        log(f"{signature}: {positions:,} 個局面  勝 {wins:,}  和 {result['draws']:,}  負 {losses:,}  "
+            f"最長 {max_plies} 半回合  {result['bytes']:,} 位元組  {result['seconds']:.1f} 秒")
+    return result
+
+
+def _describe(code):
+    """把代碼轉成以走棋方角度的文字"""
+    if code == DRAW:
+        return '和局'
+    plies = code - 2
+    if plies == 0:
+        return '被將死'
+    if plies % 2:
+        return f"{(plies + 1) // 2} 步將死對手"
+    return f"{plies // 2} 步後被將死"
+
+
+def main(argv=None):
+    """命令列入口：建立或查詢殘局庫"""
+    parser = argparse.ArgumentParser(description='少子殘局庫（逆向分析、mmap 查詢）')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help='以逆向分析建立殘局表')
+    build.add_argument('signatures', nargs='+', help='殘局名稱，例如 KQK KRK KPK KBNK')
+    build.add_argument('--directory', default=DEFAULT_DIRECTORY, help='殘局表目錄')
+    build.add_argument('--workers', type=int, default=None, help='工作程序數（預設為 CPU 核心數）')
+    build.add_argument('--force', action='store_true', help='已存在的表也重新建立')
+    build.add_argument('--output', help='將建立結果寫入 JSON 檔')
+
+    probe = commands.add_parser('probe', help='查詢局面並列出每個走法的結果')
+    probe.add_argument('--fen', required=True, help='要查詢的 FEN 局面')
+    probe.add_argument('--directory', default=DEFAULT_DIRECTORY, help='殘局表目錄')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        try:
+            signatures = [TableLayout(name).signature for name in args.signatures]
+        except ValueError as exc:
+            parser.error(str(exc))
+        results = []
+        for signature in signatures:
+            if not args.force and os.path.exists(table_path(args.directory, signature)):
+                print(f"{signature}: 已存在，略過（使用 --force 重新建立）")
+                continue
+            results.extend(build_table(signature, args.directory, args.workers, print)['built'])
+        if results:
+            print(f"共 {len(results)} 個表  {sum(r['bytes'] for r in results):,} 位元組  "
+                  f"{sum(r['seconds'] for r in results):.1f} 秒")
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+        return 0
+
+    try:
+        position = Position.from_fen(args.fen)
+    except ValueError as exc:
+        parser.error(str(exc))
+    with Tablebase(args.directory) as tablebase:
+        code = tablebase.probe_code(position)
+        if code is None or code == INVALID:
+            print('局面不在殘局庫中')
+            return 1
+        print(f"走棋方：{_describe(code)}")
+        for move, child in tablebase.rank_moves(position) or []:
+            print(f"{move_to_uci(move):6s} 對手{_describe(child)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,323 @@
+"""
+自我對弈賽程模組 - 這個檔案負責：
+1. 不需要顯示器的對局入口：兩組引擎設定從開局庫的每個局面各執白、黑對下
+2. 以多個工作程序（process pool）同時進行多盤對局，每個程序保留自己的搜尋器
+3. 對局結束即寫入 PGN 檔（完成一盤寫一盤），中途停止也不會遺失已完成的對局
+4. 統計第一組引擎的勝/和/負、Elo 差距與 95% 誤差範圍、平均對局長度與 nodes/sec
+
+引擎設定以逗號分隔的 key=value 表示：
+    depth=<最大深度>  time=<每步秒數>  tt=<置換表項目數>
+例如 "depth=3" 或 "time=0.1,tt=65536"。
+
+執行方式：
+    python tournament.py --engine-a depth=3 --engine-b depth=2 --games 200 --workers 8
+    python tournament.py --engine-a time=0.05 --engine-b time=0.05 --openings book.epd --pgn games.pgn
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from constants import WHITE
+from fen_io import iter_lines
+from pgn import Game, parse_san, write_game
+from position import Position, START_FEN
+from search import Searcher
+
+DEFAULT_MAX_PLIES = 400  # 超過這個半回合數即判和
+
+# 內建開局庫：由初始局面走出的 SAN 走法
+DEFAULT_OPENINGS = [
+    'e4 e5 Nf3 Nc6 Bb5',
+    'e4 e5 Nf3 Nc6 Bc4',
+    'e4 c5 Nf3 d6 d4',
+    'e4 c5 Nc3 Nc6',
+    'e4 e6 d4 d5',
+    'e4 c6 d4 d5',
+    'd4 d5 c4 e6',
+    'd4 d5 c4 c6',
+    'd4 Nf6 c4 g6 Nc3 Bg7',
+    'd4 Nf6 c4 e6 Nc3 Bb4',
+    'c4 e5 Nc3 Nf6',
+    'Nf3 d5 g3 Nf6 Bg2',
+]
+
+# 工作程序內依引擎設定快取的搜尋器
+_worker_searchers = {}
+
+
+def parse_engine(spec):
+    """
+    解析引擎設定字串，返回 {'depth': int 或 None, 'time': float 或 None, 'tt': int}
+    depth 與 time 都沒有指定時預設為 depth=3
+    """
+    config = {'depth': None, 'time': None, 'tt': 1 << 18}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, value = item.partition('=')
+        if name == 'depth':
+            config['depth'] = int(value)
+        elif name == 'time':
+            config['time'] = float(value)
+        elif name == 'tt':
+            config['tt'] = int(value)
+        else:
+            raise ValueError(f"未知的引擎設定: {item!r}")
+    if config['depth'] is None and config['time'] is None:
+        config['depth'] = 3
+    return config
+
+
+def load_openings(path=None):
+    """
+    載入開局庫，返回 FEN 列表
+    path 為 None 時使用內建的 SAN 開局；否則讀取 FEN/EPD 檔（每行一個局面）
+    """
+    if path is not None:
+        return [Position.from_fen(line).to_fen() for line in iter_lines(path)]
+    openings = []
+    position = Position()
+    for line in DEFAULT_OPENINGS:
+        position.setup_start()
+        for san in line.split():
+            position.make_move(parse_san(position, san))
+        openings.append(position.to_fen())
+    return openings
+
+
+def _get_searcher(spec):
+    """取得工作程序中對應引擎設定的搜尋器（每種設定只建立一次）"""
+    searcher = _worker_searchers.get(spec)
+    if searcher is None:
+        searcher = Searcher(parse_engine(spec)['tt'])
+        _worker_searchers[spec] = searcher
+    return searcher
+
+
+def play_game(index, fen, white, black, max_plies=DEFAULT_MAX_PLIES):
+    """
+    工作程序任務：由 fen 局面開始，white 與 black 兩組引擎設定對下一盤
+    返回對局紀錄字典：序號、起始 FEN、走法列表、結果、結束原因、
+    半回合數、雙方節點數與思考時間
+    """
+    position = Position.from_fen(fen)
+    specs = (white, black)
+    configs = (parse_engine(white), parse_engine(black))
+    searchers = (_get_searcher(white), _get_searcher(black))
+    for searcher in searchers:
+        searcher.tt.clear()
+    nodes = [0, 0]
+    seconds = [0.0, 0.0]
+    moves = []
+    while True:
+        if not position.generate_moves():
+            if position.in_check():
+                result = '0-1' if position.side_to_move == WHITE else '1-0'
+                reason = 'checkmate'
+            else:
+                result, reason = '1/2-1/2', 'stalemate'
+            break
+        if position.halfmove_clock >= 100:
+            result, reason = '1/2-1/2', 'fifty-move rule'
+            break
+        if position.repetition_count() >= 3:
+            result, reason = '1/2-1/2', 'threefold repetition'
+            break
+        if position.is_insufficient_material():
+            result, reason = '1/2-1/2', 'insufficient material'
+            break
+        if len(moves) >= max_plies:
+            result, reason = '1/2-1/2', 'max plies'
+            break
+        side = position.side_to_move
+        config = configs[side]
+        start = time.perf_counter()
+        move = searchers[side].search(position, max_depth=config['depth'] or 64,
+                                      time_limit=config['time'])
+        seconds[side] += time.perf_counter() - start
+        nodes[side] += searchers[side].nodes
+        position.make_move(move)
+        moves.append(move)
+    return {
+        'index': index,
+        'fen': fen,
+        'white': specs[0],
+        'black': specs[1],
+        'moves': moves,
+        'result': result,
+        'reason': reason,
+        'plies': len(moves),
+        'nodes': nodes,
+        'seconds': seconds,
+    }
+
+
+def elo_difference(wins, draws, losses):
+    """
+    由勝/和/負計算 Elo 差距與 95% 信賴區間的半寬
+    沒有上限的值返回 None：全勝或全敗時兩者都是 None，信賴區間碰到得分率 0 或 1 時半寬為 None
+    """
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0, 0.0
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2
+                + losses * score ** 2) / games
+    margin = 1.96 * math.sqrt(variance / games)
+    elo = _score_to_elo(score)
+    low, high = _score_to_elo(score - margin), _score_to_elo(score + margin)
+    if elo is None or low is None or high is None:
+        return elo, None
+    return elo, (high - low) / 2
+
+
+def format_elo(elo, margin, score):
+    """將 Elo 差距與誤差範圍整理成文字，沒有上限的值以「無上限」表示"""
+    if elo is None:
+        return ('+' if score >= 1 else '-') + '無上限'
+    return f"{elo:+.1f} ± " + (f"{margin:.1f}" if margin is not None else '無上限')
+
+
+def _score_to_elo(score):
+    """將得分率換算為 Elo 差距，得分率不在 0 與 1 之間（差距沒有上限）時返回 None"""
+    if not 0 < score < 1:
+        return None
+    return -400 * math.log10(1 / score - 1)
+
+
+def run_tournament(engine_a, engine_b, games, workers=None, openings=None,
+                   pgn_path=None, max_plies=DEFAULT_MAX_PLIES, on_game=None):
+    """
+    執行賽程：依序取開局局面，每個局面兩組引擎各執白、黑一次
+    參數：
+        engine_a, engine_b: 引擎設定字串（統計以 engine_a 的角度表示）
+        games: 總對局數
+        workers: 工作程序數量，預設為 CPU 核心數
+        openings: 開局 FEN 列表，None 時使用內建開局庫
+        pgn_path: 完成的對局即時附加寫入的 PGN 檔
+        on_game: 每完成一盤時呼叫的函式，參數為對局紀錄字典
+    返回：統計結果字典
+    """
+    parse_engine(engine_a)
+    parse_engine(engine_b)
+    openings = openings or load_openings()
+    workers = workers or os.cpu_count() or 1
+    wins = draws = losses = 0
+    plies = 0
+    nodes = {engine_a: 0, engine_b: 0}
+    seconds = {engine_a: 0.0, engine_b: 0.0}
+    reasons = {}
+    start = time.perf_counter()
+    stream = open(pgn_path, 'a', encoding='utf-8') if pgn_path else None
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = []
+            for index in range(games):
+                fen = openings[(index // 2) % len(openings)]
+                white, black = (engine_a, engine_b) if index % 2 == 0 else (engine_b, engine_a)
+                futures.append(executor.submit(play_game, index, fen, white, black, max_plies))
+            for future in as_completed(futures):
+                record = future.result()
+                a_is_white = record['white'] == engine_a
+                if record['result'] == '1/2-1/2':
+                    draws += 1
+                elif (record['result'] == '1-0') == a_is_white:
+                    wins += 1
+                else:
+                    losses += 1
+                plies += record['plies']
+                reasons[record['reason']] = reasons.get(record['reason'], 0) + 1
+                for side, spec in enumerate((record['white'], record['black'])):
+                    nodes[spec] += record['nodes'][side]
+                    seconds[spec] += record['seconds'][side]
+                if stream is not None:
+                    write_game(stream, _record_to_game(record))
+                    stream.flush()
+                if on_game is not None:
+                    on_game(record)
+    finally:
+        if stream is not None:
+            stream.close()
+
+    played = wins + draws + losses
+    elo, margin = elo_difference(wins, draws, losses)
+    return {
+        'engine_a': engine_a,
+        'engine_b': engine_b,
+        'games': played,
+        'wins': wins,
+        'draws': draws,
+        'losses': losses,
+        'score': (wins + draws / 2) / played if played else None,
+        'elo': elo,
+        'elo_margin': margin,
+        'average_plies': plies / played if played else 0,
+        'nps': {spec: int(nodes[spec] / seconds[spec]) if seconds[spec] > 0 else 0
+                for spec in (engine_a, engine_b)},
+        'terminations': reasons,
+        'workers': workers,
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+
+
+def _record_to_game(record):
+    """將對局紀錄字典轉換為 pgn.Game"""
+    headers = {
+        'Event': 'Self-play tournament',
+        'Site': '?',
+        'Date': time.strftime('%Y.%m.%d'),
+        'Round': str(record['index'] + 1),
+        'White': record['white'],
+        'Black': record['black'],
+    }
+    if record['fen'] != START_FEN:
+        headers['FEN'] = record['fen']
+    headers['PlyCount'] = str(record['plies'])
+    headers['Termination'] = record['reason']
+    return Game(headers, record['moves'], record['result'])
+
+
+def main(argv=None):
+    """命令列入口：執行自我對弈賽程並輸出統計"""
+    parser = argparse.ArgumentParser(description='西洋棋引擎自我對弈賽程')
+    parser.add_argument('--engine-a', default='depth=3', help='第一組引擎設定（統計以此為準）')
+    parser.add_argument('--engine-b', default='depth=2', help='第二組引擎設定')
+    parser.add_argument('--games', type=int, default=100, help='總對局數')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='工作程序數量')
+    parser.add_argument('--openings', help='開局 FEN/EPD 檔（預設使用內建開局庫）')
+    parser.add_argument('--max-plies', type=int, default=DEFAULT_MAX_PLIES, help='超過即判和的半回合數')
+    parser.add_argument('--pgn', help='將完成的對局附加寫入 PGN 檔')
+    parser.add_argument('--output', help='將統計結果寫入 JSON 檔')
+    args = parser.parse_args(argv)
+    if args.engine_a == args.engine_b:
+        parser.error('兩組引擎設定必須不同')
+    try:
+        parse_engine(args.engine_a)
+        parse_engine(args.engine_b)
+    except ValueError as error:
+        parser.error(str(error))
+
+    def report(record):
+        print(f"第 {record['index'] + 1:4d} 盤  {record['white']} vs {record['black']}  "
+              f"{record['result']:7s}  {record['plies']:3d} 半回合  {record['reason']}")
+
+    summary = run_tournament(args.engine_a, args.engine_b, args.games, args.workers,
+                             load_openings(args.openings), args.pgn, args.max_plies, report)
+    print(f"\n{summary['engine_a']} 對 {summary['engine_b']}：{summary['games']} 盤  "
+          f"勝 {summary['wins']} / 和 {summary['draws']} / 負 {summary['losses']}")
+    if summary['games']:
+        print(f"得分率 {summary['score']:.1%}  Elo 差距 {format_elo(summary['elo'], summary['elo_margin'], summary['score'])}")
+    print(f"平均 {summary['average_plies']:.1f} 半回合  耗時 {summary['seconds']:.1f} 秒")
+    for spec, nps in summary['nps'].items():
+        print(f"{spec}: {nps:,} nodes/sec")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,309 @@
+"""
+UCI 協定模組 - 這個檔案負責：
+1. 以標準輸入/輸出提供 UCI（Universal Chess Interface）引擎，讓一般的西洋棋 GUI 與對局程式操作
+2. 以 asyncio 事件迴圈處理指令：搜尋在背景執行緒進行，stop、isready 等指令不必等待搜尋結束
+3. 支援 go wtime/btime/winc/binc/movestogo/movetime/depth/nodes/mate/infinite 的時間分配與搜尋限制
+4. 支援預先思考（go ponder / ponderhit）：在對手思考時間內搜尋，猜中後轉為正常計時
+
+執行方式：
+    python uci.py
+"""
+
+import asyncio
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from constants import WHITE
+from position import Position, START_FEN, move_to_uci, parse_uci_move
+from search import Searcher, MATE_SCORE, MATE_BOUND, MAX_PLY
+
+ENGINE_NAME = 'Western Chess'
+ENGINE_AUTHOR = 'fush0528'
+DEFAULT_HASH_MB = 16       # 預設置換表大小（MB）
+MAX_HASH_MB = 1024         # 置換表大小上限（MB）
+TT_ENTRY_BYTES = 128       # 估計每個置換表項目（tuple 與其內容）佔用的位元組數
+MOVE_OVERHEAD = 0.05       # 每步保留給通訊延遲的時間（秒）
+DEFAULT_MOVES_TO_GO = 30   # 沒有 movestogo 時假設剩餘的步數
+MIN_THINK_TIME = 0.01      # 最短思考時間（秒）
+STOP_POLL_INTERVAL = 0.05  # 等待搜尋停止時重送停止要求的間隔（秒）
+
+# go 指令中帶有整數參數的關鍵字
+_GO_INT_PARAMS = ('wtime', 'btime', 'winc', 'binc', 'movestogo', 'movetime', 'depth', 'nodes', 'mate')
+
+
+def hash_entries(megabytes):
+    """將置換表大小（MB）換算為項目數"""
+    return max(megabytes * (1 << 20) // TT_ENTRY_BYTES, 1)
+
+
+def parse_go(tokens, on_error=None):
+    """
+    解析 go 指令的參數，返回參數字典（infinite 與 ponder 為布林值）
+    缺少或不是整數的參數會被忽略，並以錯誤訊息呼叫 on_error（None 表示不回報）
+    """
+    params = {'infinite': False, 'ponder': False}
+    index = 0
+    while index < len(tokens):
+        token = tokens[index]
+        if token in ('infinite', 'ponder'):
+            params[token] = True
+        elif token in _GO_INT_PARAMS:
+            value = tokens[index + 1] if index + 1 < len(tokens) else None
+            try:
+                params[token] = int(value)
+                index += 1
+            except (TypeError, ValueError):
+                # 不取用下一個詞，它可能是另一個參數的關鍵字
+                if on_error is not None:
+                    on_error(f"go {token} 需要整數參數，已忽略: {value if value is not None else '(缺少)'}")
+        index += 1
+    return params
+
+
+def allocate_time(params, side):
+    """
+    由 go 參數計算這一步的思考時間（秒），不限時間時返回 None
+    - movetime：使用指定時間扣除通訊延遲
+    - wtime/btime：剩餘時間平均分配到剩餘步數，加上大部分的每步加秒，
+      且不超過剩餘時間的一半
+    """
+    if 'movetime' in params:
+        return max(params['movetime'] / 1000 - MOVE_OVERHEAD, MIN_THINK_TIME)
+    remaining = params.get('wtime' if side == WHITE else 'btime')
+    if remaining is None:
+        return None
+    increment = params.get('winc' if side == WHITE else 'binc', 0)
+    moves_to_go = params.get('movestogo') or DEFAULT_MOVES_TO_GO
+    budget = remaining / moves_to_go + increment * 0.75
+    budget = min(budget, remaining * 0.5) / 1000 - MOVE_OVERHEAD
+    return max(budget, MIN_THINK_TIME)
+
+
+def format_uci_info(info):
+    """將搜尋器的迭代資訊轉換為 UCI 的 info 行"""
+    score = info['score']
+    if abs(score) > MATE_BOUND:
+        plies = MATE_SCORE - abs(score)
+        moves = (plies + 1) // 2
+        score_text = f"mate {moves if score > 0 else -moves}"
+    else:
+        score_text = f"cp {score}"
+    return (f"info depth {info['depth']} score {score_text} nodes {info['nodes']} "
+            f"nps {info['nps']} time {int(info['time'] * 1000)} hashfull {info['hashfull']} "
+            f"pv {' '.join(move_to_uci(move) for move in info['pv'])}")
+
+
+class UCIServer:
+    """
+    UCI 引擎類別：解析指令、維護目前局面並在背景執行緒搜尋
+    屬性：
+        position: 目前局面（由 position 指令設定）
+        searcher: 搜尋器（在同一盤棋中保留置換表）
+        hash_mb: 置換表大小（MB）
+        output: 輸出串流（預設為標準輸出）
+    """
+    def __init__(self, output=None):
+        """建立引擎，局面預設為標準初始局面"""
+        self.position = Position.from_fen(START_FEN)
+        self.hash_mb = DEFAULT_HASH_MB
+        self.searcher = Searcher(hash_entries(self.hash_mb))
+        self.output = output or sys.stdout
+        self._output_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._search_task = None
+        self._release = None          # 預先思考或無限搜尋時，等待 stop/ponderhit 才輸出 bestmove
+        self._pondering = False
+        self._ponderhit_limit = None  # ponderhit 後使用的思考時間
+
+    def send(self, text):
+        """輸出一行（搜尋執行緒與事件迴圈都可能呼叫，以鎖保持每行完整）"""
+        with self._output_lock:
+            self.output.write(text + '\n')
+            self.output.flush()
+
+    async def run(self, stream=None):
+        """主迴圈：逐行讀取指令並處理，直到收到 quit 或輸入結束"""
+        stream = stream or sys.stdin
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                line = await loop.run_in_executor(None, stream.readline)
+                if not line:
+                    await self.handle('quit')
+                    break
+                if not await self.handle(line.strip()):
+                    break
+        finally:
+            self._executor.shutdown(wait=True)
+
+    async def handle(self, line):
+        """
+        處理一行指令
+        返回：收到 quit 時為 False，其餘為 True
+        """
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == 'uci':
+            self.send(f"id name {ENGINE_NAME}")
+            self.send(f"id author {ENGINE_AUTHOR}")
+            self.send(f"option name Hash type spin default {DEFAULT_HASH_MB} min 1 max {MAX_HASH_MB}")
+            self.send("option name Ponder type check default false")
+            self.send("option name Clear Hash type button")
+            self.send("uciok")
+        elif command == 'isready':
+            self.send("readyok")
+        elif command == 'setoption':
+            await self._set_option(args)
+        elif command == 'ucinewgame':
+            await self._stop()
+            self.searcher.tt.clear()
+            self.position = Position.from_fen(START_FEN)
+        elif command == 'position':
+            await self._stop()
+            try:
+                self.position = self._parse_position(args)
+            except (ValueError, IndexError) as error:
+                self.send(f"info string 無效的 position 指令: {error}")
+        elif command == 'go':
+            await self._stop()
+            self._go(parse_go(args, lambda message: self.send(f"info string {message}")))
+        elif command == 'stop':
+            await self._stop()
+        elif command == 'ponderhit':
+            self._ponderhit()
+        elif command == 'quit':
+            await self._stop()
+            return False
+        elif command == 'd':
+            self.send(f"info string {self.position.to_fen()}")
+        else:
+            self.send(f"info string 未知的指令: {command}")
+        return True
+
+    async def _set_option(self, args):
+        """處理 setoption name <名稱> [value <值>]"""
+        text = ' '.join(args)
+        name, _, value = text.partition(' value ')
+        name = name.replace('name', '', 1).strip().lower()
+        if name == 'hash':
+            if not value.strip().isdigit():
+                self.send(f"info string 無效的 Hash 大小: {value}")
+                return
+            await self._stop()
+            self.hash_mb = min(max(int(value), 1), MAX_HASH_MB)
+            self.searcher = Searcher(hash_entries(self.hash_mb))
+        elif name == 'clear hash':
+            await self._stop()
+            self.searcher.tt.clear()
+        elif name != 'ponder':
+            # Ponder 只是告知 GUI 會送出 go ponder，引擎本身不需要設定
+            self.send(f"info string 未知的選項: {name}")
+
+    @staticmethod
+    def _parse_position(args):
+        """
+        解析 position [startpos | fen <FEN>] [moves <走法>...]，返回新的局面
+        不可能出現的局面由 Position.set_fen 拋出 ValueError（國王數量、非走棋方被將軍、過路兵格），
+        不符合擺放的入堡權利會被清除，之後的走法都來自合法走法
+        """
+        if 'moves' in args:
+            split = args.index('moves')
+            setup, moves = args[:split], args[split + 1:]
+        else:
+            setup, moves = args, []
+        if setup[0] == 'startpos':
+            position = Position.from_fen(START_FEN)
+        elif setup[0] == 'fen':
+            position = Position.from_fen(' '.join(setup[1:]))
+        else:
+            raise ValueError(setup[0])
+        for text in moves:
+            position.make_move(parse_uci_move(position, text))
+        return position
+
+    def _go(self, params):
+        """開始搜尋：計算思考時間並建立背景搜尋工作"""
+        time_limit = allocate_time(params, self.position.side_to_move)
+        self._pondering = params['ponder']
+        self._ponderhit_limit = time_limit
+        self._release = asyncio.Event()
+        if not params['ponder'] and not params['infinite']:
+            self._release.set()
+        else:
+            time_limit = None
+        depth = params.get('depth', MAX_PLY)
+        if 'mate' in params:
+            # mate N：只搜尋到 N 步將死所需的深度，找到將死時搜尋本來就會停止
+            depth = min(depth, max(2 * params['mate'] - 1, 1))
+        self._search_task = asyncio.create_task(
+            self._search(self.position.copy(), depth, time_limit, params.get('nodes')))
+
+    async def _search(self, position, depth, time_limit, node_limit=None):
+        """在背景執行緒搜尋，結束後（預先思考或無限搜尋需等到 stop/ponderhit）輸出 bestmove"""
+        loop = asyncio.get_running_loop()
+        searcher = self.searcher
+        on_iteration = lambda info: self.send(format_uci_info(info))
+        try:
+            move = await loop.run_in_executor(self._executor, searcher.search,
+                                              position, depth, time_limit, on_iteration, node_limit)
+        except Exception as error:
+            # 搜尋失敗時仍要回覆 bestmove，GUI 才不會一直等待
+            self.send(f"info string 搜尋錯誤: {error!r}")
+            move = None
+        await self._release.wait()
+        if move is None:
+            self.send("bestmove 0000")
+            return
+        text = f"bestmove {move_to_uci(move)}"
+        info = searcher.last_info
+        if info is not None and len(info['pv']) > 1 and info['pv'][0] == move:
+            text += f" ponder {move_to_uci(info['pv'][1])}"
+        self.send(text)
+
+    def _ponderhit(self):
+        """對手走了預期的走法：預先思考轉為正常計時的搜尋"""
+        if self._search_task is None or not self._pondering:
+            return
+        self._pondering = False
+        if self._ponderhit_limit is not None:
+            asyncio.create_task(self._apply_time_limit(self._search_task, self._ponderhit_limit))
+        self._release.set()
+
+    async def _apply_time_limit(self, task, time_limit):
+        """
+        把 ponderhit 後的思考時間套用到搜尋上
+        搜尋執行緒可能還沒進入 Searcher.search（開始時會重設時間限制），所以等它開始後才設定，
+        並扣掉等待的時間
+        """
+        loop = asyncio.get_running_loop()
+        hit = loop.time()
+        while not task.done():
+            if self.searcher.searching:
+                self.searcher.set_time_limit(max(time_limit - (loop.time() - hit), MIN_THINK_TIME))
+                return
+            await asyncio.sleep(STOP_POLL_INTERVAL)
+
+    async def _stop(self):
+        """停止目前的搜尋並等待 bestmove 輸出（沒有進行中的搜尋時直接返回）"""
+        task = self._search_task
+        if task is None:
+            return
+        self._release.set()
+        # 搜尋執行緒可能還沒開始（開始時會清除停止要求），所以持續重送直到工作結束
+        while not task.done():
+            self.searcher.stop_requested = True
+            await asyncio.wait([task], timeout=STOP_POLL_INTERVAL)
+        self._search_task = None
+        self._pondering = False
+
+
+def main():
+    """命令列入口：在標準輸入/輸出上執行 UCI 引擎"""
+    asyncio.run(UCIServer().run())
+
+
+if __name__ == '__main__':
+    main()
@@ -4,10 +4,81 @@
 2. 實現滑鼠懸停提示框功能
 3. 處理按鈕的互動事件和視覺效果
 4. 管理按鈕在視窗調整大小時的位置更新
+5. 快取字型物件與已渲染的文字圖像，避免每一幀重新搜尋系統字型與渲染文字
+6. 繪製效能 HUD（幀時間百分位數與各階段耗時）
 """
 
+from collections import OrderedDict
+
 import pygame
-from constants import BEIGE, BLACK, BUTTON_SIZE, BUTTON_MARGIN
+from constants import BEIGE, TEXT_COLOR, BUTTON_SIZE, BUTTON_MARGIN, HUD_BACKGROUND, HUD_TEXT_COLOR
+
+UI_FONT_NAME = "Microsoft JhengHei"  # 介面使用的字型（微軟正黑體）
+HUD_FONT_NAME = "Consolas"           # 效能 HUD 使用的等寬字型
+HUD_PADDING = 6                      # 效能 HUD 文字與邊框的距離
+TEXT_CACHE_SIZE = 256                # 文字圖像快取的最大項目數
+
+# 已載入的字型，以 (字型名稱, 大小, 是否粗體) 為鍵
+_fonts = {}
+
+
+def get_font(name, size, bold=False, fallback_size=None):
+    """
+    取得字型物件：同一組 (名稱, 大小, 粗體) 只載入一次
+    參數：
+        name: 系統字型名稱
+        size: 字型大小
+        bold: 是否粗體
+        fallback_size: 無法載入系統字型時，預設字型使用的大小（預設同 size）
+    """
+    key = (name, size, bold)
+    font = _fonts.get(key)
+    if font is None:
+        try:
+            font = pygame.font.SysFont(name, size, bold=bold)
+        except Exception:
+            font = pygame.font.Font(None, fallback_size or size)  # 如果無法加載系統字型，使用默認字體
+        _fonts[key] = font
+    return font
+
+
+class TextCache:
+    """
+    文字圖像快取類別：以 (文字, 字型, 顏色) 為鍵保存已渲染的文字，超過上限時移除最久未使用的項目
+    屬性：
+        max_size: 最大項目數
+        hits, misses: 命中與未命中次數
+    """
+    def __init__(self, max_size=TEXT_CACHE_SIZE):
+        """建立指定上限的快取"""
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def render(self, font, text, color):
+        """返回文字圖像，快取中沒有時才呼叫 font.render"""
+        key = (text, font, color)
+        surface = self._entries.get(key)
+        if surface is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return surface
+        self.misses += 1
+        surface = font.render(text, True, color)
+        self._entries[key] = surface
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return surface
+
+    def clear(self):
+        """清空快取"""
+        self._entries.clear()
+
+
+# 介面共用的文字圖像快取
+text_cache = TextCache()
+
 
 class Button:
     """
@@ -40,15 +111,12 @@ class Button:
         繪製按鈕：
         1. 繪製按鈕背景
         2. 繪製按鈕邊框
-        3. 載入並繪製按鈕文字
+        3. 從快取取得並繪製按鈕文字
         """
         pygame.draw.rect(screen, self.color, self.rect)
-        pygame.draw.rect(screen, BLACK, self.rect, 2)
-        try:
-            font = pygame.font.SysFont("Microsoft JhengHei", 16, bold=True)
-        except:
-            font = pygame.font.Font(None, 24)
-        text_surf = font.render(self.text, True, BLACK)
+        pygame.draw.rect(screen, TEXT_COLOR, self.rect, 2)
+        font = get_font(UI_FONT_NAME, 16, bold=True, fallback_size=24)
+        text_surf = text_cache.render(font, self.text, TEXT_COLOR)
         text_rect = text_surf.get_rect(center=self.rect.center)
         screen.blit(text_surf, text_rect)
 
@@ -75,12 +143,12 @@ def draw_tooltip(screen, text, pos):
         screen: Pygame 畫面物件
         text: 要顯示的提示文字
         pos: 滑鼠位置座標
+    
+    返回：
+        提示框佔用的矩形區域（供局部更新畫面使用）
     """
-    try:
-        font = pygame.font.SysFont("Microsoft JhengHei", 24, bold=True)
-    except:
-        font = pygame.font.Font(None, 36)  # 如果無法加載微軟正黑體，使用默認字體
-    text_surface = font.render(text, True, BLACK)
+    font = get_font(UI_FONT_NAME, 24, bold=True, fallback_size=36)
+    text_surface = text_cache.render(font, text, TEXT_COLOR)
     text_rect = text_surface.get_rect()
     text_rect.topleft = (pos[0] + 10, pos[1] - 30)
     
@@ -88,10 +156,36 @@ def draw_tooltip(screen, text, pos):
     bg_rect = text_rect.copy()
     bg_rect.inflate_ip(10, 10)
     pygame.draw.rect(screen, BEIGE, bg_rect)
-    pygame.draw.rect(screen, BLACK, bg_rect, 1)
+    pygame.draw.rect(screen, TEXT_COLOR, bg_rect, 1)
     
     # 繪製提示文字
     screen.blit(text_surface, text_rect)
+    return bg_rect
+
+def draw_hud(screen, lines, pos=(BUTTON_MARGIN, BUTTON_MARGIN)):
+    """
+    繪製效能 HUD：不透明深色底的多行等寬文字（重畫時直接覆蓋，不會與舊內容疊色）
+    
+    參數：
+        screen: Pygame 畫面物件
+        lines: 要顯示的文字行
+        pos: HUD 左上角位置
+    
+    返回：
+        HUD 佔用的矩形區域（供局部更新畫面使用）
+    """
+    font = get_font(HUD_FONT_NAME, 14, fallback_size=18)
+    # HUD 內容每次更新都不同，不放進文字快取，避免擠掉按鈕與提示框的文字
+    surfaces = [font.render(line, True, HUD_TEXT_COLOR) for line in lines]
+    width = max((surface.get_width() for surface in surfaces), default=0) + HUD_PADDING * 2
+    height = sum(surface.get_height() for surface in surfaces) + HUD_PADDING * 2
+    rect = pygame.Rect(pos, (width, height)).clip(screen.get_rect())
+    screen.fill(HUD_BACKGROUND, rect)
+    y = rect.top + HUD_PADDING
+    for surface in surfaces:
+        screen.blit(surface, (rect.left + HUD_PADDING, y))
+        y += surface.get_height()
+    return rect
 
 def update_button_positions(screen_width):
     """
@@ -0,0 +1,22 @@
+"""
+Zobrist 雜湊模組 - 這個檔案負責：
+1. 產生固定亂數種子的 64 位元 Zobrist 鍵值表
+2. 涵蓋棋子位置、走棋方、入堡權利與過路兵直列
+
+局面的雜湊值為所有成立條件對應鍵值的 XOR，
+走棋時只需 XOR 進出變動的部分即可遞增更新。
+使用固定種子，讓不同程序（平行搜尋、開局庫）得到一致的雜湊值。
+"""
+
+import random
+
+ZOBRIST_SEED = 20240601  # 固定亂數種子
+
+_rng = random.Random(ZOBRIST_SEED)
+
+PIECE_KEYS = [[_rng.getrandbits(64) for _ in range(64)] for _ in range(12)]  # [棋子編號][格子]
+SIDE_KEY = _rng.getrandbits(64)                                             # 輪到黑方走棋
+CASTLING_KEYS = [_rng.getrandbits(64) for _ in range(16)]                    # 以入堡權利位元組合索引
+EP_FILE_KEYS = [_rng.getrandbits(64) for _ in range(8)]                      # 過路兵所在直列
+
+CASTLING_KEYS[0] = 0  # 沒有入堡權利時不影響雜湊值